@@ -0,0 +1,88 @@
+"""
+Batch incident-to-unit assignment: solve time and weighted response time.
+
+For 10, 100 and 1000 simultaneous incidents, assigns them to a pool of
+rescue units that already carry an uneven backlog, with one-by-one greedy
+dispatch (RescuePool.assign) and with the batch allocator, and reports
+solve time and the total severity-weighted response time of each. Times
+are simulated seconds.
+
+The batch allocator solves a burst --max-batch incidents at a time in
+urgency order (what BatchAllocator does), which approximates the single
+optimal assignment of the whole burst. Up to --exact-max incidents that
+exact solve is run as well, and the gap between the two is reported.
+
+Run from the repo root:
+    python -m benchmarks.bench_assignment --sizes 10 100 1000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from common.schema import DeployRequest
+from lab2.environment import batch_to_dicts, generate_sensor_data_batch
+from lab3.assignment import allocate, severity_weights
+from lab3.heuristics import task_time_for
+from lab3.scheduler import RescuePool
+
+
+def weighted_response(payloads, assignments):
+    weights = severity_weights(payloads)
+    return float(sum(w * a.expected_done for w, a in zip(weights, assignments)))
+
+
+def make_pool(units, workers, backlog):
+    """A pool whose worker slots are already busy for `backlog` seconds each."""
+    pool = RescuePool(units, workers, clock=lambda: 0.0)
+    keys, _ = pool.slots()
+    for key, seconds in zip(keys, backlog):
+        pool.place(key, seconds, now=0.0)
+    return pool
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--units", type=int, default=32, help="rescue units in the pool")
+    parser.add_argument("--workers", type=int, default=4, help="deployments per unit at once")
+    parser.add_argument("--backlog", type=float, default=20.0, help="mean existing work per slot (s)")
+    parser.add_argument("--max-batch", type=int, default=32, help="incidents per chunk of the batch allocator")
+    parser.add_argument("--exact-max", type=int, default=400,
+                        help="largest burst also solved in one optimal assignment (its time grows ~cubically)")
+    args = parser.parse_args()
+
+    readings = [r for r in batch_to_dicts(generate_sensor_data_batch(max(args.sizes) * 20, 0.0, seed=5))
+                if r["emergency"]]
+    units = [f"rescue{i}@localhost" for i in range(args.units)]
+    backlog = np.random.default_rng(5).exponential(args.backlog, args.units * args.workers).tolist()
+    print(f"pool: {args.units} units x {args.workers} workers, mean backlog {args.backlog:.0f}s per slot")
+    print(f"batch = optimal assignment per chunk of {args.max_batch} incidents (an approximation of one optimal "
+          f"solve of the burst); exact = one optimal solve, up to {args.exact_max} incidents")
+    for n in args.sizes:
+        payloads = [DeployRequest.from_reading(r) for r in readings[:n]]
+
+        greedy_pool = make_pool(units, args.workers, backlog)
+        start = time.perf_counter()
+        greedy = [greedy_pool.assign(task_time_for(p), now=0.0) for p in payloads]
+        greedy_s = time.perf_counter() - start
+
+        batch_pool = make_pool(units, args.workers, backlog)
+        start = time.perf_counter()
+        batch = allocate(batch_pool, payloads, now=0.0, max_batch=args.max_batch)
+        batch_s = time.perf_counter() - start
+
+        g, b = weighted_response(payloads, greedy), weighted_response(payloads, batch)
+        line = (f"{n:>5} incidents  solve: greedy {greedy_s * 1e3:8.2f} ms  batch {batch_s * 1e3:8.2f} ms  "
+                f"weighted response: greedy {g:10.0f}  batch {b:10.0f}  ({(g - b) / g * 100:5.1f}% lower)")
+        if n <= args.exact_max:
+            exact_pool = make_pool(units, args.workers, backlog)
+            start = time.perf_counter()
+            e = weighted_response(payloads, allocate(exact_pool, payloads, now=0.0, max_batch=n))
+            line += (f"  exact {e:10.0f} in {(time.perf_counter() - start) * 1e3:8.2f} ms "
+                     f"(batch {(b - e) / e * 100:4.2f}% above)")
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
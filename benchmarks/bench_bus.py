@@ -0,0 +1,152 @@
+"""
+End-to-end messages per second: in-process bus vs a local pyjabber server.
+
+A sender agent pushes --messages sensor readings (JSON bodies, as the
+lab sensor sends them) to a sink agent, and an echo pair measures the
+request/reply round trip the coordinator and rescue agents do. Both run
+once over the in-process bus and once through an embedded pyjabber
+server on localhost (the agents are taken out of SPADE's own in-process
+container so every stanza really goes through the server).
+
+Run from the repo root:
+    python -m benchmarks.bench_bus --messages 5000
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import logging
+import time
+
+import loguru
+from pyjabber.server import Server
+from pyjabber.server_parameters import Parameters
+from spade.agent import Agent
+from spade.behaviour import CyclicBehaviour, OneShotBehaviour
+from spade.message import Message
+
+from benchmarks.stats import summary
+from common.bus import BusTransport
+from common.codec import read_body, set_body
+from lab2.environment import generate_sensor_data
+
+
+class BenchAgent(BusTransport, Agent):
+    def __init__(self, jid, transport):
+        super().__init__(jid, "bench")
+        self.use_transport(transport)
+        if transport == "xmpp":
+            self.container.unregister(str(self.jid))  # force the server path
+
+
+class Sink(CyclicBehaviour):
+    def __init__(self, expected):
+        super().__init__()
+        self.expected = expected
+        self.count = 0
+        self.done = asyncio.Event()
+
+    async def run(self):
+        msg = await self.receive(timeout=1)
+        if msg:
+            read_body(msg)
+            self.count += 1
+            if self.count == self.expected:
+                self.done.set()
+
+
+class Echo(CyclicBehaviour):
+    async def run(self):
+        msg = await self.receive(timeout=1)
+        if msg:
+            reply = msg.make_reply()
+            reply.body = msg.body
+            await self.send(reply)
+
+
+class Burst(OneShotBehaviour):
+    def __init__(self, to, bodies):
+        super().__init__()
+        self.to = to
+        self.bodies = bodies
+
+    async def run(self):
+        for reading in self.bodies:
+            msg = Message(to=self.to)
+            msg.set_metadata("performative", "inform")
+            set_body(msg, "reading", reading)
+            await self.send(msg)
+
+
+class PingPong(OneShotBehaviour):
+    def __init__(self, to, rounds):
+        super().__init__()
+        self.to = to
+        self.rounds = rounds
+        self.rtts = []
+
+    async def run(self):
+        for i in range(self.rounds):
+            msg = Message(to=self.to, thread=str(i))
+            msg.set_metadata("performative", "request")
+            set_body(msg, "reading", generate_sensor_data())
+            start = time.perf_counter()
+            await self.send(msg)
+            reply = await self.receive(timeout=5)
+            if reply is None:
+                break
+            self.rtts.append(time.perf_counter() - start)
+
+
+async def measure(transport, messages, rounds):
+    sender, sink = BenchAgent("bench-sender@localhost", transport), BenchAgent("bench-sink@localhost", transport)
+    client, echo = BenchAgent("bench-client@localhost", transport), BenchAgent("bench-echo@localhost", transport)
+    for agent in (sender, sink, client, echo):
+        await agent.start(auto_register=True)
+
+    bodies = [generate_sensor_data() for _ in range(messages)]
+    receiver = Sink(messages)
+    sink.add_behaviour(receiver)
+    start = time.perf_counter()
+    sender.add_behaviour(Burst(str(sink.jid), bodies))
+    try:
+        await asyncio.wait_for(receiver.done.wait(), timeout=120)
+    except asyncio.TimeoutError:
+        pass
+    elapsed = time.perf_counter() - start
+
+    echo.add_behaviour(Echo())
+    pinger = PingPong(str(echo.jid), rounds)
+    client.add_behaviour(pinger)
+    await pinger.join(timeout=120)
+
+    for agent in (sender, sink, client, echo):
+        await agent.stop()
+    return receiver.count, elapsed, pinger.rtts
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=5000, help="one-way messages per transport")
+    parser.add_argument("--rounds", type=int, default=500, help="request/reply round trips per transport")
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)  # also hides the server's stream parse errors
+
+    results = {"bus": await measure("bus", args.messages, args.rounds)}
+
+    loguru.logger.remove()  # silence the server
+    server = Server(Parameters(host="localhost", database_in_memory=True))
+    serving = asyncio.create_task(server.start())
+    await server.ready.wait()
+    with contextlib.redirect_stdout(io.StringIO()):
+        results["xmpp"] = await measure("xmpp", args.messages, args.rounds)
+    serving.cancel()
+
+    print(f"{'transport':<10}{'delivered':>10}{'msgs/s':>12}{'rtt p50 ms':>12}{'rtt p99 ms':>12}")
+    for transport, (count, elapsed, rtts) in results.items():
+        rtt = summary(rtts, 1e3)
+        print(f"{transport:<10}{count:>10}{count / elapsed:>12,.0f}{rtt['p50']:>12.3f}{rtt['p99']:>12.3f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,51 @@
+"""
+Bytes on the wire and encode/decode time per reading: JSON vs packed.
+
+Run from the repo root:
+    python -m benchmarks.bench_codec --batch-sizes 1 250
+"""
+import argparse
+import time
+
+from common.codec import CODECS
+from lab2.gateway import VirtualSensorBank
+
+DEPLOY = {"action": "deploy", "emergency": True, "area_affected_km2": 12.5,
+          "population_risk": 7.25, "lava_flow_m3_s": 431.9, "status": "erupting"}
+RESULT = {"result": "completed", "agent": "rescue@localhost", "task_time_s": 12,
+          "handled_area_km2": 12.5, "population_risk": 7.25, "lava_flow_m3_s": 431.9}
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        out = fn()
+    return (time.perf_counter() - start) / repeat, out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 250])
+    parser.add_argument("--readings", type=int, default=50_000, help="readings per measurement")
+    args = parser.parse_args()
+
+    print(f"{'payload':<16}{'codec':<8}{'bytes/item':>11}{'encode us':>11}{'decode us':>11}")
+    for size in args.batch_sizes:
+        readings = VirtualSensorBank("bench", size).sample()
+        schema, obj = ("reading", readings[0]) if size == 1 else ("readings", readings)
+        repeat = max(1, args.readings // size)
+        for codec in CODECS.values():
+            enc, body = timed(lambda: codec.encode(schema, obj), repeat)
+            dec, _ = timed(lambda: codec.decode(schema, body), repeat)
+            print(f"{f'readings x{size}':<16}{codec.name:<8}{len(body) / size:>11.1f}"
+                  f"{enc / size * 1e6:>11.2f}{dec / size * 1e6:>11.2f}")
+
+    for schema, obj in (("deploy", DEPLOY), ("result", RESULT)):
+        for codec in CODECS.values():
+            enc, body = timed(lambda: codec.encode(schema, obj), 20_000)
+            dec, _ = timed(lambda: codec.decode(schema, body), 20_000)
+            print(f"{schema:<16}{codec.name:<8}{len(body):>11.1f}{enc * 1e6:>11.2f}{dec * 1e6:>11.2f}")
+
+
+if __name__ == "__main__":
+    main()
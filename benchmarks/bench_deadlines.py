@@ -0,0 +1,123 @@
+"""
+Rescue confirmation tail latency: a fixed confirmation timeout against
+deadlines scaled to each dispatch's expected completion time, with and
+without hedging.
+
+--incidents emergencies arrive at --rate per simulated second and go
+through the incident engine to --units rescue units simulated in-process.
+Each unit runs 4 deployments at once (RescueAgent's default) and takes the
+heuristic task time (2 s to ~30 s) times a lognormal jitter. A deployment
+stalls (runs --stall-factor times longer) with probability --stall, and
+its reply is lost with probability --lost. What happens to a request is
+drawn from its sensor and unit, so every mode sees the same incidents and
+the same unit behaviour.
+
+Reported per mode, in simulated seconds from the first dispatch to the
+first confirmation: p50, p90, p99 and max over all incidents, where an
+incident that never got one counts as infinitely late. Also timeouts,
+timeouts whose confirmation still came (given up too early), hedged
+requests and the late replies that were dropped.
+
+Run from the repo root:
+    python -m benchmarks.bench_deadlines --incidents 1000
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import logging
+import math
+import random
+
+from spade.message import Message
+
+from benchmarks.stats import percentile
+from common.clock import CLOCK
+from common.codec import read_body, set_body
+from lab2.environment import batch_to_dicts, generate_sensor_data_batch
+from lab3.deadlines import DeadlineEstimator
+from lab3.heuristics import task_time_for
+from lab3.incidents import IncidentEngine
+from lab3.scheduler import RescuePool
+
+WORKERS = 4
+
+
+async def run(args, readings, deadlines):
+    units = [f"rescue-{i}@localhost" for i in range(args.units)]
+    slots = {unit: asyncio.Semaphore(WORKERS) for unit in units}
+    engine = None
+    confirmed_late = set()  # incidents that timed out although a confirmation came afterwards
+
+    async def deploy(msg):
+        unit = str(msg.to.bare)
+        incident = engine.open_incidents[msg.thread]
+        payload = read_body(msg, default_schema="deploy")
+        rng = random.Random(f"{incident.key}/{unit}")
+        seconds = task_time_for(payload) * rng.lognormvariate(0, args.jitter)
+        if rng.random() < args.stall:
+            seconds *= args.stall_factor
+        lost = rng.random() < args.lost
+        async with slots[unit]:
+            await CLOCK.sleep(seconds)
+        if lost:
+            return
+        if incident.timed_out:
+            confirmed_late.add(incident.id)
+        confirmation = Message(to="coordinator@localhost", sender=unit, thread=msg.thread)
+        confirmation.set_metadata("performative", "inform")
+        set_body(confirmation, "result", {"result": "completed", "task_time_s": seconds})
+        engine.deliver(confirmation)
+
+    async def send(msg):
+        asyncio.create_task(deploy(msg))
+
+    engine = IncidentEngine(send, RescuePool(units, workers=WORKERS), confirm_timeout=args.timeout,
+                            history=len(readings), deadlines=deadlines)
+    arrivals = random.Random(args.seed)
+    for i, reading in enumerate(readings):
+        engine.open(reading, key=f"sensor-{i}")
+        await CLOCK.sleep(arrivals.expovariate(args.rate))
+    while engine.tasks:
+        await asyncio.sleep(0.05)
+    await asyncio.sleep(CLOCK.real(args.stall_factor * 40))  # let the stragglers answer (late replies)
+
+    latency = [i.confirmed_at - i.dispatched_at if i.result is not None else math.inf for i in engine.closed]
+    return latency, engine.stats(), len(confirmed_late)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--incidents", type=int, default=1000)
+    parser.add_argument("--rate", type=float, default=0.5, help="incidents per simulated second")
+    parser.add_argument("--units", type=int, default=3)
+    parser.add_argument("--jitter", type=float, default=0.15, help="sigma of the lognormal task time jitter")
+    parser.add_argument("--stall", type=float, default=0.05, help="probability a deployment stalls")
+    parser.add_argument("--stall-factor", type=float, default=4.0)
+    parser.add_argument("--lost", type=float, default=0.01, help="probability a confirmation never comes")
+    parser.add_argument("--timeout", type=float, default=15.0, help="the fixed confirmation timeout")
+    parser.add_argument("--speed", type=float, default=100.0, help="simulated seconds per real second")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    CLOCK.speed = args.speed
+
+    readings = [r for r in batch_to_dicts(generate_sensor_data_batch(args.incidents * 20, 0.0, seed=args.seed))
+                if r["emergency"]][:args.incidents]
+    modes = {
+        f"fixed {args.timeout:g}s timeout": lambda: None,
+        "expected-time deadline": lambda: DeadlineEstimator(hedge_percentile=None),
+        "deadline + hedge at p90": lambda: DeadlineEstimator(hedge_percentile=90),
+    }
+    print(f"{'mode':<26}{'p50':>7}{'p90':>7}{'p99':>7}{'max':>7}{'timeouts':>10}{'too early':>11}"
+          f"{'hedged':>8}{'late':>6}")
+    for label, make in modes.items():
+        with contextlib.redirect_stdout(io.StringIO()):  # silence the agents' console output
+            latency, stats, too_early = asyncio.run(run(args, readings, make()))
+        cells = "".join(f"{percentile(latency, p):>7.1f}" for p in (50, 90, 99)) + f"{max(latency):>7.1f}"
+        print(f"{label:<26}{cells}{stats['timed_out']:>10}{too_early:>11}{stats['hedged']:>8}"
+              f"{stats['late_replies']:>6}")
+
+
+if __name__ == "__main__":
+    main()
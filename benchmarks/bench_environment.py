@@ -0,0 +1,87 @@
+"""
+Readings per second: the original per-reading generator vs the batch generator.
+
+Run from the repo root:
+    python -m benchmarks.bench_environment --n 100000
+"""
+import argparse
+import random
+import time
+
+from lab2.environment import generate_sensor_data, generate_sensor_data_batch
+
+
+def legacy_generate_sensor_data(dormancy_bias=0.8):
+    """Copy of the original scalar generator, kept here as the baseline."""
+
+    def biased_random(low, high, dormancy_bias=(1-dormancy_bias)):
+        r = random.random()
+        r = r ** (1 / (dormancy_bias + 0.001))
+        return round(low + (high - low) * r, 2)
+
+    co2 = biased_random(20, 1000)
+    so2 = biased_random(10, 700)
+    vibration = biased_random(0.0, 8.0)
+    temperature = biased_random(25, 500)
+    area_affected = biased_random(0.0, 50.0)
+    population_risk = biased_random(0, 10)
+    lava_flow = 0.0
+    ash_density = 0.0
+
+    score = 0
+    if co2 > 200: score += 2
+    if so2 > 150: score += 2
+    if vibration > 2.0: score += 1
+    if temperature > 80: score += 1
+
+    if score <= 2:
+        status = "dormant"
+        ash_density = round(random.uniform(0, 0.1), 3)
+    elif score <= 4:
+        status = "active"
+        ash_density = round(random.uniform(0.1, 2.0), 2)
+    else:
+        status = "erupting"
+        lava_flow = round(random.uniform(0.1, 1000), 2)
+        ash_density = round(random.uniform(2.0, 50.0), 2)
+
+    return {
+        "status": status,
+        "CO2_ppm": co2,
+        "SO2_ppm": so2,
+        "vibration_mm_s": vibration,
+        "temperature_C": temperature,
+        "ash_density_g_m3": ash_density,
+        "population_risk": population_risk,
+        "lava_flow_m3_s": lava_flow,
+        "emergency": status == "erupting",
+        "area_affected_km2": area_affected
+    }
+
+
+def rate(fn, n):
+    start = time.perf_counter()
+    fn(n)
+    return n / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--n", type=int, default=100_000, help="readings per run")
+    parser.add_argument("--bias", type=float, default=0.75, help="dormancy bias")
+    args = parser.parse_args()
+
+    cases = {
+        "legacy scalar": lambda n: [legacy_generate_sensor_data(args.bias) for _ in range(n)],
+        "per-reading view": lambda n: [generate_sensor_data(args.bias) for _ in range(n)],
+        "batch (columnar)": lambda n: generate_sensor_data_batch(n, args.bias),
+    }
+    baseline = None
+    for name, fn in cases.items():
+        per_sec = rate(fn, args.n)
+        baseline = baseline or per_sec
+        print(f"{name:<18} {per_sec:>14,.0f} readings/s  ({per_sec / baseline:6.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Per-tick CPU cost of the correlated sensor field at different fleet sizes.
+
+Run from the repo root:
+    python -m benchmarks.bench_field --ticks 200
+"""
+import argparse
+import math
+import time
+
+from lab2.field import SensorField, grid_sensors
+
+VOLCANOES = [
+    {"x": 5.0, "y": 5.0, "radius_km": 3.0, "dormancy_bias": 0.5},
+    {"x": 30.0, "y": 12.0, "radius_km": 6.0, "dormancy_bias": 0.8},
+    {"x": 18.0, "y": 35.0, "radius_km": 4.0, "dormancy_bias": 0.9},
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--ticks", type=int, default=200)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    args = parser.parse_args()
+
+    for n in args.sizes:
+        side = math.ceil(math.sqrt(n))
+        field = SensorField(VOLCANOES, grid_sensors(side, side, spacing_km=40 / side), seed=1)
+
+        start = time.perf_counter()
+        for _ in range(args.ticks):
+            field.step()
+        step_ms = (time.perf_counter() - start) / args.ticks * 1e3
+
+        start = time.perf_counter()
+        for i in range(field.size):
+            field.reading(i)
+        read_us = (time.perf_counter() - start) / field.size * 1e6
+
+        print(f"{field.size:>8} sensors  step {step_ms:8.2f} ms/tick  "
+              f"({step_ms * 1e3 / field.size:6.3f} us/sensor)  reading() {read_us:5.2f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+CPU and memory per virtual sensor for the sensor gateway mode.
+
+Measures one gateway period (sample + JSON-encode every batch message)
+without an XMPP server, so the numbers are the agent-side cost only.
+
+Run from the repo root:
+    python -m benchmarks.bench_gateway --sizes 100 1000 10000
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+from lab2.gateway import VirtualSensorBank, chunk
+
+
+def tick(bank, batch_size):
+    readings = bank.sample()
+    return [json.dumps({"readings": part}) for part in chunk(readings, batch_size)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1_000, 10_000])
+    parser.add_argument("--batch-size", type=int, default=250)
+    parser.add_argument("--ticks", type=int, default=20)
+    args = parser.parse_args()
+
+    for n in args.sizes:
+        tracemalloc.start()
+        bank = VirtualSensorBank("gateway", n)
+        resident = tracemalloc.get_traced_memory()[0]
+        bodies = tick(bank, args.batch_size)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        start = time.process_time()
+        for _ in range(args.ticks):
+            bodies = tick(bank, args.batch_size)
+        cpu_us = (time.process_time() - start) / args.ticks / n * 1e6
+        wire = sum(len(b) for b in bodies) / n
+
+        print(f"{n:>7} sensors  {len(bodies):>4} msgs/tick  cpu {cpu_us:6.2f} us/sensor/tick  "
+              f"state {resident / n:6.0f} B/sensor  peak {peak / n:6.0f} B/sensor  wire {wire:5.0f} B/reading")
+
+
+if __name__ == "__main__":
+    main()
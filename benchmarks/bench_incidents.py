@@ -0,0 +1,81 @@
+"""
+Coordinator incident throughput and latency under a burst of erupting readings.
+
+Compares the incident engine with max_concurrent=1 (what the old blocking
+FSM did: one emergency at a time) against unbounded concurrent incidents.
+Rescue units are simulated in-process and answer after their task_time, so
+only the coordinator's own scheduling is measured. All delays are scaled by
+--time-scale so a run takes seconds.
+
+Run from the repo root:
+    python -m benchmarks.bench_incidents --burst 50
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import logging
+import time
+
+from spade.message import Message
+
+from common.codec import read_body, set_body
+from lab2.environment import batch_to_dicts, generate_sensor_data_batch
+from lab3.heuristics import task_time_for
+from lab3.incidents import IncidentEngine
+from lab3.scheduler import RescuePool
+from benchmarks.stats import summary
+
+
+async def run(burst, max_concurrent, scale):
+    engine = None
+
+    async def fake_rescue(msg):
+        payload = read_body(msg, default_schema="deploy")
+
+        async def reply():
+            await asyncio.sleep(task_time_for(payload) * scale)
+            confirmation = Message(to="coordinator@localhost", sender="rescue@localhost", thread=msg.thread)
+            set_body(confirmation, "result", {"result": "completed", "task_time_s": task_time_for(payload)})
+            engine.deliver(confirmation)
+
+        asyncio.create_task(reply())
+
+    engine = IncidentEngine(fake_rescue, RescuePool(["rescue@localhost"]), alert_delay=1 * scale,
+                            recovery_delay=2 * scale, confirm_timeout=15 * scale,
+                            max_concurrent=max_concurrent, history=burst)
+    readings = [r for r in batch_to_dicts(generate_sensor_data_batch(burst * 20, 0.0, seed=7))
+                if r["emergency"]][:burst]
+
+    start = time.monotonic()
+    for i, reading in enumerate(readings):
+        engine.open(reading, key=f"sensor-{i}")
+    while engine.open_incidents or engine.tasks:
+        await asyncio.sleep(scale)
+    elapsed = time.monotonic() - start
+
+    closed = list(engine.closed)
+    dispatch = [i.dispatched_at - start for i in closed if i.dispatched_at]
+    total = [i.closed_at - start for i in closed if i.closed_at]
+    return elapsed, dispatch, total, engine.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--burst", type=int, default=50, help="erupting readings in the burst")
+    parser.add_argument("--time-scale", type=float, default=0.01, help="simulated seconds per real second")
+    args = parser.parse_args()
+    to_sim = 1 / args.time_scale  # report in simulated seconds
+    logging.disable(logging.WARNING)
+
+    for label, limit in (("blocking (1 at a time)", 1), ("concurrent incidents", None)):
+        with contextlib.redirect_stdout(io.StringIO()):  # silence the agents' console output
+            elapsed, dispatch, total, stats = asyncio.run(run(args.burst, limit, args.time_scale))
+        d, t = summary(dispatch, to_sim), summary(total, to_sim)
+        print(f"{label:<24} {args.burst / (elapsed * to_sim):7.2f} incidents/sim-s  "
+              f"burst→deploy p50 {d['p50']:7.1f}s p99 {d['p99']:7.1f}s  "
+              f"burst→closed p50 {t['p50']:7.1f}s p99 {t['p99']:7.1f}s  timeouts {stats['timed_out']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Coordinator intake under overload: emergency latency with the priority
+intake (lab3/intake.py) and with the plain FIFO mailbox.
+
+A flooder agent offers the coordinator --rate routine (dormant) readings
+per second over the in-process bus, in gateway batches of --batch-size
+readings cycling over --sensors sensor IDs, which is more than monitoring
+can keep up with. Every --probe-every seconds it also sends a single
+emergency reading stamped with its send time. The latency of a probe is
+send to IncidentEngine.open(). After --seconds the flood stops and the
+coordinator gets --drain seconds to catch up; probes still queued then
+are reported as not reached.
+
+Each mode runs in a fresh interpreter (INTAKE=1 / INTAKE=0), since the
+setting is read from the environment at import.
+
+Run from the repo root:
+    python -m benchmarks.bench_intake --rate 100000 --seconds 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.stats import summary
+
+MODES = {"intake": {"INTAKE": "1"}, "fifo": {"INTAKE": "0"}}
+
+
+async def child_main(args):
+    from spade.agent import Agent
+    from spade.behaviour import OneShotBehaviour
+    from spade.message import Message
+
+    from common.bus import BusTransport
+    from common.codec import set_body
+    from lab2.environment import batch_to_dicts, generate_sensor_data_batch
+    from lab3.coordinator_agent import CoordinatorAgent
+
+    class Flooder(BusTransport, Agent):
+        pass
+
+    class Flood(OneShotBehaviour):
+        async def run(self):
+            batch = batch_to_dicts(generate_sensor_data_batch(args.sensors, dormancy_bias=0.999))
+            for i, reading in enumerate(batch):
+                reading.update(sensor_id=f"routine-{i:05d}", status="dormant", emergency=False)
+            chunks = [batch[i:i + args.batch_size] for i in range(0, len(batch), args.batch_size)]
+            tick = 0.01
+            per_tick = max(1, round(args.rate * tick / args.batch_size))
+            start = next_probe = time.perf_counter()
+            sent = 0
+            while time.perf_counter() - start < args.seconds:
+                now = time.perf_counter()
+                if now >= next_probe:
+                    next_probe += args.probe_every
+                    probe = {**batch[0], "sensor_id": f"probe-{len(probes):05d}", "status": "erupting",
+                             "emergency": True, "probe_sent": now}
+                    probes.append(probe["sensor_id"])
+                    await self.deliver([probe])
+                for _ in range(per_tick):
+                    await self.deliver(chunks[sent % len(chunks)])
+                    sent += 1
+                    readings_offered[0] += len(chunks[(sent - 1) % len(chunks)])
+                await asyncio.sleep(max(0.0, start + (sent / per_tick) * tick - time.perf_counter()))
+
+        async def deliver(self, readings):
+            msg = Message(to="coordinator@localhost", sender=str(self.agent.jid))
+            msg.set_metadata("performative", "inform")
+            set_body(msg, "readings", readings, "json")
+            await self.send(msg)
+
+    coordinator = CoordinatorAgent("coordinator@localhost", "x", transport="bus", rescue_pool=["nobody@localhost"])
+    flooder = Flooder("sensor@localhost", "x")
+    flooder.use_transport("bus")
+    await coordinator.start()
+    await flooder.start()
+
+    latencies, probes, readings_offered = {}, [], [0]
+    engine = coordinator.incidents
+    open_incident = engine.open
+
+    def timed_open(reading, key):
+        if "probe_sent" in reading and key not in latencies:
+            latencies[key] = time.perf_counter() - reading["probe_sent"]
+        return open_incident(reading, key)
+
+    engine.open = timed_open
+
+    flood = Flood()
+    flooder.add_behaviour(flood)
+    await flood.join()
+    deadline = time.perf_counter() + args.drain
+    while len(latencies) < len(probes) and time.perf_counter() < deadline:
+        await asyncio.sleep(0.05)
+    result = {
+        "offered": readings_offered[0],
+        "processed": coordinator.readings_received,
+        "probes": len(probes),
+        "reached": len(latencies),
+        "latency_ms": summary(list(latencies.values()), 1e3),
+        "intake": coordinator.intake.stats() if coordinator.intake is not None else None,
+    }
+    await engine.stop()
+    await flooder.stop()
+    await coordinator.stop()
+    return result
+
+
+def child(args):
+    result_fd = os.dup(1)
+    os.chdir(args.workdir)
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    result = asyncio.run(child_main(args))
+    with os.fdopen(result_fd, "w") as out:
+        out.write(json.dumps(result) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rate", type=float, default=100_000, help="routine readings offered per second")
+    parser.add_argument("--sensors", type=int, default=5000, help="routine sensor IDs cycled through")
+    parser.add_argument("--batch-size", type=int, default=250)
+    parser.add_argument("--seconds", type=float, default=10, help="flood duration")
+    parser.add_argument("--probe-every", type=float, default=0.1, help="seconds between emergency probes")
+    parser.add_argument("--drain", type=float, default=10, help="seconds allowed to catch up after the flood")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(args)
+
+    import tempfile
+    print(f"{'mode':<8}{'offered':>10}{'processed':>11}{'probes':>8}{'reached':>9}"
+          f"{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}  shed / coalesced")
+    for mode, env in MODES.items():
+        with tempfile.TemporaryDirectory() as workdir:
+            run = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_intake", "--child", "--workdir", workdir,
+                 "--rate", str(args.rate), "--sensors", str(args.sensors), "--batch-size", str(args.batch_size),
+                 "--seconds", str(args.seconds), "--probe-every", str(args.probe_every), "--drain", str(args.drain)],
+                env={**os.environ, "PYTHONPATH": os.getcwd(), "COORDINATOR_JID": "coordinator@localhost",
+                     "SENSOR_JID": "sensor@localhost", **env},
+                capture_output=True, text=True, check=True,
+            )
+        result = json.loads(run.stdout.strip().splitlines()[-1])
+        latency, intake = result["latency_ms"], result["intake"]
+        shed = f"{sum(intake['shed'].values())} / {intake['coalesced']}" if intake else "-"
+        print(f"{mode:<8}{result['offered']:>10}{result['processed']:>11}{result['probes']:>8}{result['reached']:>9}"
+              f"{latency['p50']:>10.1f}{latency['p99']:>10.1f}{latency['max']:>10.1f}  {shed}")
+
+
+if __name__ == "__main__":
+    main()
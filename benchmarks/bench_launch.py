@@ -0,0 +1,85 @@
+"""
+Cold start of a whole topology with launch.py: seconds from the launcher's
+start until every agent is up, for 1, 100 and 1000 agents.
+
+Every run gets a fresh embedded pyjabber server and a topology of about
+1% coordinators, 20% rescue units and the rest sensors (topology_for()).
+Modes:
+
+- serial:      one process, asyncio's loop, one agent start at a time,
+               each registering its account (what starting the lab
+               scripts one after another amounts to); skipped above
+               --serial-max agents, at ~0.8 s per agent
+- concurrent:  one process, uvloop, --start-concurrency starts at once,
+               accounts created with the server (launch.py --embedded-server)
+- pool:        as concurrent, over --processes worker processes (default:
+               one per core)
+
+Reported: time to all agents ready, the slowest start phase, the
+shutdown time and agents that failed to start.
+
+Run from the repo root:
+    python -m benchmarks.bench_launch --agents 1 100 1000
+"""
+import argparse
+import os
+import tempfile
+
+from launch import Launcher, agent_specs, start_server
+
+DOMAIN = "localhost"
+PASSWORD = "bench"
+
+
+def topology_for(agents):
+    coordinators = max(1, agents // 100)
+    rescue_units = (agents - coordinators) // 5
+    return {"coordinators": coordinators, "rescue_units": rescue_units,
+            "sensors": agents - coordinators - rescue_units}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--agents", type=int, nargs="+", default=[1, 100, 1000])
+    parser.add_argument("--modes", nargs="+", default=["serial", "concurrent", "pool"])
+    parser.add_argument("--processes", type=int, default=os.cpu_count())
+    parser.add_argument("--start-concurrency", type=int, default=64)
+    parser.add_argument("--serial-max", type=int, default=100, help="largest topology to start serially")
+    args = parser.parse_args()
+    modes = {
+        "serial": {"processes": 1, "use_uvloop": False, "concurrency": 1, "register": True},
+        "concurrent": {"processes": 1, "use_uvloop": True, "concurrency": args.start_concurrency, "register": False},
+        "pool": {"processes": args.processes, "use_uvloop": True, "concurrency": args.start_concurrency,
+                 "register": False},
+    }
+
+    print(f"{'agents':>7}  {'mode':<11}{'procs':>6}{'ready s':>10}{'slowest phase':>24}{'stop s':>9}{'failed':>8}")
+    cwd = os.getcwd()
+    for agents in args.agents:
+        specs = agent_specs(topology_for(agents), DOMAIN)
+        for mode in args.modes:
+            options = modes[mode]
+            if mode == "serial" and agents > args.serial_max:
+                print(f"{agents:>7}  {mode:<11}  skipped (--serial-max {args.serial_max})")
+                continue
+            accounts = [] if options["register"] else [(jid.split("@")[0], PASSWORD) for _, jid, _ in specs]
+            with tempfile.TemporaryDirectory() as workdir:
+                os.chdir(workdir)  # agent log files
+                server, stop_server = start_server(DOMAIN, accounts)
+                try:
+                    launcher = Launcher(specs, min(options["processes"], len(specs)), "xmpp", options["use_uvloop"],
+                                        options["concurrency"], PASSWORD, options["register"], quiet=True)
+                    ready = launcher.start()
+                    slowest = max((name for name in launcher.timings if name.startswith("start")),
+                                  key=launcher.timings.get)
+                    stopped = launcher.shutdown()
+                finally:
+                    stop_server.set()
+                    server.join(10)
+                    os.chdir(cwd)
+            print(f"{agents:>7}  {mode:<11}{len(launcher.workers):>6}{ready:>10.2f}"
+                  f"{f'{slowest} {launcher.timings[slowest]:.2f}':>24}{stopped:>9.2f}{len(launcher.errors):>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Event-loop cost of agent logging: synchronous writes vs the queue listener.
+
+Runs the single-process simulation (simulate.py, in-process bus) once per
+logging mode, each in a fresh interpreter since the mode is read from the
+environment at import:
+
+- sync:  LOG_QUEUE=0 LOG_RATE=0, every print-style line and log record
+         formatted and written on the event loop thread (as basicConfig did)
+- queue: the defaults, records formatted and written by the listener
+         thread, repetitive lines rate-limited
+
+Console output goes to a line-buffered file and log files to a temp dir.
+Reported: event-loop thread CPU per delivered message (the loop's own
+work, excluding the listener thread), and loop lag p50 / p99 / max from
+a probe task that sleeps 5 ms at a time.
+
+Run from the repo root:
+    python -m benchmarks.bench_logging --virtual-sensors 2000 --seconds 120 --speed 20
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.stats import summary
+
+MODES = {"sync": {"LOG_QUEUE": "0", "LOG_RATE": "0"}, "queue": {}}
+PROBE = 0.005
+
+
+async def probe(lags, stop):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(PROBE)
+        lags.append(time.perf_counter() - start - PROBE)
+
+
+async def child_main(args):
+    import simulate
+    from common.bus import BUS
+
+    lags, stop = [], asyncio.Event()
+    prober = asyncio.create_task(probe(lags, stop))
+    cpu = time.thread_time()
+    await simulate.main(args.virtual_sensors, args.seconds, seed=3)
+    cpu = time.thread_time() - cpu
+    stop.set()
+    await prober
+    return {"messages": BUS.stats()["delivered"], "loop_cpu_s": cpu, "lag_ms": summary(lags, 1e3)}
+
+
+def child(args):
+    result_fd = os.dup(1)
+    os.chdir(args.workdir)
+    console = os.open("console.out", os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+    os.dup2(console, 1)
+    sys.stdout = open(1, "w", buffering=1, closefd=False)  # line-buffered, like a terminal
+    from common.clock import CLOCK
+    CLOCK.speed = args.speed
+    result = asyncio.run(child_main(args))
+    with os.fdopen(result_fd, "w") as out:
+        out.write(json.dumps(result) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--virtual-sensors", type=int, default=2000)
+    parser.add_argument("--seconds", type=float, default=120, help="simulated seconds per run")
+    parser.add_argument("--speed", type=float, default=20)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(args)
+
+    print(f"{'mode':<8}{'messages':>10}{'loop us/msg':>13}{'lag p50 ms':>12}{'lag p99 ms':>12}{'lag max ms':>12}")
+    for mode, env in MODES.items():
+        with tempfile.TemporaryDirectory() as workdir:
+            run = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_logging", "--child", "--workdir", workdir,
+                 "--virtual-sensors", str(args.virtual_sensors), "--seconds", str(args.seconds),
+                 "--speed", str(args.speed)],
+                env={**os.environ, "TRANSPORT": "bus", "PYTHONPATH": os.getcwd(), **env},
+                capture_output=True, text=True, check=True,
+            )
+        result = json.loads(run.stdout.strip().splitlines()[-1])
+        lag = result["lag_ms"]
+        print(f"{mode:<8}{result['messages']:>10}{result['loop_cpu_s'] / max(result['messages'], 1) * 1e6:>13.1f}"
+              f"{lag['p50']:>12.2f}{lag['p99']:>12.2f}{lag['max']:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
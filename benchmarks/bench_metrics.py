@@ -0,0 +1,120 @@
+"""
+Per-message cost of the metrics instrumentation, against a budget.
+
+Two measurements:
+
+- recording: the work common/metrics.py adds to one message's trip
+  (out counter through the metered container, in counter and mailbox
+  high-water mark, encode and decode timers), timed directly in a loop.
+- end to end: --messages sensor readings from a sender to a sink agent
+  over the in-process bus (encode, send, dispatch, decode), once with
+  METRICS=1 and once with METRICS=0, each in a fresh interpreter; the
+  difference per message is the instrumentation overhead, though at
+  this size it is within run-to-run noise.
+
+Exits non-zero when the recording cost (with metrics minus METRICS=0,
+which leaves the loop and no-op calls) exceeds --budget-us.
+
+Run from the repo root:
+    python -m benchmarks.bench_metrics --messages 20000
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+
+async def burst(messages):
+    from benchmarks.bench_bus import BenchAgent, Burst, Sink
+    from lab2.environment import generate_sensor_data
+
+    sender, sink = BenchAgent("metrics-sender@localhost", "bus"), BenchAgent("metrics-sink@localhost", "bus")
+    for agent in (sender, sink):
+        await agent.start(auto_register=True)
+    bodies = [generate_sensor_data() for _ in range(messages)]
+    receiver = Sink(messages)
+    sink.add_behaviour(receiver)
+    start = time.perf_counter()
+    sender.add_behaviour(Burst(str(sink.jid), bodies))
+    await asyncio.wait_for(receiver.done.wait(), timeout=120)
+    elapsed = time.perf_counter() - start
+    for agent in (sender, sink):
+        await agent.stop()
+    return elapsed / messages
+
+
+def recording_cost(rounds=200_000):
+    """Seconds of metric recording per message, timed without the rest of the trip."""
+    from spade.agent import Agent
+
+    from common.bus import BusTransport
+    from common.codec import _timer
+    from common.metrics import MeteredContainer, count_in
+
+    class Probe(BusTransport, Agent):
+        pass
+
+    class NullContainer:
+        async def send(self, msg, behaviour):
+            pass
+
+    agent = Probe("metrics-probe@localhost", "x")
+    agent.use_transport("bus")
+    container = MeteredContainer(NullContainer(), agent.metrics.messages_out)
+
+    async def trip():
+        for _ in range(rounds):
+            await container.send(None, None)
+            count_in(agent)
+            start = time.perf_counter()
+            _timer("encode", "reading", "json").observe(time.perf_counter() - start)
+            start = time.perf_counter()
+            _timer("decode", "reading", "json").observe(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    asyncio.run(trip())
+    return (time.perf_counter() - start) / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=5, help="end-to-end runs per mode (median is reported)")
+    parser.add_argument("--budget-us", type=float, default=5.0, help="allowed overhead per message")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        import logging
+        logging.disable(logging.CRITICAL)
+        print(json.dumps({"per_message": asyncio.run(burst(args.messages)), "recording": recording_cost()}))
+        return
+
+    results = {}
+    for mode in ("1", "0"):
+        runs = []
+        for _ in range(args.repeat):
+            child = subprocess.run([sys.executable, "-m", "benchmarks.bench_metrics", "--child",
+                                    "--messages", str(args.messages)],
+                                   env={**os.environ, "METRICS": mode}, capture_output=True, text=True, check=True)
+            runs.append(json.loads(child.stdout.strip().splitlines()[-1]))
+        results[mode] = {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+
+    on, off = results["1"], results["0"]
+    recording = (on["recording"] - off["recording"]) * 1e6
+    overhead = (on["per_message"] - off["per_message"]) * 1e6
+    print(f"recording per message: {on['recording'] * 1e6:.2f} us with metrics, "
+          f"{off['recording'] * 1e6:.2f} us with METRICS=0 -> {recording:.2f} us (budget {args.budget_us:g} us)")
+    print(f"end to end per message: {on['per_message'] * 1e6:.1f} us with metrics, "
+          f"{off['per_message'] * 1e6:.1f} us without -> overhead {overhead:.2f} us")
+    if recording > args.budget_us:
+        print("over budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
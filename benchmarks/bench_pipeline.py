@@ -0,0 +1,346 @@
+"""
+End-to-end sensor -> coordinator -> rescue benchmark over a local XMPP server.
+
+Every scenario starts an embedded pyjabber server on localhost, the
+coordinator, --rescue-units rescue agents and one sensor agent, each in
+its own process, so the CPU time and peak memory reported per agent are
+that agent's alone. The sensor replays a generated recording (see
+lab2/recording.py) at the scenario's rate: `sensors` readings every
+--period seconds for --seconds, with a dormancy bias chosen so that
+about --emergency-ratio of the readings are emergencies (--replay-rate 0
+sends it as fast as possible to find the saturation point). After the
+stream ends the pipeline gets --drain seconds to finish the incidents in
+flight.
+
+Reported per scenario:
+- readings sent / received / lost (sent but never processed by the
+  coordinator, e.g. stanzas the server failed to parse), and the received
+  rate at the coordinator
+- detection -> deploy (incident opened to rescue request sent) and
+  deploy -> confirmation latency, p50 / p99 / max in seconds
+- incidents opened, timed out (no confirmation), refused, invalid (a reply
+  that was no readable confirmation), unmatched and ignored replies
+- CPU seconds, CPU % and peak RSS per agent process (and the server)
+
+Results are also written as JSON (--out) so runs can be compared between
+releases. Times are simulated seconds; with --speed N the rescue task
+times and delays run N times faster (see common/clock.py).
+
+Run from the repo root:
+    python -m benchmarks.bench_pipeline                       # all scenarios
+    python -m benchmarks.bench_pipeline --scenario single --scenario 100
+    python -m benchmarks.bench_pipeline --sensors 2000 --emergency-ratio 0.05 --seconds 60
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.stats import summary
+from lab2.environment import generate_sensor_data_batch
+from lab2.recording import ReadingReplay, generate
+
+# name -> virtual sensors replayed by the one sensor agent
+SCENARIOS = {"single": 1, "10": 10, "100": 100, "1000": 1000, "5000": 5000}
+HOST = "localhost"
+PASSWORD = "bench"
+
+
+def bias_for_ratio(ratio, samples=20000):
+    """Dormancy bias whose generated readings are ~ratio emergencies (bisection, max ~0.63)."""
+    low, high = 0.0, 1.0
+    for _ in range(20):
+        bias = (low + high) / 2
+        if generate_sensor_data_batch(samples, bias, seed=0)["emergency"].mean() > ratio:
+            low = bias
+        else:
+            high = bias
+    return (low + high) / 2
+
+
+def process_usage(since):
+    """CPU seconds used since `since` (a getrusage result) and peak RSS in MB."""
+    now = resource.getrusage(resource.RUSAGE_SELF)
+    cpu = now.ru_utime + now.ru_stime - since.ru_utime - since.ru_stime
+    return cpu, now.ru_maxrss / 1024  # ru_maxrss is in KB on Linux
+
+
+def quiet(workdir):
+    """Child process set-up: agent output and log files go nowhere / into workdir."""
+    os.chdir(workdir)
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    sys.stdout = open(1, "w", closefd=False)
+    logging.disable(logging.CRITICAL)
+    import loguru
+    loguru.logger.remove()
+
+
+def run_server(workdir, ready, stop, results):
+    quiet(workdir)
+    from pyjabber.server import Server
+    from pyjabber.server_parameters import Parameters
+
+    async def main():
+        server = Server(Parameters(host=HOST, database_in_memory=True))
+        serving = asyncio.create_task(server.start())
+        await server.ready.wait()
+        since, start = resource.getrusage(resource.RUSAGE_SELF), time.monotonic()
+        ready.set()
+        while not stop.is_set():
+            await asyncio.sleep(0.1)
+        cpu, rss = process_usage(since)
+        results.put({"agent": "xmpp-server", "cpu_s": cpu, "wall_s": time.monotonic() - start, "max_rss_mb": rss})
+        serving.cancel()
+
+    asyncio.run(main())
+
+
+def flushed(client):
+    """True once slixmpp has written every queued stanza to the socket."""
+    transport = client.transport
+    return client.waiting_queue.empty() and (transport is None or transport.get_write_buffer_size() == 0)
+
+
+def run_agent(role, jid, options, workdir, ready, stop, results):
+    quiet(workdir)
+    from lab2.sensor_agent import SensorAgent
+    from lab3.coordinator_agent import CoordinatorAgent
+    from lab3.rescue_agent import RescueAgent
+
+    async def main():
+        if role == "coordinator":
+            agent = CoordinatorAgent(jid, PASSWORD, incident_history=None)
+        elif role == "rescue":
+            agent = RescueAgent(jid, PASSWORD, max_concurrent=options["workers"])
+        else:
+            agent = SensorAgent(jid, PASSWORD, replay=options["replay"], replay_rate=options["rate"],
+                                batch_size=options["batch_size"])
+        agent.container.unregister(str(agent.jid))  # every stanza goes through the server
+        await agent.start(auto_register=True)
+        since, start = resource.getrusage(resource.RUSAGE_SELF), time.monotonic()
+        ready.set()
+        report = {"agent": jid, "role": role}
+        first = last = None  # wall times the coordinator's reading count first / last moved
+        seen = 0
+        # After stop, the coordinator keeps draining until readings stop arriving for a second
+        while not stop.is_set() or (role == "coordinator" and last and time.monotonic() - last < 1.0):
+            await asyncio.sleep(0.05)
+            if role == "coordinator" and agent.readings_received != seen:
+                seen, last = agent.readings_received, time.monotonic()
+                first = first or last
+            if role == "sensor" and "sent" not in report and all(b.is_done() for b in agent.behaviours) \
+                    and flushed(agent.client):
+                report["sent"] = agent.readings_sent
+                report["send_s"] = time.monotonic() - start
+                results.put(dict(report, finished=True))
+        cpu, rss = process_usage(since)
+        report.update(cpu_s=cpu, wall_s=time.monotonic() - start, max_rss_mb=rss)
+        if role == "coordinator":
+            closed = list(agent.incidents.closed)
+            report.update(
+                received=agent.readings_received,
+                backlog=sum(b.mailbox_size() for b in agent.behaviours),
+                receive_s=(last - first) if first else 0.0,
+                incidents=agent.incidents.stats(),
+                detect_to_deploy=[i.dispatched_at - i.opened_at for i in closed if i.dispatched_at],
+                deploy_to_confirm=[i.confirmed_at - i.dispatched_at for i in closed
+                                   if i.confirmed_at and not i.rejected and not i.invalid],
+                pre_alerts=agent.detector.raised,
+            )
+            await agent.shutdown()
+        else:
+            await agent.stop()
+        results.put(report)
+
+    asyncio.run(main())
+
+
+def run_scenario(name, sensors, args, workdir):
+    ctx = multiprocessing.get_context("spawn")
+    results, stop, stop_server = ctx.Queue(), ctx.Event(), ctx.Event()
+    recording = os.path.join(workdir, "stream.rec")
+    ticks = max(1, round(args.seconds / args.period))
+    generate(recording, sensors, ticks, bias_for_ratio(args.emergency_ratio), args.period, seed=args.seed)
+    replay = ReadingReplay(recording)
+    emergencies = int((replay.records["flags"] & 0x80).astype(bool).sum())
+    offered = len(replay)
+
+    rescue_jids = [f"bench-rescue{i}@{HOST}" for i in range(args.rescue_units)]
+    sensor_jid, coordinator_jid = f"bench-sensor@{HOST}", f"bench-coordinator@{HOST}"
+    # Read by config.py in every child (spawned children inherit the environment)
+    os.environ.update(
+        SENSOR_JID=sensor_jid, SENSOR_PASSWORD=PASSWORD,
+        COORDINATOR_JID=coordinator_jid, COORDINATOR_PASSWORD=PASSWORD,
+        RESCUE_JID=rescue_jids[0], RESCUE_PASSWORD=PASSWORD,
+        RESCUE_POOL=",".join(rescue_jids), RESCUE_WORKERS=str(args.workers),
+        SIM_SPEED=str(args.speed), WIRE_ENCODING=args.encoding, TRANSPORT="xmpp",
+        SERIES_MAX_SENSORS=str(max(sensors, 1)),
+    )
+
+    def spawn(target, *target_args, until=stop):
+        ready = ctx.Event()
+        process = ctx.Process(target=target, args=(*target_args, workdir, ready, until, results), daemon=True)
+        process.start()
+        return process, ready
+
+    def wait_ready(started, timeout=60):
+        for process, ready in started:
+            if not ready.wait(timeout):
+                raise RuntimeError(f"{name}: a process did not start (exit code {process.exitcode})")
+
+    processes = []
+    try:
+        started = [spawn(run_server, until=stop_server)]
+        wait_ready(started)
+        receivers = [spawn(run_agent, "coordinator", coordinator_jid, {})]
+        receivers += [spawn(run_agent, "rescue", jid, {"workers": args.workers}) for jid in rescue_jids]
+        wait_ready(receivers)
+        sender = [spawn(run_agent, "sensor", sensor_jid, {"replay": recording, "rate": args.replay_rate,
+                                                            "batch_size": args.batch_size})]
+        wait_ready(sender)
+        processes = [p for p, _ in started + receivers + sender]
+
+        finished = results.get(timeout=args.seconds / args.speed * 10 + 120)  # the sensor's end-of-stream note
+        time.sleep(args.drain / args.speed)
+        stop.set()
+        reports = [results.get(timeout=120) for _ in processes[1:]]
+        stop_server.set()  # only once every agent has drained and reported
+        reports.append(results.get(timeout=120))
+    finally:
+        stop.set()
+        stop_server.set()
+        for process in processes:
+            process.join(timeout=30)
+            if process.is_alive():
+                process.terminate()
+
+    by_role = {r.get("role", "server"): r for r in reports}
+    coordinator = by_role["coordinator"]
+    # The received span covers ticks - 1 gaps when paced; add the last tick's share
+    tick_s = args.period / args.speed / args.replay_rate if args.replay_rate else 0.0
+    receive_s = coordinator["receive_s"] + tick_s
+    return {
+        "scenario": name,
+        "sensors": sensors,
+        "period_s": args.period,
+        "seconds": args.seconds,
+        "emergency_ratio": emergencies / offered if offered else 0.0,
+        "offered_readings_per_s": sensors / args.period * args.replay_rate if args.replay_rate else None,
+        "readings_sent": finished["sent"],
+        "readings_received": coordinator["received"],
+        "readings_lost": finished["sent"] - coordinator["received"],
+        "send_s": finished["send_s"],
+        "coordinator_backlog": coordinator["backlog"],
+        "received_readings_per_s": coordinator["received"] / receive_s if receive_s else None,
+        "emergency_readings": emergencies,
+        "incidents": coordinator["incidents"],
+        "pre_alerts": coordinator["pre_alerts"],
+        "detect_to_deploy_s": latency(coordinator["detect_to_deploy"]),
+        "deploy_to_confirm_s": latency(coordinator["deploy_to_confirm"]),
+        "agents": {
+            r["agent"]: {
+                "cpu_s": round(r["cpu_s"], 3),
+                "cpu_pct": round(100 * r["cpu_s"] / r["wall_s"], 1) if r["wall_s"] else 0.0,
+                "max_rss_mb": round(r["max_rss_mb"], 1),
+            }
+            for r in reports
+        },
+    }
+
+
+def latency(values):
+    """summary() of latencies in seconds plus the count; null instead of NaN when empty."""
+    if not values:
+        return {"p50": None, "p99": None, "max": None, "count": 0}
+    return dict(summary(values), count=len(values))
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_result(result):
+    d2d, d2c, inc = result["detect_to_deploy_s"], result["deploy_to_confirm_s"], result["incidents"]
+    offered = result["offered_readings_per_s"]
+    print(f"\n== {result['scenario']}: {result['sensors']} sensor(s), "
+          f"{f'{offered:,.1f} readings/s offered' if offered else 'replayed at max rate'}, "
+          f"{result['emergency_ratio']:.1%} emergencies")
+    print(f"readings: sent {result['readings_sent']:,}, received {result['readings_received']:,}, "
+          f"lost {result['readings_lost']:,}; received at {result['received_readings_per_s'] or 0:,.1f}/s")
+    print(f"incidents: opened {inc['opened']}, timed out {inc['timed_out']}, refused {inc['rejected']}, "
+          f"invalid {inc['invalid']}, unmatched replies {inc['unmatched_replies']}, "
+          f"ignored replies {inc['ignored_replies']}, pre-alerts {result['pre_alerts']}")
+    for label, stats in (("detection -> deploy", d2d), ("deploy -> confirm", d2c)):
+        if stats["count"]:
+            print(f"{label:<21}p50 {stats['p50']:.3f}s  p99 {stats['p99']:.3f}s  max {stats['max']:.3f}s  "
+                  f"(n={stats['count']})")
+        else:
+            print(f"{label:<21}none")
+    print(f"{'agent':<32}{'cpu s':>9}{'cpu %':>8}{'rss MB':>9}")
+    for agent, usage in result["agents"].items():
+        print(f"{agent:<32}{usage['cpu_s']:>9.2f}{usage['cpu_pct']:>8.1f}{usage['max_rss_mb']:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS,
+                        help="named scenario (repeatable; default: all of them)")
+    parser.add_argument("--sensors", type=int, action="append", help="custom scenario with N virtual sensors")
+    parser.add_argument("--period", type=float, default=5.0, help="seconds between readings of each sensor")
+    parser.add_argument("--seconds", type=float, default=30.0, help="length of the sensor stream")
+    parser.add_argument("--drain", type=float, default=20.0, help="seconds to let incidents finish afterwards")
+    parser.add_argument("--emergency-ratio", type=float, default=0.01, help="fraction of emergency readings")
+    parser.add_argument("--rescue-units", type=int, default=2)
+    parser.add_argument("--workers", type=int, default=4, help="deployments per rescue unit at once")
+    parser.add_argument("--batch-size", type=int, default=200, help="readings per gateway message")
+    parser.add_argument("--encoding", choices=("json", "packed"), default="json")
+    parser.add_argument("--replay-rate", type=float, default=1.0,
+                        help="stream pace: 1 = one reading per sensor per period, 0 = as fast as possible")
+    parser.add_argument("--speed", type=float, default=1.0, help="simulation clock speed for all agents")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--out", help="JSON results file (default: benchmarks/results/pipeline-<time>.json)")
+    args = parser.parse_args()
+
+    scenarios = [(name, SCENARIOS[name]) for name in args.scenario or ()]
+    scenarios += [(str(n), n) for n in args.sensors or ()]
+    scenarios = scenarios or list(SCENARIOS.items())
+
+    started = datetime.datetime.now()
+    run = {
+        "benchmark": "pipeline",
+        "started": started.isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "options": {key: value for key, value in vars(args).items() if key not in ("scenario", "sensors", "out")},
+        "results": [],
+    }
+    for name, sensors in scenarios:
+        with tempfile.TemporaryDirectory() as workdir:
+            result = run_scenario(name, sensors, args, workdir)
+        print_result(result)
+        run["results"].append(result)
+
+    out = args.out or os.path.join("benchmarks", "results", f"pipeline-{started:%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(run, f, indent=2)
+    print(f"\nResults written to {out}")
+
+
+if __name__ == "__main__":
+    main()
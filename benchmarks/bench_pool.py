@@ -0,0 +1,63 @@
+"""
+Completion latency for a burst of emergencies: one rescue agent vs pools.
+
+Discrete-event simulation in simulated seconds. Each rescue unit runs
+--workers deployments at once (RescueAgent's max_concurrent) in FIFO order
+and takes exactly the task_time heuristic to finish one. Pools are
+dispatched either round-robin or with RescuePool (earliest expected
+completion); latency is measured from the emergency to its completion.
+
+Run from the repo root:
+    python -m benchmarks.bench_pool --emergencies 2000 --rate 2
+"""
+import argparse
+import heapq
+import itertools
+
+import numpy as np
+
+from lab2.environment import batch_to_dicts, generate_sensor_data_batch
+from lab3.heuristics import task_time_for
+from lab3.scheduler import RescuePool
+from benchmarks.stats import summary
+
+
+def simulate(arrivals, task_times, units, workers, policy):
+    """Return the completion latency of every emergency."""
+    free = {u: [0.0] * workers for u in range(units)}  # ground truth worker free times
+    pool = RescuePool(list(range(units)), workers=workers, clock=lambda: 0.0)
+    round_robin = itertools.cycle(range(units))
+    latencies = []
+    for t, task in zip(arrivals, task_times):
+        unit = pool.assign(task, now=t).jid if policy == "heap" else next(round_robin)
+        start = max(t, heapq.heappop(free[unit]))
+        heapq.heappush(free[unit], start + task)
+        latencies.append(start + task - t)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--emergencies", type=int, default=2000)
+    parser.add_argument("--rate", type=float, default=2.0, help="emergencies per simulated second")
+    parser.add_argument("--workers", type=int, default=4, help="deployments per unit at once")
+    parser.add_argument("--pools", type=int, nargs="+", default=[1, 2, 8, 32])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(3)
+    arrivals = np.cumsum(rng.exponential(1 / args.rate, args.emergencies)).tolist()
+    readings = [r for r in batch_to_dicts(generate_sensor_data_batch(args.emergencies * 20, 0.0, seed=3))
+                if r["emergency"]][:args.emergencies]
+    task_times = [task_time_for(r) for r in readings]
+
+    print(f"{args.emergencies} emergencies at {args.rate}/s, mean task {np.mean(task_times):.1f}s, "
+          f"{args.workers} workers per unit")
+    for units in args.pools:
+        for policy in (("heap",) if units == 1 else ("round-robin", "heap")):
+            s = summary(simulate(arrivals, task_times, units, args.workers, policy))
+            label = "single agent" if units == 1 else f"pool of {units} ({policy})"
+            print(f"{label:<28} p50 {s['p50']:9.1f}s  p99 {s['p99']:9.1f}s  max {s['max']:9.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Precursor detector: lead time over the emergency flag, false pre-alerts and
+CPU cost per reading, on a replayed sensor-field trace.
+
+The trace is recorded once from lab2.field.SensorField: quiet volcanoes
+that now and then build up to an eruption over --ramp ticks and calm down
+again. It is then replayed tick by tick (one gateway batch per tick)
+through the coordinator's SensorSeries + PrecursorDetector.
+
+For every build-up and every sensor near that volcano which went into
+emergency, the lead time is how long before its first emergency reading the
+detector raised a pre-alert for it. A pre-alert raised while no build-up
+near the sensor is under way counts as false.
+
+Run from the repo root:
+    python -m benchmarks.bench_precursors --ticks 4000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.stats import summary
+from lab2.field import CHANNELS, SensorField, grid_sensors
+from lab3.precursors import PrecursorDetector
+from lab3.timeseries import SensorSeries
+
+STEP_S = 5.0
+VOLCANOES = [
+    {"x": 3.0, "y": 3.0, "radius_km": 2.5, "dormancy_bias": 0.97},
+    {"x": 9.0, "y": 5.0, "radius_km": 3.0, "dormancy_bias": 0.97},
+    {"x": 5.0, "y": 10.0, "radius_km": 2.0, "dormancy_bias": 0.97},
+]
+
+
+def record(ticks, nx, ny, ramp, noise, seed):
+    """
+    Run the field with eruption build-ups and keep every tick's columns.
+    Returns (trace, episodes, weights); episodes are (volcano, start, end).
+    """
+    rng = np.random.default_rng(seed)
+    field = SensorField(VOLCANOES, grid_sensors(nx, ny), step_s=STEP_S, noise=noise,
+                         activity_noise=noise / 2, seed=seed)
+    base = field.activity_mean.copy()
+    length = ramp + ramp // 3  # linear build-up, then a short peak
+    episodes = []
+    for v in range(len(VOLCANOES)):
+        t = int(rng.integers(ramp, 3 * ramp))
+        while t + length < ticks:
+            episodes.append((v, t, t + length))
+            t += length + int(rng.integers(ramp, 3 * ramp))  # quiet time before the next one
+
+    names = [name for name, _, _ in CHANNELS]
+    trace = {name: np.empty((ticks, field.size)) for name in names}
+    trace["emergency"] = np.empty((ticks, field.size), dtype=bool)
+    for t in range(ticks):
+        field.activity_mean[:] = base
+        for v, start, end in episodes:
+            if start <= t < end:
+                field.activity_mean[v] = base[v] + (0.6 - base[v]) * min(1.0, (t - start) / ramp)
+        batch = field.step()
+        for name in names:
+            trace[name][t] = batch[name]
+        trace["emergency"][t] = batch["emergency"]
+    return trace, episodes, field.weights
+
+
+def replay(trace, episodes, weights, detector):
+    """Feed the trace through SensorSeries + detector and score the pre-alerts."""
+    ticks, size = trace["emergency"].shape
+    names = [name for name, _, _ in CHANNELS]
+    keys = [f"sensor-{i:05d}" for i in range(size)]
+    columns = {name: trace[name].tolist() for name in names}
+
+    series = SensorSeries(window=120, max_sensors=size)
+    raised = np.zeros((ticks, size), dtype=bool)
+    elapsed = 0.0
+    for t in range(ticks):
+        readings = [dict(zip(names, values)) for values in zip(*(columns[name][t] for name in names))]
+        start = time.perf_counter()
+        rows = series.extend(keys, readings)
+        for i, _ in detector.update_many(rows, readings, series.fresh(rows)):
+            raised[t, i] = True
+        elapsed += time.perf_counter() - start
+
+    emergency = trace["emergency"]
+    near = weights > 0.3     # sensors a volcano's build-up clearly reaches
+    covered = np.zeros_like(raised)  # (tick, sensor) while a build-up reaches that sensor at all
+    leads, missed = [], 0
+    for v, start, end in episodes:
+        covered[start:end, weights[:, v] > 0.05] = True
+        for i in np.flatnonzero(near[:, v]):
+            onset = np.flatnonzero(emergency[start:end, i])
+            if not len(onset):
+                continue
+            onset = start + onset[0]
+            alerts = np.flatnonzero(raised[start:onset, i])
+            if len(alerts):
+                leads.append((onset - start - alerts[0]) * STEP_S)
+            else:
+                missed += 1
+    return {
+        "leads": leads,
+        "missed": missed,
+        "raised": int(raised.sum()),
+        "false": int((raised & ~covered).sum()),
+        "outside": int((emergency & ~covered).any(axis=0).sum()),
+        "elapsed": elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--ticks", type=int, default=4000, help="ticks recorded (5 s each)")
+    parser.add_argument("--grid", type=int, nargs=2, default=[12, 12], help="sensor grid nx ny")
+    parser.add_argument("--ramp", type=int, default=240, help="ticks a build-up takes (240 = 20 min)")
+    parser.add_argument("--noise", type=float, default=0.04, help="SensorField noise level")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    trace, episodes, weights = record(args.ticks, *args.grid, args.ramp, args.noise, args.seed)
+    size = weights.shape[0]
+    result = replay(trace, episodes, weights, PrecursorDetector(capacity=size))
+    leads, missed, false, elapsed = result["leads"], result["missed"], result["false"], result["elapsed"]
+    hours = args.ticks * STEP_S / 3600
+    readings = args.ticks * size
+
+    print(f"{size} sensors x {args.ticks} ticks ({hours:.1f} h simulated), {len(episodes)} build-ups")
+    print(f"series + detector: {elapsed / readings * 1e6:.2f} us/reading ({readings / elapsed:,.0f} readings/s)")
+    lead = summary(leads) if leads else {"p50": float("nan"), "p99": float("nan"), "max": float("nan")}
+    print(f"eruption onsets with a pre-alert first: {len(leads)}/{len(leads) + missed}; "
+          f"lead time p50 {lead['p50']:.0f}s  p99 {lead['p99']:.0f}s  max {lead['max']:.0f}s "
+          f"(emergency flag alone: 0s)")
+    print(f"pre-alerts raised {result['raised']}, false {false} ({false / size / hours:.3f} per sensor-hour); "
+          f"sensors with emergencies outside build-ups: {result['outside']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Sensor stream recordings: write rate, file size, replay rate and seek time.
+
+Records --ticks gateway ticks of --sensors virtual sensors into a
+temporary recording, then reads it back through the memory map (decoding
+to wire dicts, as the replay behaviour does) and times random seeks by
+timestamp. The Python heap peak during a second read shows the file is
+streamed a chunk at a time rather than loaded.
+
+Run from the repo root:
+    python -m benchmarks.bench_recording --sensors 10000 --ticks 200
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from lab2.gateway import VirtualSensorBank
+from lab2.recording import ReadingRecorder, ReadingReplay
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sensors", type=int, default=10_000)
+    parser.add_argument("--ticks", type=int, default=200, help="gateway ticks to record")
+    parser.add_argument("--seeks", type=int, default=1000)
+    args = parser.parse_args()
+
+    bank = VirtualSensorBank("bench", args.sensors)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.rec")
+        recorder = ReadingRecorder(path)
+        elapsed = 0.0
+        for tick in range(args.ticks):
+            readings = bank.sample(now=tick * 5.0)
+            start = time.perf_counter()
+            recorder.write(readings)
+            elapsed += time.perf_counter() - start
+        recorder.close()
+        count = args.sensors * args.ticks
+        size = os.path.getsize(path)
+        print(f"record: {count:,} readings, {count / elapsed:,.0f} readings/s, "
+              f"{size / 1e6:.1f} MB ({size / count:.0f} B/reading)")
+
+        replay = ReadingReplay(path)
+        start = time.perf_counter()
+        replayed = sum(len(readings) for readings in replay.chunks())
+        elapsed = time.perf_counter() - start
+        tracemalloc.start()
+        for _ in replay.chunks():
+            pass
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print(f"replay: {replayed:,} readings, {replayed / elapsed:,.0f} readings/s "
+              f"(heap peak {peak / 1e6:.0f} MB for a {size / 1e6:.0f} MB file)")
+
+        first, last = replay.time_range()
+        stamps = [random.uniform(first, last) for _ in range(args.seeks)]
+        start = time.perf_counter()
+        for stamp in stamps:
+            replay.seek(stamp)
+        print(f"seek: {(time.perf_counter() - start) / args.seeks * 1e6:.1f} us "
+              f"({len(replay.index)} index entries)")
+
+
+if __name__ == "__main__":
+    main()
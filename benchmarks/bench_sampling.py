@@ -0,0 +1,132 @@
+"""
+Sensor sampling policies: message volume and emergency detection latency.
+
+A lab2.field.SensorField is stepped every --step seconds of simulated time
+(the ground truth), with quiet volcanoes that now and then build up to an
+eruption over --ramp seconds and calm down again. Each mode of
+lab2.sampling.SamplingPolicy samples it as a gateway would:
+
+- fixed:     every sensor every 5 s, everything sent (the old behaviour)
+- deadband:  every 5 s, only readings that moved or are due a heartbeat
+- adaptive:  per-sensor periods of 5 / 2 / 1 s by status, up to 4x while stable
+- both:      adaptive periods and the dead-band
+
+Reported per mode: readings and gateway messages sent (one message per
+--batch-size readings per tick that sends anything), and for every
+emergency onset in the truth (a sensor's status turning erupting) the time
+until that mode sent an erupting reading for the sensor. Onsets that end
+before anything was sent count as missed.
+
+Run from the repo root:
+    python -m benchmarks.bench_sampling --hours 4
+"""
+import argparse
+import math
+import time
+
+import numpy as np
+
+from benchmarks.stats import summary
+from lab2.environment import ERUPTING
+from lab2.field import SensorField, grid_sensors
+from lab2.sampling import SamplingPolicy
+
+VOLCANOES = [
+    {"x": 3.0, "y": 3.0, "radius_km": 2.5, "dormancy_bias": 0.97},
+    {"x": 12.0, "y": 6.0, "radius_km": 3.0, "dormancy_bias": 0.97},
+    {"x": 6.0, "y": 13.0, "radius_km": 2.0, "dormancy_bias": 0.97},
+]
+MODES = {
+    "fixed": {},
+    "deadband": {"deadband": True},
+    "adaptive": {"adaptive": True},
+    "both": {"adaptive": True, "deadband": True},
+}
+
+
+def episodes_for(ticks, ramp, rng):
+    """(volcano, start tick, end tick) build-ups: ramp up, short peak, quiet time before the next."""
+    length = ramp + ramp // 3
+    episodes = []
+    for v in range(len(VOLCANOES)):
+        t = int(rng.integers(ramp, 3 * ramp))
+        while t + length < ticks:
+            episodes.append((v, t, t + length))
+            t += length + int(rng.integers(ramp, 3 * ramp))
+    return episodes
+
+
+def run(args):
+    rng = np.random.default_rng(args.seed)
+    ticks = int(args.hours * 3600 / args.step)
+    ramp = int(args.ramp / args.step)
+    field = SensorField(VOLCANOES, grid_sensors(*args.grid), step_s=args.step, noise=args.noise,
+                        activity_noise=args.noise / 2, seed=args.seed)
+    size = field.size
+    base = field.activity_mean.copy()
+    episodes = episodes_for(ticks, ramp, rng)
+
+    policies = {mode: SamplingPolicy(size, **options) for mode, options in MODES.items()}
+    results = {mode: {"messages": 0, "latencies": [], "missed": 0, "elapsed": 0.0} for mode in MODES}
+    pending = {mode: np.full(size, np.nan) for mode in MODES}  # onset time not yet reported, per sensor
+    previous = np.zeros(size, dtype=bool)
+    onsets = 0
+
+    for tick in range(ticks):
+        now = tick * args.step
+        field.activity_mean[:] = base
+        for v, start, end in episodes:
+            if start <= tick < end:
+                field.activity_mean[v] = base[v] + (0.6 - base[v]) * min(1.0, (tick - start) / ramp)
+        batch = field.step()
+        erupting = batch["status"] == ERUPTING
+        rise, fall = erupting & ~previous, previous & ~erupting
+        previous = erupting
+        onsets += int(rise.sum())
+
+        for mode, policy in policies.items():
+            result, waiting = results[mode], pending[mode]
+            waiting[rise & np.isnan(waiting)] = now
+            lost = fall & ~np.isnan(waiting)
+            result["missed"] += int(lost.sum())
+            waiting[lost] = np.nan
+
+            start = time.perf_counter()
+            sent = policy.select(policy.due(now), batch, now)
+            result["elapsed"] += time.perf_counter() - start
+            if len(sent):
+                result["messages"] += math.ceil(len(sent) / args.batch_size)
+                hits = sent[erupting[sent] & ~np.isnan(waiting[sent])]
+                result["latencies"].extend((now - waiting[hits]).tolist())
+                waiting[hits] = np.nan
+    return size, ticks, episodes, onsets, policies, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--hours", type=float, default=4, help="simulated hours")
+    parser.add_argument("--step", type=float, default=0.5, help="simulated seconds per field tick")
+    parser.add_argument("--grid", type=int, nargs=2, default=[16, 16], help="sensor grid nx ny")
+    parser.add_argument("--ramp", type=float, default=1200, help="seconds a build-up takes")
+    parser.add_argument("--noise", type=float, default=0.04, help="SensorField noise level")
+    parser.add_argument("--batch-size", type=int, default=250, help="readings per gateway message")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    size, ticks, episodes, onsets, policies, results = run(args)
+    print(f"{size} sensors, {args.hours:g} h simulated in {args.step:g} s ticks, {len(episodes)} build-ups, "
+          f"{onsets} emergency onsets")
+    print(f"{'mode':<10}{'readings':>10}{'messages':>10}{'vs fixed':>10}{'latency p50':>13}{'p99':>8}{'max':>8}"
+          f"{'missed':>8}{'us/reading':>12}")
+    fixed = policies["fixed"].sent_count
+    for mode, policy in policies.items():
+        result = results[mode]
+        latency = summary(result["latencies"]) if result["latencies"] else {"p50": math.nan, "p99": math.nan,
+                                                                              "max": math.nan}
+        print(f"{mode:<10}{policy.sent_count:>10}{result['messages']:>10}{policy.sent_count / fixed:>10.2f}"
+              f"{latency['p50']:>12.1f}s{latency['p99']:>7.1f}s{latency['max']:>7.1f}s{result['missed']:>8}"
+              f"{result['elapsed'] / max(policy.sampled_count, 1) * 1e6:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+Typed messages (common/schema.py) against the ad-hoc dicts they replace:
+CPU per message and memory per message held.
+
+- deploy round trip: the coordinator builds a deploy request from an
+  emergency reading, the rescue unit decodes it and reads its fields, and
+  the result comes back and is decoded. The dict path is the code this
+  replaced: a .get() copy of every field on the coordinator and a float()
+  cast of every field on the unit. The typed path validates the reading
+  once and decodes straight into DeployRequest / RescueResult
+  (read_body(typed=True)).
+- gateway tick: --sensors readings sampled and encoded into messages of
+  250. The dict path builds one dict per reading (VirtualSensorBank.sample());
+  the typed path keeps the tick as a ReadingBatch all the way to the codec.
+
+Times are the best of 5 rounds. Memory is measured with tracemalloc: the
+peak a round trip or tick allocates at once, and the bytes held per
+message (a request waiting in a rescue unit's queue, a reading of a tick
+kept for sending).
+
+Run from the repo root:
+    python -m benchmarks.bench_schema
+"""
+import argparse
+import time
+import tracemalloc
+
+from common.codec import CODECS
+from common.schema import DeployRequest, RescueResult
+from lab2.environment import batch_to_dicts, generate_sensor_data_batch
+from lab2.gateway import VirtualSensorBank, chunk
+
+
+def deploy_dicts(codec, reading):
+    payload = {
+        "action": "deploy",
+        "emergency": reading.get("emergency", True),
+        "area_affected_km2": reading.get("area_affected_km2", 0),
+        "population_risk": reading.get("population_risk", 0),
+        "lava_flow_m3_s": reading.get("lava_flow_m3_s", 0),
+        "status": reading.get("status", "unknown"),
+    }
+    received = codec.decode("deploy", codec.encode("deploy", payload))
+    area = float(received.get("area_affected_km2", 0.0))
+    pop_risk = float(received.get("population_risk", 0.0))
+    lava = float(received.get("lava_flow_m3_s", 0.0))
+    bool(received.get("emergency", False)), received.get("action", "respond")
+    result = {"result": "completed", "agent": "rescue@localhost", "task_time_s": 12,
+              "handled_area_km2": area, "population_risk": pop_risk, "lava_flow_m3_s": lava}
+    return codec.decode("result", codec.encode("result", result))
+
+
+def deploy_typed(codec, reading):
+    request = DeployRequest.from_reading(reading)
+    received = codec.decode_typed("deploy", codec.encode("deploy", request))
+    result = RescueResult("completed", "rescue@localhost", 12, received.area_affected_km2,
+                          received.population_risk, received.lava_flow_m3_s)
+    return codec.decode_typed("result", codec.encode("result", result))
+
+
+def per_call(function, args, repeat, rounds=5):
+    """Best of `rounds` averages over `repeat` calls (the machine is shared; the minimum is the cost)."""
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            function(*args)
+        best = min(best, (time.perf_counter() - start) / repeat)
+    return best
+
+
+def peak_bytes(function, args):
+    """Most memory one call has allocated at once, above what it returns."""
+    function(*args)  # warm caches (struct formats, interned strings)
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    out = function(*args)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del out
+    return peak
+
+
+def held_bytes(make, count):
+    """Bytes per object of `count` objects make() returns, kept alive together."""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = [make(i) for i in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return (after - before) / count
+
+
+def tick(bank, codec, typed):
+    readings = bank.sample_batch(now=1_700_000_000.0) if typed else bank.sample(now=1_700_000_000.0)
+    return [codec.encode("readings", part) for part in chunk(readings)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20_000, help="deploy round trips per measurement")
+    parser.add_argument("--sensors", type=int, default=2000, help="virtual sensors per gateway tick")
+    parser.add_argument("--ticks", type=int, default=200)
+    args = parser.parse_args()
+
+    readings = [r for r in batch_to_dicts(generate_sensor_data_batch(20_000, 0.0, seed=3)) if r["emergency"]]
+    reading = readings[0]
+    print(f"{'deploy round trip':<22}{'codec':<8}{'dict us':>9}{'typed us':>10}{'dict peak B':>13}{'typed peak B':>14}")
+    for codec in CODECS.values():
+        assert deploy_typed(codec, reading).to_dict() == deploy_dicts(codec, reading)
+        dicts = per_call(deploy_dicts, (codec, reading), args.repeat)
+        typed = per_call(deploy_typed, (codec, reading), args.repeat)
+        print(f"{'':<22}{codec.name:<8}{dicts * 1e6:>9.2f}{typed * 1e6:>10.2f}"
+              f"{peak_bytes(deploy_dicts, (codec, reading)):>13}{peak_bytes(deploy_typed, (codec, reading)):>14}")
+    json = CODECS["json"]
+    request_dict = held_bytes(lambda i: json.decode("deploy", json.encode("deploy", DeployRequest.from_reading(
+        readings[i % len(readings)]))), 10_000)
+    request_typed = held_bytes(lambda i: json.decode_typed("deploy", json.encode(
+        "deploy", DeployRequest.from_reading(readings[i % len(readings)]))), 10_000)
+    print(f"held deploy request: dict {request_dict:.0f} B, DeployRequest {request_typed:.0f} B")
+
+    bank = VirtualSensorBank("bench", args.sensors)
+    print(f"\n{'gateway tick':<22}{'codec':<8}{'dict ms':>9}{'typed ms':>10}{'dict peak kB':>13}{'typed peak kB':>14}")
+    for codec in CODECS.values():
+        batch = bank.sample_batch(now=1_700_000_000.0)
+        assert [codec.encode("readings", part) for part in chunk(batch)] == \
+               [codec.encode("readings", part) for part in chunk(batch.to_dicts())]
+        dicts = per_call(tick, (bank, codec, False), args.ticks // 5)
+        typed = per_call(tick, (bank, codec, True), args.ticks // 5)
+        print(f"{f'{args.sensors} readings':<22}{codec.name:<8}{dicts * 1e3:>9.2f}{typed * 1e3:>10.2f}"
+              f"{peak_bytes(tick, (bank, codec, False)) / 1e3:>13.0f}{peak_bytes(tick, (bank, codec, True)) / 1e3:>14.0f}")
+    reading_dict = held_bytes(lambda i: bank.sample(now=1_700_000_000.0), 20) / args.sensors
+    reading_batch = held_bytes(lambda i: bank.sample_batch(now=1_700_000_000.0), 20) / args.sensors
+    print(f"held tick: {reading_dict:.0f} B per reading as dicts, {reading_batch:.0f} B per reading as a ReadingBatch")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+History database (common/store.py): sustained insert rate and query latency.
+
+Fills a database with --rows readings from --sensors sensors, queued the
+way the coordinator does (add_readings() per gateway batch of
+--batch-size, one incident with a dispatch and a reply per --incident-every
+readings), as fast as the writer keeps up. Reported while filling: the
+write rate per tenth of the fill (does it hold as the indexes grow?) and
+the cost of a queueing call on the caller's thread. Then, on the full
+database, the latency of the queries the store answers:
+
+- last:    a sensor's latest 100 readings
+- range:   a sensor's readings in a 10 minute window
+- before:  what an incident's sensor reported in the 5 minutes before it
+- incident: an incident with its dispatches and replies
+
+--path keeps the database (a second run with --rows 0 only queries it).
+
+Run from the repo root:
+    python -m benchmarks.bench_store --rows 20000000
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+
+from benchmarks.stats import summary
+from common.store import Store
+from lab2.environment import batch_to_dicts, generate_sensor_data_batch
+
+
+def fill(store, args):
+    base = batch_to_dicts(generate_sensor_data_batch(args.sensors, seed=1))
+    names = [f"sensor-{i:05d}" for i in range(args.sensors)]
+    call_times, progress, done = [], [], threading.Event()
+    sent = incidents = 0
+    now = args.start
+    start = time.perf_counter()
+    threading.Thread(target=watch, args=(store, start, progress, done), daemon=True).start()
+    while sent < args.rows:
+        for lo in range(0, args.sensors, args.batch_size):
+            batch = [{**reading, "timestamp": now} for reading in base[lo:lo + args.batch_size]]
+            while store.pending > store.max_pending // 2:  # measure the writer, not the drop path
+                time.sleep(0.001)
+            t = time.perf_counter()
+            store.add_readings(names[lo:lo + args.batch_size], batch, now)
+            call_times.append(time.perf_counter() - t)
+            sent += len(batch)
+            while incidents < sent // args.incident_every:
+                incident_id = f"incident-{incidents:08d}"
+                store.incident_opened(incident_id, names[incidents % args.sensors], now)
+                store.dispatched(incident_id, "rescue@localhost", now + 1, now + 30)
+                store.confirmed(incident_id, "rescue@localhost", now + 30, "inform", {"status": "completed"})
+                store.incident_closed(incident_id, now + 32, "confirmed")
+                incidents += 1
+            if sent >= args.rows:
+                break
+        now += args.period
+    store.flush()
+    elapsed = time.perf_counter() - start
+    done.set()
+    progress.append((elapsed, store.written["readings"]))
+    return elapsed, call_times, progress, incidents
+
+
+def watch(store, start, progress, done, every=0.1):
+    """(seconds since start, readings written) every `every` seconds until done."""
+    while not done.wait(every):
+        progress.append((time.perf_counter() - start, store.written["readings"]))
+
+
+def tenths(progress, base, total):
+    """Write rate over each tenth of the fill, from the watch() samples."""
+    rates, previous = [], (0.0, base)
+    for k in range(1, 11):
+        at, written = next(sample for sample in progress if sample[1] - base >= total * k / 10)
+        rates.append((written - previous[1]) / max(at - previous[0], 1e-9))
+        previous = (at, written)
+    return rates
+
+
+def timed(function, targets):
+    times = []
+    for target in targets:
+        t = time.perf_counter()
+        function(target)
+        times.append(time.perf_counter() - t)
+    return summary(times, 1e3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10_000_000, help="readings to insert")
+    parser.add_argument("--sensors", type=int, default=5000)
+    parser.add_argument("--batch-size", type=int, default=250, help="readings per add_readings() call")
+    parser.add_argument("--period", type=float, default=5.0, help="simulated seconds between a sensor's readings")
+    parser.add_argument("--incident-every", type=int, default=5000, help="readings per incident")
+    parser.add_argument("--store-batch", type=int, default=50_000, help="rows per write transaction")
+    parser.add_argument("--queries", type=int, default=200, help="queries of each kind")
+    parser.add_argument("--start", type=float, default=1_700_000_000.0, help="simulated epoch of the first reading")
+    parser.add_argument("--path", help="database file to fill and keep (default: a temporary one)")
+    args = parser.parse_args()
+
+    workdir = None
+    if args.path is None:
+        workdir = tempfile.TemporaryDirectory()
+        args.path = os.path.join(workdir.name, "history.db")
+    store = Store(args.path, batch=args.store_batch)
+
+    if args.rows:
+        elapsed, call_times, progress, incidents = fill(store, args)
+        written = store.written["readings"]
+        print(f"inserted {written:,} readings and {incidents:,} incidents in {elapsed:.1f}s: "
+              f"{written / elapsed:,.0f} readings/s, dropped {store.dropped}, errors {store.errors}")
+        rates = tenths(progress, 0, written)
+        print(f"readings/s per tenth of the fill: {' '.join(f'{rate / 1e3:,.0f}k' for rate in rates)}")
+        call = summary(call_times, 1e6)
+        print(f"add_readings() on the caller: p50 {call['p50']:.1f} us, p99 {call['p99']:.1f} us, "
+              f"max {call['max']:.0f} us per {args.batch_size} readings")
+
+    counts = store.counts()
+    print(f"database: {counts['readings']:,} readings, {counts['incidents']:,} incidents, "
+          f"{os.path.getsize(args.path) / 1e9:.2f} GB")
+    rng = random.Random(7)
+    with store.engine.connect() as conn:
+        names = [name for (name,) in conn.exec_driver_sql("SELECT name FROM sensors")]
+        first, last = conn.exec_driver_sql("SELECT min(time), max(time) FROM readings").one()
+        incident_ids = [incident_id for (incident_id,) in conn.exec_driver_sql(
+            f"SELECT id FROM incidents ORDER BY random() LIMIT {args.queries}")]
+    sensors = [rng.choice(names) for _ in range(args.queries)]
+    windows = [(name, rng.uniform(first, max(first, last - 600))) for name in sensors]
+    results = {
+        "last": timed(lambda name: store.history(name, last=100), sensors),
+        "range": timed(lambda window: store.history(window[0], window[1], window[1] + 600), windows),
+        "before": timed(lambda incident_id: store.before(incident_id, 300), incident_ids),
+        "incident": timed(store.incident, incident_ids),
+    }
+    print(f"{'query':<10}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, latency in results.items():
+        print(f"{name:<10}{latency['p50']:>10.2f}{latency['p99']:>10.2f}{latency['max']:>10.2f}")
+    store.close()
+    if workdir is not None:
+        workdir.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Per-sensor rolling history: append cost, memory and cross-sensor queries.
+
+Fills a SensorSeries with --sensors virtual sensors (one reading each per
+tick, --ticks ticks) and reports the cost of one append, the memory held,
+and the time of top-k queries over the incremental stats and over a time
+window.
+
+Run from the repo root:
+    python -m benchmarks.bench_timeseries --sensors 10000
+"""
+import argparse
+import time
+
+from lab2.gateway import VirtualSensorBank
+from lab3.timeseries import SensorSeries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sensors", type=int, default=10_000)
+    parser.add_argument("--ticks", type=int, default=5, help="readings per sensor")
+    parser.add_argument("--window", type=int, default=120, help="samples kept per sensor")
+    args = parser.parse_args()
+
+    bank = VirtualSensorBank("bench", args.sensors)
+    series = SensorSeries(window=args.window, max_sensors=args.sensors)
+    elapsed = 0.0
+    for tick in range(args.ticks):
+        readings = bank.sample(now=tick * 5.0)
+        keys = [r["sensor_id"] for r in readings]
+        start = time.perf_counter()
+        series.extend(keys, readings)
+        elapsed += time.perf_counter() - start
+    appended = args.sensors * args.ticks
+
+    print(f"{args.sensors} sensors x {args.window} samples: {series.nbytes / 1e6:.1f} MB "
+          f"({series.nbytes / args.sensors:.0f} B/sensor)")
+    print(f"append: {elapsed / appended * 1e6:.2f} us/reading ({appended / elapsed:,.0f} readings/s)")
+    for label, kwargs in (("top-10 SO2, incremental mean", {}),
+                          ("top-10 SO2, max over last 10 min", {"seconds": 600, "stat": "max"})):
+        start = time.perf_counter()
+        for _ in range(20):
+            series.top_k("SO2_ppm", 10, now=args.ticks * 5.0, **kwargs)
+        print(f"{label}: {(time.perf_counter() - start) / 20 * 1e3:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
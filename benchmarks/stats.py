@@ -0,0 +1,19 @@
+"""Small helpers shared by the benchmark scripts."""
+
+
+def percentile(values, p):
+    """Nearest-rank percentile (p in 0..100) of a list of numbers."""
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, round(p / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def summary(values, scale=1.0):
+    """p50 / p99 / max of values, multiplied by scale (e.g. 1e3 for ms)."""
+    return {
+        "p50": percentile(values, 50) * scale,
+        "p99": percentile(values, 99) * scale,
+        "max": (max(values) if values else float("nan")) * scale,
+    }
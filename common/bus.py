@@ -0,0 +1,118 @@
+"""
+In-process message bus: an alternative transport to XMPP for running all
+the lab agents inside one process.
+
+SPADE behaviours send through `agent.container.send(msg, behaviour)` and
+receive through `agent.dispatch(msg)`. An agent started with
+transport="bus" swaps its SPADE container for the bus and never opens an
+XMPP connection, so send()/receive() and behaviour templates (or the
+coordinator's router) work unchanged while no server is needed. The same
+Message object goes from the sender to the recipient's mailbox: nothing is
+serialized to a stanza or copied.
+
+Only agents on the same bus can talk to each other; a message to a JID
+that is not registered is dropped and counted.
+"""
+import logging
+
+from spade.behaviour import FSMBehaviour
+
+from common.metrics import count_in, instrument
+from common.profiling import is_profile_request
+
+log = logging.getLogger("bus")
+
+TRANSPORTS = ("xmpp", "bus")
+
+
+class MessageBus:
+    """Registry of in-process agents by bare JID, with container-style send()."""
+
+    def __init__(self):
+        self.agents = {}
+        self.delivered = 0
+        self.dropped = 0
+
+    def register(self, agent):
+        self.agents[agent.jid.bare] = agent
+
+    def unregister(self, jid):
+        self.agents.pop(str(jid).split("/")[0], None)
+
+    def has_agent(self, jid):
+        return str(jid).split("/")[0] in self.agents
+
+    async def send(self, msg, behaviour=None):
+        """Hand msg straight to the recipient's dispatch() (templates / router apply as usual)."""
+        agent = self.agents.get(msg.to.bare)
+        if agent is None:
+            self.dropped += 1
+            log.warning("Bus: no agent %s registered, message from %s dropped", msg.to, msg.sender)
+            return
+        self.delivered += 1
+        agent.dispatch(msg)
+
+    def stats(self):
+        return {"agents": len(self.agents), "delivered": self.delivered, "dropped": self.dropped}
+
+
+# Shared by every agent in the process that runs with transport="bus"
+BUS = MessageBus()
+
+
+class BusTransport:
+    """
+    Mixin for spade Agents (put it before Agent in the bases) adding the
+    transport choice. Call use_transport() from __init__ after
+    Agent.__init__. It also attaches the agent's message counters
+    (common/metrics.py) and hands profile requests to agent.control
+    (common/profiling.py): agents that override dispatch() without calling
+    this one should do both themselves.
+    """
+
+    transport = "xmpp"
+    control = None  # ControlBehaviour, see enable_profiling()
+
+    def use_transport(self, transport, bus=None):
+        if transport not in TRANSPORTS:
+            raise ValueError(f"Unknown transport: {transport}")
+        self.transport = transport
+        if transport == "bus":
+            self.container.unregister(str(self.jid))  # SPADE's own in-process container
+            self.container = bus or BUS
+            self.container.register(self)
+        instrument(self)
+
+    def dispatch(self, msg):
+        count_in(self)
+        if self.control is not None and is_profile_request(msg):
+            self.control.queue.put_nowait(msg)
+            return []
+        return super().dispatch(msg)
+
+    async def _async_start(self, auto_register=True):
+        if self.transport != "bus":
+            return await super()._async_start(auto_register=auto_register)
+        # Agent._async_start without the XMPP client, presence and connection
+        await self._hook_plugin_before_connection()
+        log.info("Agent %s started on the in-process bus", self.jid)
+        await self._hook_plugin_after_connection()
+        await self.setup()
+        self._alive.set()
+        for behaviour in self.behaviours:
+            if not behaviour.is_running:
+                behaviour.set_agent(self)
+                if issubclass(type(behaviour), FSMBehaviour):
+                    for _, state in behaviour.get_states().items():
+                        state.set_agent(self)
+                behaviour.start()
+
+    async def _async_stop(self):
+        if self.transport != "bus":
+            return await super()._async_stop()
+        for behaviour in self.behaviours:
+            behaviour.kill()
+        if self.web.is_started():
+            await self.web.runner.cleanup()
+        self._alive.clear()
+        self.container.unregister(self.jid)
@@ -0,0 +1,62 @@
+"""
+Simulation clock shared by the lab agents.
+
+Every simulated duration (sensing period, ALERT/RECOVERY delays, rescue
+task time, confirmation and receive timeouts) goes through CLOCK instead
+of calling time / asyncio directly. At speed 1 it is the real clock. At
+speed N simulated time runs N times faster than wall time: a 5 s sensing
+period fires every 5/N s, a 30 s rescue takes 30/N s, and CLOCK.time()
+and CLOCK.monotonic() report simulated seconds so timestamps, latencies
+and the rescue pool's predictions stay in simulated units.
+
+SPADE schedules PeriodicBehaviour and receive() timeouts on the real
+clock, so agents pass CLOCK.real(seconds) for those.
+"""
+import asyncio
+import time
+
+from config import SIM_SPEED
+
+
+class SimClock:
+    def __init__(self, speed=1.0):
+        self._real_origin = time.monotonic()
+        self._sim_origin = self._real_origin
+        self._wall_origin = time.time()
+        self._speed = float(speed)
+
+    @property
+    def speed(self):
+        return self._speed
+
+    @speed.setter
+    def speed(self, speed):
+        """Change the speed without making simulated time jump."""
+        if speed <= 0:
+            raise ValueError("Clock speed must be positive")
+        self._sim_origin, self._wall_origin = self.monotonic(), self.time()
+        self._real_origin = time.monotonic()
+        self._speed = float(speed)
+
+    def monotonic(self):
+        """Simulated seconds on a monotonic scale (for durations and deadlines)."""
+        return self._sim_origin + (time.monotonic() - self._real_origin) * self._speed
+
+    def time(self):
+        """Simulated wall-clock time in epoch seconds (for reading timestamps)."""
+        return self._wall_origin + (time.monotonic() - self._real_origin) * self._speed
+
+    def real(self, seconds):
+        """Wall seconds that `seconds` of simulated time take."""
+        return None if seconds is None else seconds / self._speed
+
+    async def sleep(self, seconds):
+        await asyncio.sleep(seconds / self._speed)
+
+    async def wait_for(self, awaitable, timeout):
+        """asyncio.wait_for with a simulated timeout."""
+        return await asyncio.wait_for(awaitable, self.real(timeout))
+
+
+# The process-wide clock, at config.SIM_SPEED
+CLOCK = SimClock(SIM_SPEED)
@@ -0,0 +1,167 @@
+"""
+Logging shared by the lab agents: one configuration, no file I/O on the
+event loop.
+
+Agent modules call setup_logging() instead of logging.basicConfig(). The
+first call puts a QueueHandler on the root logger. Records go onto the
+queue as they are, and a QueueListener thread formats and writes them,
+so the event loop never waits on a file or the terminal. Formatting is
+deferred too: call sites pass %-style arguments (log.info("got %s", data))
+and the message is only built on the listener thread, for records that
+pass the level and rate checks. Don't mutate an object after logging it.
+
+Records are routed by logger name. "sensor", "coordinator" and "rescue"
+(and their children, e.g. "coordinator.incidents") go to that agent's
+file. Everything else (spade, slixmpp, the root logger) goes to the file
+of the first agent set up in the process, as basicConfig used to. The
+"console" logger writes to stdout; hot paths use it instead of print().
+
+Repetitive lines are rate-limited per call site. Beyond LOG_RATE records
+a second with the same logger and message template, records below
+WARNING are dropped, and the next one let through says how many were.
+LOG_QUEUE=0 writes on the calling thread instead, for comparison.
+"""
+import atexit
+import logging
+import logging.handlers
+import queue
+import sys
+import time
+
+from config import LOG_LEVEL, LOG_QUEUE, LOG_RATE
+
+# print() replacement for hot paths: same output, written by the listener thread
+console = logging.getLogger("console")
+console.setLevel(logging.INFO)
+
+_router = None
+_listener = None
+
+
+class RateLimit(logging.Filter):
+    """Passes at most `rate` records per second per (logger, message template) below WARNING."""
+
+    MAX_KEYS = 10000  # f-string call sites make a new template per call; don't grow forever
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+        self.windows = {}  # (logger, template) -> [window start, passed, suppressed]
+        self.suppressed = 0
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        window = self.windows.get(key)
+        if window is None or now - window[0] >= 1.0:
+            if window is None and len(self.windows) >= self.MAX_KEYS:
+                self.windows.clear()
+            dropped = window[2] if window else 0
+            self.windows[key] = [now, 1, 0]
+            if dropped:
+                record.msg = f"{record.msg} [{dropped} similar line(s) suppressed]"
+            return True
+        if window[1] < self.rate:
+            window[1] += 1
+            return True
+        window[2] += 1
+        self.suppressed += 1
+        return False
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # QueueHandler.prepare() formats here, on the logging thread; leave it to the listener
+        return record
+
+
+class _Stdout(logging.StreamHandler):
+    """StreamHandler on whatever sys.stdout is at emit time (so redirect_stdout still works)."""
+
+    def emit(self, record):
+        self.stream = sys.stdout
+        super().emit(record)
+
+
+class _Router(logging.Handler):
+    """Hands each record to the handler of its logger (or closest parent) name, or the default."""
+
+    def __init__(self):
+        super().__init__()
+        self.routes = {}
+        self.default = None
+        self._cache = {}
+
+    def add(self, name, handler, default=False):
+        self.routes[name] = handler
+        if default or self.default is None and name != "console":
+            self.default = handler
+        self._cache.clear()
+
+    def handler_for(self, name):
+        handler = self._cache.get(name)
+        if handler is None:
+            prefix = name
+            while prefix and prefix not in self.routes:
+                prefix = prefix.rpartition(".")[0]
+            handler = self._cache[name] = self.routes.get(prefix, self.default)
+        return handler
+
+    def emit(self, record):
+        handler = self.handler_for(record.name)
+        if handler is not None:
+            handler.handle(record)
+
+    def flush(self):
+        for handler in self.routes.values():
+            handler.flush()
+
+
+def setup_logging(name, filename, fmt, datefmt=None):
+    """
+    Send logger `name` (and its children) to `filename` with format `fmt`,
+    installing the shared queue and listener on the first call. Returns
+    the logger.
+    """
+    global _router, _listener
+    if _router is None:
+        _router = _Router()
+        stdout = _Stdout()
+        stdout.setFormatter(logging.Formatter("%(message)s"))
+        _router.add("console", stdout)
+
+        # No format here uses caller, thread or process info; skip collecting it per record
+        # (the "Optimization" section of the logging docs)
+        logging._srcfile = None
+        logging.logThreads = logging.logProcesses = logging.logMultiprocessing = False
+
+        root = logging.getLogger()
+        root.setLevel(LOG_LEVEL)
+        if LOG_QUEUE:
+            records = queue.SimpleQueue()
+            handler = _DeferredQueueHandler(records)
+            _listener = logging.handlers.QueueListener(records, _router)
+            _listener.start()
+            atexit.register(_listener.stop)  # drains what is still queued
+        else:
+            handler = _router
+        if LOG_RATE:
+            handler.addFilter(RateLimit(LOG_RATE))
+        root.addHandler(handler)
+
+    if name not in _router.routes:
+        file_handler = logging.FileHandler(filename)
+        file_handler.setFormatter(logging.Formatter(fmt, datefmt))
+        _router.add(name, file_handler)
+    return logging.getLogger(name)
+
+
+def flush_logs():
+    """Block until every record queued so far has been written (tests, benchmarks, shutdown)."""
+    if _listener is not None:
+        _listener.stop()
+        _listener.start()
+    elif _router is not None:
+        _router.flush()
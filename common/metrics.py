@@ -0,0 +1,290 @@
+"""
+Counters, gauges and histograms for the lab agents, exposed in the
+Prometheus text format on SPADE's bundled aiohttp web server.
+
+Recording is meant to stay on the hot path: callers look a metric child
+up once (METRICS.counter(name, help, agent=jid)) and then only do
+`child.inc()` or `child.observe(seconds)`, which costs an attribute add
+or a bisect. Label sets are fixed when the child is created. METRICS=0
+in the environment swaps every child for a no-op one, so the
+instrumentation cost can be measured against running without it (see
+benchmarks/bench_metrics.py).
+
+The registry is process-wide, so one endpoint per process shows every
+agent in it: serve_metrics(agent, port) adds GET /metrics to that
+agent's web app and starts it, along with the loop report and profile
+capture of common/profiling.py.
+
+What is recorded:
+- agent_messages_in_total / agent_messages_out_total per agent
+- agent_mailbox_depth (now) and agent_mailbox_depth_max per agent
+- fsm_state_seconds (time in a state's run(), minus receive waits) and
+  fsm_receive_wait_seconds, per agent and state: the coordinator's
+  MonitoringState FSM state (TimedState) and the AlertState,
+  RespondingState and RecoveryState each incident runs on its own task
+  (lab3/incidents.py, where delays, allocation and the rescue reply count
+  as waits)
+- codec_seconds per operation (encode/decode), schema and encoding
+- rescue_round_trip_seconds (request sent to reply, simulated seconds)
+  per unit and outcome, on the coordinator
+- rescue_deployment_seconds (simulated task time) per rescue unit
+"""
+import time
+from bisect import bisect_left
+
+from config import METRICS_ENABLED
+
+# Seconds, roughly x2.5 apart: 50 us .. 120 s
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+class Counter:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def samples(self, name, labels):
+        yield name, labels, self.value
+
+
+class Gauge:
+    """A value that is set, or read from a callback at scrape time."""
+
+    __slots__ = ("value", "function")
+
+    def __init__(self, function=None):
+        self.value = 0
+        self.function = function
+
+    def set(self, value):
+        self.value = value
+
+    def set_max(self, value):
+        if value > self.value:
+            self.value = value
+
+    def samples(self, name, labels):
+        yield name, labels, self.function() if self.function else self.value
+
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.bounds = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.bounds + (float("inf"),), self.counts):
+            cumulative += count
+            yield f"{name}_bucket", labels + (("le", _number(bound)),), cumulative
+        yield f"{name}_sum", labels, self.sum
+        yield f"{name}_count", labels, self.count
+
+
+class _Noop:
+    """Stands in for every metric when METRICS=0."""
+
+    __slots__ = ()
+    value = sum = count = 0
+
+    def inc(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+    def set_max(self, value):
+        pass
+
+    def observe(self, value):
+        pass
+
+
+NOOP = _Noop()
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Registry:
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.families = {}  # name -> (type, help, {label tuple: metric})
+
+    def _child(self, kind, name, help, labels, make):
+        if not self.enabled:
+            return NOOP
+        family = self.families.get(name)
+        if family is None:
+            family = self.families[name] = (kind, help, {})
+        elif family[0] != kind:
+            raise ValueError(f"Metric {name} is a {family[0]}, not a {kind}")
+        key = tuple(sorted(labels.items()))
+        metric = family[2].get(key)
+        if metric is None:
+            metric = family[2][key] = make()
+        return metric
+
+    def counter(self, name, help, **labels):
+        return self._child("counter", name, help, labels, Counter)
+
+    def gauge(self, name, help, function=None, **labels):
+        return self._child("gauge", name, help, labels, lambda: Gauge(function))
+
+    def histogram(self, name, help, buckets=LATENCY_BUCKETS, **labels):
+        return self._child("histogram", name, help, labels, lambda: Histogram(buckets))
+
+    def render(self):
+        """The registry in the Prometheus text exposition format (0.0.4)."""
+        lines = []
+        for name, (kind, help, children) in sorted(self.families.items()):
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, metric in children.items():
+                for sample, sample_labels, value in metric.samples(name, labels):
+                    text = ",".join(f'{key}="{_escape(val)}"' for key, val in sample_labels)
+                    lines.append(f"{sample}{{{text}}} {_number(value)}" if text else f"{sample} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+# Shared by every agent in the process
+METRICS = Registry(enabled=METRICS_ENABLED)
+
+
+class MeteredContainer:
+    """Wraps an agent's container (SPADE's or the bus) to count what the agent sends."""
+
+    def __init__(self, container, sent):
+        self.container = container
+        self.sent = sent
+
+    async def send(self, msg, behaviour):
+        self.sent.inc()
+        await self.container.send(msg, behaviour)
+
+    def __getattr__(self, name):
+        return getattr(self.container, name)
+
+
+class AgentMetrics:
+    """Per-agent metric children; see instrument()."""
+
+    def __init__(self, agent):
+        jid = str(agent.jid.bare)
+        self.jid = jid
+        self.messages_in = METRICS.counter("agent_messages_in_total", "Messages dispatched to the agent", agent=jid)
+        self.messages_out = METRICS.counter("agent_messages_out_total", "Messages the agent sent", agent=jid)
+        self.mailbox_max = METRICS.gauge("agent_mailbox_depth_max", "Deepest behaviour mailboxes seen, summed",
+                                         agent=jid)
+        METRICS.gauge("agent_mailbox_depth", "Messages waiting in the agent's behaviour mailboxes",
+                      function=lambda: mailbox_depth(agent), agent=jid)
+        self._states = {}
+
+    def state(self, name):
+        """(run time, receive wait) histograms for FSM state `name`."""
+        pair = self._states.get(name)
+        if pair is None:
+            pair = self._states[name] = (
+                METRICS.histogram("fsm_state_seconds", "Time in a state's run(), excluding receive waits",
+                                  agent=self.jid, state=name),
+                METRICS.histogram("fsm_receive_wait_seconds", "Time a state waited in receive()",
+                                  agent=self.jid, state=name),
+            )
+        return pair
+
+
+def mailbox_depth(agent):
+    return sum(behaviour.mailbox_size() for behaviour in agent.behaviours)
+
+
+def instrument(agent):
+    """Attach AgentMetrics to agent.metrics and count its outgoing messages. Call after the container is final."""
+    agent.metrics = AgentMetrics(agent)
+    if METRICS.enabled:
+        agent.container = MeteredContainer(agent.container, agent.metrics.messages_out)
+    return agent.metrics
+
+
+def count_in(agent):
+    """Call from dispatch(): counts the message and tracks the deepest mailboxes."""
+    metrics = agent.metrics
+    metrics.messages_in.inc()
+    if METRICS.enabled:
+        metrics.mailbox_max.set_max(mailbox_depth(agent))
+
+
+class TimedState:
+    """
+    Mixin for spade FSM States (put it before State): records how long each
+    run() takes, split into receive waits and the rest.
+    """
+
+    async def on_start(self):
+        self._run_time, self._wait_time = self.agent.metrics.state(type(self).__name__)
+        self._waited = 0.0
+        self._started = time.perf_counter()
+        await super().on_start()
+
+    async def receive(self, timeout=None):
+        return await self.wait(self._fsm_receive(timeout))
+
+    async def wait(self, awaitable):
+        """Await something the state is idle on (a mailbox other than receive()), timed as a receive wait."""
+        start = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            waited = time.perf_counter() - start
+            self._waited += waited
+            self._wait_time.observe(waited)
+
+    async def on_end(self):
+        self._run_time.observe(time.perf_counter() - self._started - self._waited)
+        await super().on_end()
+
+    def __setattr__(self, name, value):
+        # FSMBehaviour sets state.receive to its own receive before each run; wrap it instead
+        if name == "receive":
+            name = "_fsm_receive"
+        super().__setattr__(name, value)
+
+
+async def _metrics_handler(request):
+    from aiohttp import web
+    return web.Response(text=METRICS.render(), headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+
+_served = False
+
+
+def serve_metrics(agent, port, hostname="localhost"):
+    """Serve the process-wide registry at http://hostname:port/metrics through agent's web app (once per process)."""
+    from common.profiling import add_routes
+    global _served
+    if _served or not port:
+        return
+    _served = True
+    agent.web.add_get("/metrics", _metrics_handler, None, raw=True)
+    add_routes(agent.web)
+    agent.web.start(hostname=hostname, port=port)
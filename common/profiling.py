@@ -0,0 +1,322 @@
+"""
+Event-loop health for the lab agents: a lag monitor that names the
+behaviours hogging the loop, and profiles captured from a running agent.
+
+Every agent of a process shares one asyncio loop, so one slow run() stalls
+all the others. LOOP_MONITOR (one per process, started by
+enable_profiling()) measures this two ways:
+
+- lag: a probe task sleeps LOOP_PROBE seconds at a time and records how
+  late it wakes up (event_loop_lag_seconds, plus percentiles over the
+  last minute in report()).
+- slow callbacks: every callback the loop runs is timed, and the ones
+  taking LOOP_SLOW seconds or more are attributed to the innermost spade
+  behaviour (or FSM state) of their task, e.g.
+  "SensorAgent.GatewayBehaviour", or else to the coroutine or function
+  name (event_loop_slow_callback_seconds per callback). This hooks
+  asyncio's own Handle, so under uvloop (launch.py) only lag is measured.
+
+A summary is logged every LOOP_REPORT seconds and served at GET /loop.
+
+Profiles are captured on demand, without restarting the agent, for a
+fixed number of seconds and written to PROFILE_DIR:
+
+- "cprofile": deterministic, every call on the loop thread; a pstats
+  file (python -m pstats, snakeviz).
+- "sample": the loop thread's stack every 5 ms from a helper thread,
+  much cheaper; collapsed stacks, one "frame;frame;frame count" line
+  each (flamegraph.pl, speedscope).
+
+Ask for one with POST /profile?kind=sample&seconds=10 on the metrics port,
+or by sending the agent a "request" message with ontology "profile"
+(metadata "kind" and "seconds") from one of PROFILE_REQUESTERS; the reply
+is an "inform" whose body is the file path, or a "failure" with the
+reason (other senders get a "refuse"). A label (the file name prefix) may only use letters, digits and
+"_.-", so a request cannot write outside PROFILE_DIR.
+"""
+import asyncio
+import asyncio.events
+import collections
+import cProfile
+import logging
+import re
+import sys
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+from spade.behaviour import CyclicBehaviour, FSMBehaviour
+from spade.message import Message
+from slixmpp import JID
+from spade.template import Template
+
+from common.metrics import METRICS
+from config import LOOP_MONITOR_ENABLED, LOOP_PROBE, LOOP_REPORT, LOOP_SLOW, PROFILE_DIR, PROFILE_REQUESTERS
+
+log = logging.getLogger("loop")
+
+PROFILERS = {"cprofile": "prof", "sample": "folded"}
+MAX_PROFILE_SECONDS = 600
+SAMPLE_INTERVAL = 0.005
+# Profile file name prefixes: no path separators, so files stay in PROFILE_DIR
+_LABEL = re.compile(r"[A-Za-z0-9_.-]+")
+
+
+def describe(handle):
+    """Name of what a loop callback runs: a spade behaviour, a coroutine or a plain function."""
+    callback = handle._callback
+    task = getattr(callback, "__self__", None)  # Task steps and wakeups are bound to their task
+    if not isinstance(task, asyncio.Task):
+        return getattr(callback, "__qualname__", type(callback).__name__)
+    coro = outer = task.get_coro()
+    name = None
+    while coro is not None:
+        frame = getattr(coro, "cr_frame", None)
+        owner = frame.f_locals.get("self") if frame is not None else None
+        if isinstance(owner, FSMBehaviour):  # between states: name the one it is in
+            owner = owner.get_states().get(owner.current_state, owner)
+        if isinstance(owner, CyclicBehaviour):  # every spade behaviour and FSM state
+            name = type(owner).__qualname__
+        coro = getattr(coro, "cr_await", None)
+    return name or getattr(outer, "__qualname__", task.get_name())
+
+
+class LoopMonitor:
+    def __init__(self, probe=LOOP_PROBE, slow=LOOP_SLOW, report_every=LOOP_REPORT, window=60.0):
+        self.probe = probe  # Seconds between lag probes
+        self.slow = slow  # Callbacks at least this long are attributed
+        self.report_every = report_every  # Seconds between logged summaries (0 = never)
+        self.lags = collections.deque(maxlen=max(int(window / probe), 1))
+        self.callbacks = {}  # name -> [count, total seconds, max seconds]
+        self.lag = METRICS.histogram("event_loop_lag_seconds", "How late the loop ran a probe sleeping LOOP_PROBE")
+        self._task = None
+        self._original_run = None
+
+    def start(self):
+        """Start probing the running loop and timing its callbacks (idempotent)."""
+        if self._task is not None:
+            return
+        loop = asyncio.get_running_loop()
+        self._task = loop.create_task(self._probe(), name="loop-monitor")
+        if not isinstance(loop, asyncio.BaseEventLoop):  # uvloop runs its own handles
+            log.info("Loop monitor on %s: measuring lag only, callbacks are not timed", type(loop).__name__)
+        elif self._original_run is None:
+            original, monitor = asyncio.events.Handle._run, self
+
+            def _run(handle):
+                start = time.perf_counter()
+                original(handle)
+                elapsed = time.perf_counter() - start
+                if elapsed >= monitor.slow:
+                    monitor.slow_callback(handle, elapsed)
+
+            self._original_run = original
+            asyncio.events.Handle._run = _run
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        if self._original_run is not None:
+            asyncio.events.Handle._run = self._original_run
+            self._original_run = None
+
+    async def _probe(self):
+        reported = time.monotonic()
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.probe)
+            lag = max(time.perf_counter() - start - self.probe, 0.0)
+            self.lags.append(lag)
+            self.lag.observe(lag)
+            if self.report_every and time.monotonic() - reported >= self.report_every:
+                reported = time.monotonic()
+                self.log_report()
+
+    def slow_callback(self, handle, elapsed):
+        name = describe(handle)
+        entry = self.callbacks.get(name)
+        if entry is None:
+            entry = self.callbacks[name] = [0, 0.0, 0.0,
+                                            METRICS.histogram("event_loop_slow_callback_seconds",
+                                                              "Loop callbacks that took LOOP_SLOW or longer",
+                                                              callback=name)]
+        entry[0] += 1
+        entry[1] += elapsed
+        entry[2] = max(entry[2], elapsed)
+        entry[3].observe(elapsed)
+
+    def report(self, top=5):
+        """Lag percentiles over the recent window (ms) and the slowest callbacks by total time."""
+        lags = np.fromiter(self.lags, float, len(self.lags)) * 1e3
+        p50, p99 = np.percentile(lags, [50, 99]) if len(lags) else (0.0, 0.0)
+        slowest = sorted(self.callbacks.items(), key=lambda item: item[1][1], reverse=True)[:top]
+        return {
+            "lag_ms": {"p50": round(float(p50), 3), "p99": round(float(p99), 3),
+                       "max": round(float(lags.max()), 3) if len(lags) else 0.0, "samples": len(lags)},
+            "slow_callbacks": [{"callback": name, "count": count, "total_ms": round(total * 1e3, 1),
+                                "max_ms": round(longest * 1e3, 1)}
+                               for name, (count, total, longest, _) in slowest],
+        }
+
+    def log_report(self):
+        report = self.report()
+        lag = report["lag_ms"]
+        slowest = ", ".join(f"{entry['callback']} {entry['count']}x max {entry['max_ms']} ms"
+                            for entry in report["slow_callbacks"]) or "none"
+        log.info("Loop lag p50 %.2f ms, p99 %.2f ms, max %.2f ms; slow callbacks (>= %g ms): %s",
+                 lag["p50"], lag["p99"], lag["max"], self.slow * 1e3, slowest)
+
+
+# One per process, like the loop it watches
+LOOP_MONITOR = LoopMonitor()
+
+
+class _StackSampler(threading.Thread):
+    """Counts the stacks one thread is in, every `interval` seconds."""
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self.done = threading.Event()
+
+    def run(self):
+        while not self.done.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_qualname} ({Path(code.co_filename).name}:{frame.f_lineno})")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(stack))] += 1
+
+    def write(self, path):
+        with open(path, "w") as out:
+            for stack, count in self.stacks.most_common():
+                out.write(f"{stack} {count}\n")
+
+
+_capturing = False
+
+
+async def capture(kind="sample", seconds=10.0, label="agent", directory=PROFILE_DIR):
+    """
+    Profile the running loop for `seconds` and return the path written.
+    Raises ValueError for bad arguments and RuntimeError while another
+    capture is running (one at a time per process).
+    """
+    global _capturing
+    if kind not in PROFILERS:
+        raise ValueError(f"Unknown profiler {kind!r}, expected one of {', '.join(PROFILERS)}")
+    if not _LABEL.fullmatch(str(label)):
+        raise ValueError("label may only contain letters, digits, '_', '.' and '-'")
+    seconds = float(seconds)
+    if not 0 < seconds <= MAX_PROFILE_SECONDS:
+        raise ValueError(f"seconds must be in (0, {MAX_PROFILE_SECONDS}]")
+    if _capturing:
+        raise RuntimeError("A profile is already being captured")
+    _capturing = True
+    try:
+        path = Path(directory) / f"{label}-{time.strftime('%Y%m%d-%H%M%S')}-{kind}.{PROFILERS[kind]}"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        log.info("Capturing a %gs %s profile to %s", seconds, kind, path)
+        if kind == "cprofile":
+            profiler = cProfile.Profile()  # profiles the thread that enables it: the loop's
+            profiler.enable()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                profiler.disable()
+            await asyncio.to_thread(profiler.dump_stats, path)
+        else:
+            sampler = _StackSampler(threading.get_ident())
+            sampler.start()
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                sampler.done.set()
+            await asyncio.to_thread(sampler.join)
+            await asyncio.to_thread(sampler.write, path)
+        log.info("Profile written to %s", path)
+        return path
+    finally:
+        _capturing = False
+
+
+# What ControlBehaviour answers; with spade's own dispatch() it must get nothing else
+PROFILE_REQUEST = {"ontology": "profile", "performative": "request"}
+# Who may send one
+_REQUESTERS = {JID(jid).bare for jid in PROFILE_REQUESTERS if jid}
+
+
+def is_profile_request(msg):
+    return all(msg.get_metadata(key) == value for key, value in PROFILE_REQUEST.items())
+
+
+class ControlBehaviour(CyclicBehaviour):
+    """Answers profile requests; the agent's dispatch() hands them over, see enable_profiling()."""
+
+    async def run(self):
+        msg = await self.receive(timeout=10)
+        if msg:
+            self.agent.submit(self.answer(msg))  # don't hold up the next request's "busy" answer
+
+    async def answer(self, msg):
+        reply = Message(to=str(msg.sender), sender=str(self.agent.jid), thread=msg.thread)
+        reply.set_metadata("ontology", "profile")
+        if msg.sender.bare not in _REQUESTERS:
+            log.warning("Profile request from %s refused: not in PROFILE_REQUESTERS", msg.sender)
+            reply.set_metadata("performative", "refuse")
+            reply.body = "Not allowed to request profiles"
+            await self.send(reply)
+            return
+        try:
+            path = await capture(msg.get_metadata("kind") or "sample", msg.get_metadata("seconds") or 10,
+                                 label=self.agent.jid.user)
+        except (ValueError, RuntimeError) as e:
+            reply.set_metadata("performative", "failure")
+            reply.body = str(e)
+        else:
+            reply.set_metadata("performative", "inform")
+            reply.body = str(path)
+        await self.send(reply)
+
+
+def enable_profiling(agent):
+    """
+    From an agent's setup(): start LOOP_MONITOR (once per process) and
+    answer profile requests. The behaviour's template keeps spade's
+    dispatch() from handing it anything else (a deploy request must not
+    start a capture); a dispatch() override must pass messages for which
+    is_profile_request() holds to agent.control (BusTransport does).
+    """
+    if LOOP_MONITOR_ENABLED:
+        LOOP_MONITOR.start()
+    agent.control = ControlBehaviour()
+    agent.add_behaviour(agent.control, Template(metadata=dict(PROFILE_REQUEST)))
+
+
+async def _loop_handler(request):
+    from aiohttp import web
+    return web.json_response(LOOP_MONITOR.report())
+
+
+async def _profile_handler(request):
+    from aiohttp import web
+    try:
+        path = await capture(request.query.get("kind", "sample"), request.query.get("seconds", 10),
+                             label=request.query.get("label", "process"))
+    except ValueError as e:
+        return web.json_response({"error": str(e)}, status=400)
+    except RuntimeError as e:
+        return web.json_response({"error": str(e)}, status=409)
+    return web.json_response({"path": str(path)})
+
+
+def add_routes(web):
+    """GET /loop and POST /profile on a spade agent's web app (see common/metrics.serve_metrics)."""
+    web.add_get("/loop", _loop_handler, None, raw=True)
+    web.add_post("/profile", _profile_handler, None, raw=True)
@@ -0,0 +1,254 @@
+"""
+Typed messages shared by the lab agents.
+
+    SensorReading   one reading of one sensor             sensor → coordinator
+    DeployRequest   what a rescue unit is asked to do      coordinator → rescue
+    RescueResult    how a deployment went                  rescue → coordinator
+    ReadingBatch    many readings as NumPy columns         gateway → coordinator
+
+The first three are slotted records: fixed attributes, no per-instance
+__dict__, and no checks in the constructor. Validation happens once, where
+data enters an agent: from_dict() parses a decoded wire body (a JSON
+object, or what common.codec's packed decoder returns), casts every field
+and raises ValueError naming the first bad one. Past that edge the agents
+use the attributes as they are, with no .get() defaults or float() casts
+on every hop. to_dict() gives the JSON form back, keys in wire order.
+
+ReadingBatch keeps a gateway tick as columns (the shape lab2.environment
+generates them in), so the packed codec encodes a whole batch with a few
+array operations and nothing is built per reading unless asked for.
+
+The codec accepts these types wherever it accepts the matching dicts, and
+read_body(msg, typed=True) decodes straight into them (TYPES).
+"""
+import math
+
+import numpy as np
+
+# Statuses and actions travel as small integer codes in the packed format
+STATUSES = ("dormant", "active", "erupting", "unknown")
+ACTIONS = ("deploy", "respond")
+RESULTS = ("completed", "failed", "rejected")
+
+# Numeric reading fields and their fixed-point scale (values are rounded to 2-3 decimals)
+READING_COLUMNS = (
+    ("CO2_ppm", 100),
+    ("SO2_ppm", 100),
+    ("vibration_mm_s", 100),
+    ("temperature_C", 100),
+    ("ash_density_g_m3", 1000),
+    ("population_risk", 100),
+    ("lava_flow_m3_s", 100),
+    ("area_affected_km2", 100),
+)
+NUMERIC = tuple(name for name, _ in READING_COLUMNS)
+
+# Key order of a reading dict, as lab2's generators and gateway produce it
+READING_KEYS = ("sensor_id", "timestamp", "status", "CO2_ppm", "SO2_ppm", "vibration_mm_s", "temperature_C",
+                "ash_density_g_m3", "population_risk", "lava_flow_m3_s", "emergency", "area_affected_km2")
+
+
+def _number(data, name, default=None):
+    value = data.get(name, default)
+    if type(value) is not float:
+        if value is None:
+            raise ValueError(f"{name} is missing")
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"{name} is not a number: {value!r}") from None
+    if not math.isfinite(value):
+        raise ValueError(f"{name} is not finite: {value!r}")
+    return value
+
+
+def _choice(data, name, choices, default=None):
+    value = data.get(name, default)
+    if value not in choices:
+        raise ValueError(f"{name} must be one of {', '.join(choices)}: {value!r}")
+    return value
+
+
+class _Record:
+    """to_dict / repr / == for the slotted records below; slot order is wire order."""
+
+    __slots__ = ()
+
+    def to_dict(self):
+        return dict(zip(self.__slots__, self._values()))
+
+    def _values(self):
+        return [getattr(self, name) for name in self.__slots__]
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(getattr(self, n) == getattr(other, n) for n in self.__slots__)
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class SensorReading(_Record):
+    __slots__ = READING_KEYS
+
+    def __init__(self, sensor_id, timestamp, status, CO2_ppm, SO2_ppm, vibration_mm_s, temperature_C,
+                 ash_density_g_m3, population_risk, lava_flow_m3_s, emergency, area_affected_km2):
+        self.sensor_id = sensor_id
+        self.timestamp = timestamp
+        self.status = status
+        self.CO2_ppm = CO2_ppm
+        self.SO2_ppm = SO2_ppm
+        self.vibration_mm_s = vibration_mm_s
+        self.temperature_C = temperature_C
+        self.ash_density_g_m3 = ash_density_g_m3
+        self.population_risk = population_risk
+        self.lava_flow_m3_s = lava_flow_m3_s
+        self.emergency = emergency
+        self.area_affected_km2 = area_affected_km2
+
+    def _values(self):
+        return (self.sensor_id, self.timestamp, self.status, self.CO2_ppm, self.SO2_ppm, self.vibration_mm_s,
+                self.temperature_C, self.ash_density_g_m3, self.population_risk, self.lava_flow_m3_s, self.emergency,
+                self.area_affected_km2)
+
+    @classmethod
+    def from_dict(cls, data, sensor_id="", timestamp=0.0):
+        """A validated reading; `sensor_id` / `timestamp` fill in for a body without them."""
+        reading = cls.__new__(cls)
+        reading.sensor_id = str(data.get("sensor_id", sensor_id))
+        reading.timestamp = _number(data, "timestamp", timestamp)
+        reading.status = _choice(data, "status", STATUSES)
+        reading.emergency = bool(data.get("emergency", False))
+        for name in NUMERIC:
+            setattr(reading, name, _number(data, name))
+        return reading
+
+
+class DeployRequest(_Record):
+    __slots__ = ("action", "emergency", "area_affected_km2", "population_risk", "lava_flow_m3_s", "status")
+
+    def __init__(self, action, emergency, area_affected_km2, population_risk, lava_flow_m3_s, status):
+        self.action = action
+        self.emergency = emergency
+        self.area_affected_km2 = area_affected_km2
+        self.population_risk = population_risk
+        self.lava_flow_m3_s = lava_flow_m3_s
+        self.status = status
+
+    def _values(self):
+        return (self.action, self.emergency, self.area_affected_km2, self.population_risk, self.lava_flow_m3_s,
+                self.status)
+
+    @classmethod
+    def from_reading(cls, reading):
+        """The deployment for an emergency reading (a reading dict or SensorReading)."""
+        if isinstance(reading, SensorReading):
+            return cls("deploy", reading.emergency, reading.area_affected_km2, reading.population_risk,
+                       reading.lava_flow_m3_s, reading.status)
+        return cls("deploy", bool(reading.get("emergency", True)), _number(reading, "area_affected_km2", 0.0),
+                   _number(reading, "population_risk", 0.0), _number(reading, "lava_flow_m3_s", 0.0),
+                   _choice(reading, "status", STATUSES, "unknown"))
+
+    @classmethod
+    def from_dict(cls, data):
+        """A validated request from a decoded deploy body (fields a sender left out take their defaults)."""
+        return cls(_choice(data, "action", ACTIONS, "respond"), bool(data.get("emergency", False)),
+                   _number(data, "area_affected_km2", 0.0), _number(data, "population_risk", 0.0),
+                   _number(data, "lava_flow_m3_s", 0.0), _choice(data, "status", STATUSES, "unknown"))
+
+
+class RescueResult(_Record):
+    __slots__ = ("result", "agent", "task_time_s", "handled_area_km2", "population_risk", "lava_flow_m3_s")
+
+    def __init__(self, result, agent, task_time_s=0, handled_area_km2=0.0, population_risk=0.0,
+                 lava_flow_m3_s=0.0):
+        self.result = result
+        self.agent = agent
+        self.task_time_s = task_time_s
+        self.handled_area_km2 = handled_area_km2
+        self.population_risk = population_risk
+        self.lava_flow_m3_s = lava_flow_m3_s
+
+    def _values(self):
+        return (self.result, self.agent, self.task_time_s, self.handled_area_km2, self.population_risk,
+                self.lava_flow_m3_s)
+
+    @classmethod
+    def from_dict(cls, data):
+        """A validated result from a decoded result body."""
+        task_time = _number(data, "task_time_s", 0)
+        return cls(_choice(data, "result", RESULTS), str(data.get("agent", "")),
+                   int(task_time) if task_time.is_integer() else task_time,
+                   _number(data, "handled_area_km2", 0.0), _number(data, "population_risk", 0.0),
+                   _number(data, "lava_flow_m3_s", 0.0))
+
+
+class ReadingBatch:
+    """
+    Readings of many sensors as columns:
+
+        sensor_ids   list of str
+        timestamps   float64 array, simulated epoch seconds
+        status       uint8 array of codes into STATUSES
+        emergency    bool array
+        values       dict of float64 arrays, one per NUMERIC field
+
+    len() and slicing work like a list of readings (a slice shares the
+    arrays), so a batch goes through lab2.gateway.chunk() as it is;
+    indexing or iterating builds SensorReadings one at a time.
+    """
+
+    __slots__ = ("sensor_ids", "timestamps", "status", "emergency", "values")
+
+    def __init__(self, sensor_ids, timestamps, status, emergency, values):
+        self.sensor_ids = sensor_ids
+        self.timestamps = timestamps
+        self.status = status
+        self.emergency = emergency
+        self.values = values
+
+    @classmethod
+    def from_columns(cls, columns, sensor_ids, timestamp, index=None):
+        """
+        A batch from generator columns (lab2.environment: "status" codes,
+        "emergency" and the numeric fields), all stamped `timestamp`;
+        `index` picks rows.
+        """
+        pick = (lambda column: column[:len(sensor_ids)]) if index is None else (lambda column: column[index])
+        return cls(sensor_ids, np.full(len(sensor_ids), timestamp), pick(columns["status"]).astype(np.uint8),
+                   pick(columns["emergency"]).astype(bool),
+                   {name: pick(columns[name]).astype(float) for name in NUMERIC})
+
+    @classmethod
+    def from_readings(cls, readings):
+        """A batch from reading dicts or SensorReadings, each validated on the way in."""
+        readings = [r if isinstance(r, SensorReading) else SensorReading.from_dict(r) for r in readings]
+        return cls([r.sensor_id for r in readings], np.array([r.timestamp for r in readings], dtype=float),
+                   np.array([STATUSES.index(r.status) for r in readings], dtype=np.uint8),
+                   np.array([r.emergency for r in readings], dtype=bool),
+                   {name: np.array([getattr(r, name) for r in readings], dtype=float) for name in NUMERIC})
+
+    def __len__(self):
+        return len(self.sensor_ids)
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return ReadingBatch(self.sensor_ids[key], self.timestamps[key], self.status[key], self.emergency[key],
+                                {name: column[key] for name, column in self.values.items()})
+        return SensorReading(sensor_id=self.sensor_ids[key], timestamp=float(self.timestamps[key]),
+                             status=STATUSES[self.status[key]], emergency=bool(self.emergency[key]),
+                             **{name: float(column[key]) for name, column in self.values.items()})
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def to_dicts(self):
+        """The per-reading dicts used on the JSON wire, keys in READING_KEYS order."""
+        columns = {name: column.tolist() for name, column in self.values.items()}
+        columns.update(sensor_id=self.sensor_ids, timestamp=self.timestamps.tolist(),
+                       status=[STATUSES[code] for code in self.status.tolist()], emergency=self.emergency.tolist())
+        return [dict(zip(READING_KEYS, row)) for row in zip(*(columns[key] for key in READING_KEYS))]
+
+
+# Message type of each codec schema
+TYPES = {"reading": SensorReading, "readings": ReadingBatch, "deploy": DeployRequest, "result": RescueResult}
@@ -0,0 +1,390 @@
+"""
+Persistent history of readings, incidents, dispatches and confirmations in
+one SQLite file, so "what did sensor X report before incident Y" is a query
+rather than a grep through the agents' logs.
+
+    sensors        id, name                  one row per sensor id ever seen
+    readings       sensor, time, status, emergency and the numeric fields
+    incidents      id, sensor, opened, closed, outcome
+    dispatches     incident, unit, time, expected_done
+    confirmations  incident, unit, time, performative, result (JSON)
+
+Times are simulated epoch seconds (CLOCK.time(), the readings' own
+timestamps). Statuses are codes into common.codec.STATUSES. Indexes cover
+readings by (sensor, time) and by time, incidents by sensor and opening
+time, and dispatches and confirmations by incident.
+
+The agents never wait on the database. Every add_*() / incident_*() call
+only puts a tuple on a queue; a writer thread turns what has queued up
+into rows and inserts them in one transaction per `batch` rows or `flush`
+seconds, whichever comes first. Large transactions are what keeps the
+insert rate up: a commit writes every index page it touched, and each
+sensor's readings land on their own page of the (sensor, time) index.
+SQLite runs in WAL mode with synchronous=NORMAL, so readers (queries, the
+command line below) don't block the writer and a commit costs no fsync. Past `max_pending` rows not
+yet written, new ones are dropped and counted rather than queued without
+bound. SQLAlchemy's asyncio extension would need aiosqlite, which still
+runs every statement on a helper thread; one writer thread of our own
+batches better.
+
+    python -m common.store history.db incident 3f2a...   # readings before it, dispatches, replies
+    python -m common.store history.db sensor sensor-00042 --last 20
+"""
+import argparse
+import atexit
+import json
+import logging
+import queue
+import threading
+import time
+from collections import ChainMap
+
+from sqlalchemy import (Boolean, Column, Float, Index, Integer, MetaData, String, Table, create_engine, event, func,
+                        select)
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from common.codec import READING_COLUMNS, STATUSES
+from common.metrics import METRICS
+
+log = logging.getLogger("store")
+
+NUMERIC = tuple(name for name, _ in READING_COLUMNS)
+_STATUS_CODES = {name: code for code, name in enumerate(STATUSES)}
+_UNKNOWN = _STATUS_CODES["unknown"]
+
+metadata = MetaData()
+sensors = Table(
+    "sensors", metadata,
+    Column("id", Integer, primary_key=True),
+    Column("name", String, nullable=False, unique=True),
+)
+readings = Table(
+    "readings", metadata,
+    Column("sensor", Integer, nullable=False),
+    Column("time", Float, nullable=False),
+    Column("status", Integer, nullable=False),
+    Column("emergency", Boolean, nullable=False),
+    *[Column(name, Float) for name in NUMERIC],
+    Index("ix_readings_sensor_time", "sensor", "time"),
+    Index("ix_readings_time", "time"),
+)
+incidents = Table(
+    "incidents", metadata,
+    Column("id", String, primary_key=True),
+    Column("sensor", Integer, nullable=False),
+    Column("opened", Float, nullable=False),
+    Column("closed", Float),
+    Column("outcome", String),  # confirmed, refused, invalid, timeout or failed; NULL while open
+    Index("ix_incidents_sensor_opened", "sensor", "opened"),
+    Index("ix_incidents_opened", "opened"),
+)
+dispatches = Table(
+    "dispatches", metadata,
+    Column("incident", String, nullable=False),
+    Column("unit", String, nullable=False),
+    Column("time", Float, nullable=False),
+    Column("expected_done", Float),
+    Index("ix_dispatches_incident", "incident"),
+)
+confirmations = Table(
+    "confirmations", metadata,
+    Column("incident", String, nullable=False),
+    Column("unit", String, nullable=False),
+    Column("time", Float, nullable=False),
+    Column("performative", String, nullable=False),
+    Column("result", String),
+    Index("ix_confirmations_incident", "incident"),
+)
+
+# Readings go in through the driver's executemany, skipping per-row SQLAlchemy processing
+_INSERT_READINGS = (f"INSERT INTO readings (sensor, time, status, emergency, {', '.join(NUMERIC)}) "
+                    f"VALUES ({', '.join('?' * (4 + len(NUMERIC)))})")
+_CLOSE_INCIDENT = "UPDATE incidents SET closed = ?, outcome = ? WHERE id = ?"
+_TABLES = {"readings": "readings", "opened": "incidents", "dispatched": "dispatches", "confirmed": "confirmations"}
+_STOP = object()
+
+
+def _configure(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=10000")  # another process's writer holds the lock briefly
+    # Every transaction touches a leaf of the (sensor, time) index per sensor; keep them cached
+    cursor.execute("PRAGMA cache_size=-65536")
+    cursor.close()
+
+
+def _size(item):
+    return len(item[2]) if item[0] == "readings" else 1
+
+
+class Store:
+    """
+    Batched writer (and reader) for the history database at `path`.
+
+    batch: rows per transaction at most
+    flush: seconds a queued row may wait for its batch to fill up
+    max_pending: rows queued but not yet written before new ones are dropped
+    """
+
+    def __init__(self, path, batch=50_000, flush=1.0, max_pending=500_000):
+        self.path = path
+        self.batch = batch
+        self.flush_every = flush
+        self.max_pending = max_pending
+        self.engine = create_engine(f"sqlite:///{path}")
+        event.listen(self.engine, "connect", _configure)
+        metadata.create_all(self.engine)
+
+        self._queue = queue.SimpleQueue()
+        self._queued = 0  # rows put on the queue (event loop thread only)
+        self._done = 0  # rows written or lost to errors (writer thread only)
+        self._sensors = {}  # sensor name -> id, writer thread only
+        self.written = dict.fromkeys(_TABLES.values(), 0)
+        self.dropped = 0
+        self.errors = 0
+        self._closed = False
+        self._rows_total = {table: METRICS.counter("store_rows_total", "Rows written to the history database",
+                                                   table=table) for table in self.written}
+        self._dropped_total = METRICS.counter("store_dropped_total", "Rows dropped while the history store was behind")
+        self._flush_seconds = METRICS.histogram("store_flush_seconds", "History database write transactions")
+        METRICS.gauge("store_pending", "Rows queued for the history database", function=lambda: self.pending)
+
+        self._writer = threading.Thread(target=self._run, name="store-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)  # whatever is still queued is written before exit
+
+    @property
+    def pending(self):
+        return self._queued - self._done
+
+    # ----- event loop side: never touches the database -----
+
+    def _put(self, item):
+        rows = _size(item)
+        if self._closed:
+            self.dropped += rows
+            return
+        if self.pending + rows > self.max_pending:
+            self.dropped += rows
+            self._dropped_total.inc(rows)
+            log.warning("History store behind by %d rows: dropped %d so far", self.pending, self.dropped)
+            return
+        self._queued += rows
+        self._queue.put(item)
+
+    def add_readings(self, keys, batch, now=None):
+        """Wire-format readings with their sensor keys; `now` stamps those without a timestamp."""
+        if batch:
+            self._put(("readings", keys, batch, now))
+
+    def incident_opened(self, incident_id, sensor, at):
+        self._put(("opened", incident_id, sensor, at))
+
+    def incident_closed(self, incident_id, at, outcome):
+        self._put(("closed", incident_id, at, outcome))
+
+    def dispatched(self, incident_id, unit, at, expected_done=None):
+        self._put(("dispatched", incident_id, unit, at, expected_done))
+
+    def confirmed(self, incident_id, unit, at, performative, result=None):
+        self._put(("confirmed", incident_id, unit, at, performative, result))
+
+    def flush(self, timeout=None):
+        """Block until everything queued so far is written (benchmarks, shutdown; not on the loop)."""
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self):
+        self._closed = True
+        if self._writer.is_alive():
+            self._queue.put(_STOP)
+            self._writer.join()
+            self.engine.dispose()
+            atexit.unregister(self.close)
+
+    # ----- writer thread -----
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            items, rows = [], 0
+            deadline = time.monotonic() + self.flush_every
+            while item is not None:
+                if item is _STOP:
+                    self._write(items)
+                    return
+                if isinstance(item, threading.Event):  # flush(): write what came before it, then wake the caller
+                    self._write(items)
+                    items, rows = [], 0
+                    item.set()
+                else:
+                    items.append(item)
+                    rows += _size(item)
+                    if rows >= self.batch:
+                        break
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0.0))
+                except queue.Empty:
+                    item = None
+            self._write(items)
+
+    def _sensor_ids(self, conn, names):
+        """
+        Ids of the `names` not cached yet. They only go into the cache once
+        the transaction that inserted them has committed (see _write()).
+        """
+        new = [name for name in dict.fromkeys(names) if name not in self._sensors]
+        found = {}
+        if new:
+            # Another process may share the file: insert what's missing and read the ids back
+            conn.execute(sqlite_insert(sensors).on_conflict_do_nothing(), [{"name": name} for name in new])
+            for start in range(0, len(new), 500):
+                part = new[start:start + 500]
+                found.update(conn.execute(select(sensors.c.name, sensors.c.id)
+                                          .where(sensors.c.name.in_(part))).all())
+        return found
+
+    def _write(self, items):
+        if not items:
+            return
+        groups = {kind: [] for kind in (*_TABLES, "closed")}
+        for kind, *args in items:
+            groups[kind].append(args)
+        counts = {table: 0 for table in self.written}
+        counts["readings"] = sum(len(batch) for _, batch, _ in groups["readings"])
+        for kind in ("opened", "dispatched", "confirmed"):
+            counts[_TABLES[kind]] = len(groups[kind])
+        start = time.perf_counter()
+        try:
+            with self.engine.begin() as conn:
+                found = self._sensor_ids(conn, [key for keys, _, _ in groups["readings"] for key in keys]
+                                         + [sensor for _, sensor, _ in groups["opened"]])
+                ids = ChainMap(found, self._sensors)
+                if groups["readings"]:
+                    conn.exec_driver_sql(_INSERT_READINGS, [
+                        (ids[key], reading.get("timestamp", now),
+                         _STATUS_CODES.get(reading.get("status"), _UNKNOWN), bool(reading.get("emergency")),
+                         *[reading.get(name) for name in NUMERIC])
+                        for keys, batch, now in groups["readings"] for key, reading in zip(keys, batch)])
+                if groups["opened"]:
+                    conn.execute(incidents.insert(), [{"id": incident_id, "sensor": ids[sensor], "opened": at}
+                                                      for incident_id, sensor, at in groups["opened"]])
+                if groups["dispatched"]:
+                    conn.execute(dispatches.insert(), [
+                        {"incident": incident_id, "unit": unit, "time": at, "expected_done": expected_done}
+                        for incident_id, unit, at, expected_done in groups["dispatched"]])
+                if groups["confirmed"]:
+                    conn.execute(confirmations.insert(), [
+                        {"incident": incident_id, "unit": unit, "time": at, "performative": performative,
+                         "result": None if result is None else json.dumps(result)}
+                        for incident_id, unit, at, performative, result in groups["confirmed"]])
+                if groups["closed"]:  # after the inserts: an incident can open and close within one batch
+                    conn.exec_driver_sql(_CLOSE_INCIDENT, [(at, outcome, incident_id)
+                                                           for incident_id, at, outcome in groups["closed"]])
+        except Exception as e:
+            self.errors += 1
+            log.error("History store: lost %d item(s) to a failed write: %s", len(items), e)
+        else:
+            self._sensors.update(found)  # committed: the sensors rows exist now
+            self._flush_seconds.observe(time.perf_counter() - start)
+            for table, n in counts.items():
+                if n:
+                    self.written[table] += n
+                    self._rows_total[table].inc(n)
+        self._done += sum(_size(item) for item in items)
+
+    # ----- queries (any thread; WAL readers don't block the writer) -----
+
+    def _readings(self, query):
+        with self.engine.connect() as conn:
+            rows = conn.execute(query).mappings().all()
+        return [{"sensor_id": row["name"], "timestamp": row["time"], "status": STATUSES[row["status"]],
+                 "emergency": bool(row["emergency"]), **{name: row[name] for name in NUMERIC}} for row in rows]
+
+    def _reading_query(self):
+        return (select(sensors.c.name, readings.c.time, readings.c.status, readings.c.emergency,
+                       *[readings.c[name] for name in NUMERIC])
+                .join(sensors, sensors.c.id == readings.c.sensor))
+
+    def history(self, sensor, start=None, end=None, last=None):
+        """Readings of `sensor` between `start` and `end` (inclusive), oldest first; only the `last` N if set."""
+        query = self._reading_query().where(sensors.c.name == sensor)
+        if start is not None:
+            query = query.where(readings.c.time >= start)
+        if end is not None:
+            query = query.where(readings.c.time <= end)
+        if last is None:
+            return self._readings(query.order_by(readings.c.time))
+        return self._readings(query.order_by(readings.c.time.desc()).limit(last))[::-1]
+
+    def incident(self, incident_id):
+        """An incident with its sensor name, dispatches and replies, or None."""
+        with self.engine.connect() as conn:
+            row = conn.execute(select(incidents.c.id, sensors.c.name.label("sensor_id"), incidents.c.opened,
+                                      incidents.c.closed, incidents.c.outcome)
+                               .join(sensors, sensors.c.id == incidents.c.sensor)
+                               .where(incidents.c.id == incident_id)).mappings().first()
+            if row is None:
+                return None
+            found = dict(row)
+            found["dispatches"] = [dict(r) for r in conn.execute(
+                select(dispatches).where(dispatches.c.incident == incident_id).order_by(dispatches.c.time)).mappings()]
+            found["confirmations"] = [dict(r) for r in conn.execute(
+                select(confirmations).where(confirmations.c.incident == incident_id)
+                .order_by(confirmations.c.time)).mappings()]
+        return found
+
+    def before(self, incident_id, seconds=300.0, last=None):
+        """What the incident's sensor reported in the `seconds` up to its opening, oldest first."""
+        found = self.incident(incident_id)
+        if found is None:
+            raise KeyError(incident_id)
+        return self.history(found["sensor_id"], found["opened"] - seconds, found["opened"], last)
+
+    def counts(self):
+        with self.engine.connect() as conn:
+            return {table.name: conn.execute(select(func.count()).select_from(table)).scalar_one()
+                    for table in (sensors, readings, incidents, dispatches, confirmations)}
+
+    def stats(self):
+        return {"written": dict(self.written), "pending": self.pending, "dropped": self.dropped,
+                "errors": self.errors}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the history database")
+    parser.add_argument("path")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("counts", help="rows per table")
+    inc = commands.add_parser("incident", help="an incident, what its sensor reported before it, and its dispatches")
+    inc.add_argument("incident_id")
+    inc.add_argument("--seconds", type=float, default=300.0, help="history before the incident to show")
+    sensor = commands.add_parser("sensor", help="readings of one sensor")
+    sensor.add_argument("sensor_id")
+    sensor.add_argument("--start", type=float)
+    sensor.add_argument("--end", type=float)
+    sensor.add_argument("--last", type=int, default=50)
+    args = parser.parse_args()
+
+    store = Store(args.path)
+    if args.command == "counts":
+        print(store.counts())
+    elif args.command == "incident":
+        found = store.incident(args.incident_id)
+        if found is None:
+            parser.exit(1, f"No incident {args.incident_id}\n")
+        for reading in store.before(args.incident_id, args.seconds):
+            print(reading)
+        print({key: value for key, value in found.items() if key not in ("dispatches", "confirmations")})
+        for row in found["dispatches"] + found["confirmations"]:
+            print(row)
+    else:
+        for reading in store.history(args.sensor_id, args.start, args.end, args.last):
+            print(reading)
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -10,4 +10,80 @@ AGENTS = {
     "coordinator": {"jid": os.getenv("COORDINATOR_JID"), "password": os.getenv("COORDINATOR_PASSWORD")},
     "sender": {"jid": os.getenv("SENDER_JID"), "password": os.getenv("SENDER_PASSWORD")},
     "receiver": {"jid": os.getenv("RECEIVER_JID"), "password": os.getenv("RECEIVER_PASSWORD")},
-}
\ No newline at end of file
+}
+
+# Body encoding agents use for the messages they originate ("json" or "packed").
+# Replies always use the encoding of the request, see common/codec.py.
+WIRE_ENCODING = os.getenv("WIRE_ENCODING", "json")
+
+# Simulation clock speed (1 = real time, 60 = one simulated minute per second,
+# see common/clock.py) and the seed for the sensor data generator (empty = random).
+# Every agent of one simulation must run at the same speed.
+SIM_SPEED = float(os.getenv("SIM_SPEED", "1"))
+SIM_SEED = int(os.getenv("SIM_SEED")) if os.getenv("SIM_SEED") else None
+
+# How agents exchange messages: "xmpp" (through the server) or "bus" (in-memory,
+# all agents in one process, see common/bus.py and simulate.py).
+TRANSPORT = os.getenv("TRANSPORT", "xmpp")
+
+# Rescue units the coordinator dispatches to, as a comma-separated list of JIDs.
+# Defaults to the single rescue agent above. RESCUE_WORKERS must match the
+# units' --max-concurrent so the coordinator predicts their load correctly.
+RESCUE_POOL = [jid for jid in os.getenv("RESCUE_POOL", "").split(",") if jid] or [AGENTS["rescue"]["jid"]]
+RESCUE_WORKERS = int(os.getenv("RESCUE_WORKERS", "4"))
+
+# Rolling per-sensor history the coordinator keeps (samples per sensor, sensor cap)
+SERIES_WINDOW = int(os.getenv("SERIES_WINDOW", "120"))
+SERIES_MAX_SENSORS = int(os.getenv("SERIES_MAX_SENSORS", "10000"))
+
+# Logging (see common/logs.py): level, per-call-site rate limit in lines per
+# second (0 = unlimited), and whether files are written by a background thread.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_RATE = float(os.getenv("LOG_RATE", "20"))
+LOG_QUEUE = os.getenv("LOG_QUEUE", "1") != "0"
+
+# Metrics (see common/metrics.py): METRICS=0 turns recording off; with
+# METRICS_PORT set, GET http://localhost:<port>/metrics serves them.
+METRICS_ENABLED = os.getenv("METRICS", "1") != "0"
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+
+# Event-loop monitor (see common/profiling.py): LOOP_MONITOR=0 turns it off;
+# seconds between lag probes, callback duration that counts as slow, seconds
+# between logged summaries (0 = never), and where captured profiles go.
+LOOP_MONITOR_ENABLED = os.getenv("LOOP_MONITOR", "1") != "0"
+LOOP_PROBE = float(os.getenv("LOOP_PROBE", "0.1"))
+LOOP_SLOW = float(os.getenv("LOOP_SLOW", "0.01"))
+LOOP_REPORT = float(os.getenv("LOOP_REPORT", "60"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+# JIDs allowed to ask an agent for a profile by message (comma-separated; default: the coordinator)
+PROFILE_REQUESTERS = [jid for jid in os.getenv("PROFILE_REQUESTERS", "").split(",") if jid] or \
+    [AGENTS["coordinator"]["jid"]]
+
+# Coordinator intake (see lab3/intake.py): INTAKE=0 keeps the plain FIFO
+# mailbox. Routine readings waiting before per-sensor coalescing starts and
+# before the oldest are shed, the cap on waiting severe readings, and
+# readings handed to monitoring at a time.
+INTAKE_ENABLED = os.getenv("INTAKE", "1") != "0"
+INTAKE_COALESCE_AT = int(os.getenv("INTAKE_COALESCE_AT", "5000"))
+INTAKE_ROUTINE_LIMIT = int(os.getenv("INTAKE_ROUTINE_LIMIT", "50000"))
+INTAKE_SEVERE_LIMIT = int(os.getenv("INTAKE_SEVERE_LIMIT", "20000"))
+INTAKE_BATCH = int(os.getenv("INTAKE_BATCH", "250"))
+
+# History database (see common/store.py): a SQLite file the coordinator
+# writes readings, incidents, dispatches and confirmations to (empty = off),
+# the most rows per write transaction, and the seconds a row may wait for one.
+STORE_PATH = os.getenv("STORE", "")
+STORE_BATCH = int(os.getenv("STORE_BATCH", "50000"))
+STORE_FLUSH = float(os.getenv("STORE_FLUSH", "1.0"))
+
+# Rescue confirmation deadlines (see lab3/deadlines.py): DEADLINES=0 waits a
+# fixed CONFIRM_TIMEOUT simulated seconds for every reply. Otherwise a
+# dispatch waits its expected completion time scaled by the
+# DEADLINE_PERCENTILE of observed overruns, plus DEADLINE_SLACK seconds, and
+# is also sent to a second unit once it runs past the HEDGE_PERCENTILE
+# (0 = never hedge).
+CONFIRM_TIMEOUT = float(os.getenv("CONFIRM_TIMEOUT", "15"))
+DEADLINES_ENABLED = os.getenv("DEADLINES", "1") != "0"
+DEADLINE_PERCENTILE = float(os.getenv("DEADLINE_PERCENTILE", "99"))
+DEADLINE_SLACK = float(os.getenv("DEADLINE_SLACK", "5"))
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "90"))
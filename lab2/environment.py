@@ -1,54 +1,104 @@
-import random
+import numpy as np
 
-def generate_sensor_data(dormancy_bias=0.8):
+# Status codes used by the batch generator (index into STATUS_NAMES)
+DORMANT, ACTIVE, ERUPTING = 0, 1, 2
+STATUS_NAMES = ("dormant", "active", "erupting")
+
+# Field order of a reading, shared by the batch columns and the per-reading dicts
+FIELDS = (
+    "status",
+    "CO2_ppm",
+    "SO2_ppm",
+    "vibration_mm_s",
+    "temperature_C",
+    "ash_density_g_m3",
+    "population_risk",
+    "lava_flow_m3_s",
+    "emergency",
+    "area_affected_km2",
+)
+
+# Default generator, reused across calls; seed() makes runs reproducible
+_rng = np.random.default_rng()
+
+# Per-reading calls are served from a pre-generated batch per dormancy bias
+_BUFFER_SIZE = 1024
+_buffers = {}
+
+
+def seed(value=None):
+    """Reseed the default generator (and drop buffered readings) for a reproducible run."""
+    global _rng
+    _rng = np.random.default_rng(value)
+    _buffers.clear()
+
+
+def _biased_random(rng, n, low, high, exponent):
+    """
+    Vectorized version of the biased power curve: r ** exponent pushes
+    values toward the low end when the volcano is dormant.
     """
+    r = rng.random(n) ** exponent
+    return np.round(low + (high - low) * r, 2)
+
+
+def classify(co2, so2, vibration, temperature, rng=None):
+    """
+    Score precursor arrays and derive status, ash density and lava flow.
+
+    Shared by the batch generator and lab2.field so both use the same
+    thresholds. Returns (status codes, ash_density, lava_flow, emergency).
+    """
+    rng = _rng if rng is None else rng
+    n = len(co2)
+
+    # Normal scoring for non-erupting states (max score = 6)
+    score = (
+        2 * (co2 > 200)           # CO2 is a strong precursor
+        + 2 * (so2 > 150)         # SO2 is also strong
+        + (vibration > 2.0)
+        + (temperature > 80)
+    )
+    status = np.where(score <= 2, DORMANT, np.where(score <= 4, ACTIVE, ERUPTING)).astype(np.uint8)
+    erupting = status == ERUPTING
+
+    # Ash density range and rounding depend on the status
+    ash_low = np.array([0.0, 0.1, 2.0])[status]
+    ash_high = np.array([0.1, 2.0, 50.0])[status]
+    ash = rng.uniform(ash_low, ash_high)
+    ash_density = np.where(status == DORMANT, np.round(ash, 3), np.round(ash, 2))
+
+    # Lava only flows while erupting
+    lava_flow = np.where(erupting, np.round(rng.uniform(0.1, 1000, n), 2), 0.0)
+
+    return status, ash_density, lava_flow, erupting
+
+
+def generate_sensor_data_batch(n, dormancy_bias=0.8, seed=None):
+    """
+    Generate n sensor readings at once as columnar NumPy arrays.
+
     dormancy_bias: 0.0 to 1.0
         - 1.0 → very likely dormant readings
         - 0.0 → very likely high readings (active/erupting)
-    """
+    seed: optional seed for a reproducible batch
 
-    def biased_random(low, high, dormancy_bias=(1-dormancy_bias)):
-        """
-        Returns a value between low and high.
-        dormancy_bias: 0.0 (active) → 1.0 (dormant)
-        """
-        # Generate random number 0..1
-        r = random.random()
-        # Apply bias: higher dormancy_bias pushes values toward low end
-        r = r ** (1 / (dormancy_bias + 0.001))  # Add small epsilon to avoid division by zero
-        return round(low + (high - low) * r, 2)
+    Returns a dict keyed like FIELDS. "status" holds codes into
+    STATUS_NAMES, "emergency" is a bool array, every other column is float64.
+    """
+    rng = _rng if seed is None else np.random.default_rng(seed)
+    # Same curve as the per-reading generator; epsilon avoids division by zero
+    exponent = 1 / ((1 - dormancy_bias) + 0.001)
 
     # Sensor readings
-    co2 = biased_random(20, 1000)               # ppm (parts per million)
-    so2 = biased_random(10, 700)                # ppm
-    vibration = biased_random(0.0, 8.0)         # mm/s
-    temperature = biased_random(25, 500)        # Celsius
-    area_affected = biased_random(0.0, 50.0)    # km²
-    population_risk = biased_random(0, 10)      # arbitrary risk score
-    lava_flow = 0.0                             # m³/s
-    ash_density = 0.0                           # g/m³
-
-
-    # Normal scoring for non-erupting states
-    score = 0
-    if co2 > 200: score += 2      # CO2 is a strong precursor
-    if so2 > 150: score += 2      # SO2 is also strong
-    if vibration > 2.0: score += 1
-    if temperature > 80: score += 1
-    # Max score now = 6
-    
-    if score <= 2:
-        status = "dormant"
-        ash_density = round(random.uniform(0, 0.1), 3)
-    elif score <= 4:
-        status = "active"
-        ash_density = round(random.uniform(0.1, 2.0), 2)
-    else:
-        status = "erupting"  # Multiple indicators without lava
-        lava_flow = round(random.uniform(0.1, 1000), 2)  
-        ash_density = round(random.uniform(2.0, 50.0), 2)  
-    emergency = status == "erupting"
+    co2 = _biased_random(rng, n, 20, 1000, exponent)               # ppm (parts per million)
+    so2 = _biased_random(rng, n, 10, 700, exponent)                # ppm
+    vibration = _biased_random(rng, n, 0.0, 8.0, exponent)         # mm/s
+    temperature = _biased_random(rng, n, 25, 500, exponent)        # Celsius
+    area_affected = _biased_random(rng, n, 0.0, 50.0, exponent)    # km²
+    population_risk = _biased_random(rng, n, 0, 10, exponent)      # arbitrary risk score
 
+    status, ash_density, lava_flow, erupting = classify(co2, so2, vibration, temperature, rng)
 
     return {
         "status": status,
@@ -59,6 +109,30 @@ def generate_sensor_data(dormancy_bias=0.8):
         "ash_density_g_m3": ash_density,
         "population_risk": population_risk,
         "lava_flow_m3_s": lava_flow,
-        "emergency": emergency,
-        "area_affected_km2": area_affected
-    }
\ No newline at end of file
+        "emergency": erupting,
+        "area_affected_km2": area_affected,
+    }
+
+
+def batch_to_dicts(batch):
+    """Convert a columnar batch into the per-reading dicts used on the wire."""
+    columns = {name: batch[name].tolist() for name in FIELDS}
+    columns["status"] = [STATUS_NAMES[code] for code in columns["status"]]
+    return [dict(zip(FIELDS, row)) for row in zip(*(columns[name] for name in FIELDS))]
+
+
+def generate_sensor_data(dormancy_bias=0.8):
+    """
+    dormancy_bias: 0.0 to 1.0
+        - 1.0 → very likely dormant readings
+        - 0.0 → very likely high readings (active/erupting)
+
+    Thin per-reading view over generate_sensor_data_batch: readings are
+    generated _BUFFER_SIZE at a time and handed out one per call.
+    """
+    buffer = _buffers.get(dormancy_bias)
+    if not buffer:
+        buffer = batch_to_dicts(generate_sensor_data_batch(_BUFFER_SIZE, dormancy_bias))
+        buffer.reverse()
+        _buffers[dormancy_bias] = buffer
+    return buffer.pop()
@@ -0,0 +1,161 @@
+import math
+
+import numpy as np
+
+from common.clock import CLOCK
+from lab2.environment import FIELDS, STATUS_NAMES, classify
+
+# Precursor channels that get a correlated noise field, with their value ranges
+CHANNELS = (
+    ("CO2_ppm", 20, 1000),
+    ("SO2_ppm", 10, 700),
+    ("vibration_mm_s", 0.0, 8.0),
+    ("temperature_C", 25, 500),
+)
+
+
+def grid_sensors(nx, ny, spacing_km=1.0, origin=(0.0, 0.0)):
+    """Return an (nx * ny, 2) array of sensor coordinates on a regular grid (km)."""
+    xs = origin[0] + spacing_km * np.arange(nx)
+    ys = origin[1] + spacing_km * np.arange(ny)
+    gx, gy = np.meshgrid(xs, ys)
+    return np.column_stack([gx.ravel(), gy.ravel()])
+
+
+class SensorField:
+    """
+    Spatially and temporally correlated readings for many sensors around
+    several volcanoes.
+
+    volcanoes: list of dicts with "x", "y" (km), "radius_km" and
+        "dormancy_bias" (same meaning as in generate_sensor_data)
+    sensors: (N, 2) array of sensor coordinates in km
+    correlation_km: spatial correlation length of the noise
+    tau_s: temporal correlation time of noise and volcano activity
+    step_s: simulated seconds per tick
+    activity_noise: standard deviation of volcano activity around its mean
+
+    Everything that depends only on geometry (volcano weights, lattice
+    interpolation indices) is computed once here. Each tick then advances a
+    small noise lattice and the per-volcano activity in place, so a step
+    costs O(lattice + N) with no per-sensor Python work.
+    """
+
+    def __init__(self, volcanoes, sensors, correlation_km=2.0, tau_s=60.0,
+                 step_s=5.0, noise=0.08, seed=None, activity_noise=0.1):
+        self.rng = np.random.default_rng(seed)
+        self.sensors = np.asarray(sensors, dtype=float)
+        self.size = len(self.sensors)
+        self.step_s = step_s
+        self.noise = noise
+        self.activity_noise = activity_noise
+        self.tick = 0
+        self._last_advance = None
+        self._columns = None
+
+        # Volcano influence on every sensor: Gaussian fall-off with distance
+        centres = np.array([[v["x"], v["y"]] for v in volcanoes], dtype=float)
+        radii = np.array([v.get("radius_km", 5.0) for v in volcanoes], dtype=float)
+        dist2 = ((self.sensors[:, None, :] - centres[None, :, :]) ** 2).sum(axis=2)
+        self.weights = np.exp(-dist2 / (2 * radii ** 2))
+
+        # Volcano activity drifts around 1 - dormancy_bias
+        self.activity_mean = np.array([1 - v.get("dormancy_bias", 0.8) for v in volcanoes])
+        self.activity = self.activity_mean.copy()
+
+        # Per-tick AR(1) coefficient shared by activity and noise
+        self.rho = math.exp(-step_s / tau_s)
+
+        # Coarse noise lattice (one per channel), bilinearly interpolated to sensors
+        low = self.sensors.min(axis=0)
+        span = self.sensors.max(axis=0) - low
+        shape = (np.ceil(span / correlation_km).astype(int) + 2)[::-1]  # (rows, cols)
+        self.lattice = self.rng.standard_normal((len(CHANNELS), *shape))
+        pos = (self.sensors - low) / correlation_km
+        cell = np.floor(pos).astype(int)
+        frac = pos - cell
+        self._lattice_cols = cell[:, 0]
+        self._lattice_rows = cell[:, 1]
+        fx, fy = frac[:, 0], frac[:, 1]
+        self._corner_weights = np.stack([(1 - fx) * (1 - fy), fx * (1 - fy), (1 - fx) * fy, fx * fy])
+
+        # Static per-location population risk
+        self.population_risk = np.round(self.rng.uniform(0, 10, self.size), 2)
+
+        self.batch = self._sample()
+
+    def _interpolate(self):
+        r, c, w = self._lattice_rows, self._lattice_cols, self._corner_weights
+        z = self.lattice
+        return (z[:, r, c] * w[0] + z[:, r, c + 1] * w[1]
+                + z[:, r + 1, c] * w[2] + z[:, r + 1, c + 1] * w[3])
+
+    def _sample(self):
+        influence = np.clip(self.weights @ self.activity, 0.0, 1.0)
+        noise = self._interpolate()
+        batch = {}
+        for k, (name, low, high) in enumerate(CHANNELS):
+            u = np.clip(influence + self.noise * noise[k], 0.0, 1.0)
+            batch[name] = np.round(low + (high - low) * u, 2)
+        status, ash_density, lava_flow, erupting = classify(
+            batch["CO2_ppm"], batch["SO2_ppm"], batch["vibration_mm_s"], batch["temperature_C"], self.rng
+        )
+        batch.update({
+            "status": status,
+            "ash_density_g_m3": ash_density,
+            "population_risk": self.population_risk,
+            "lava_flow_m3_s": lava_flow,
+            "emergency": erupting,
+            "area_affected_km2": np.round(50.0 * influence, 2),
+        })
+        return batch
+
+    def step(self, ticks=1):
+        """
+        Advance the field by one or more ticks and return the new batch.
+
+        k AR(1) steps collapse into one with coefficient rho ** k, so catching
+        up after a long pause costs the same as a single tick.
+        """
+        rho = self.rho ** ticks
+        innovation = math.sqrt(1 - rho ** 2)
+        self.activity = np.clip(
+            self.activity_mean
+            + rho * (self.activity - self.activity_mean)
+            + self.activity_noise * innovation * self.rng.standard_normal(len(self.activity)),
+            0.0, 1.0,
+        )
+        self.lattice *= rho
+        self.lattice += innovation * self.rng.standard_normal(self.lattice.shape)
+        self.tick += ticks
+        self._columns = None
+        self.batch = self._sample()
+        return self.batch
+
+    def advance(self, now=None):
+        """
+        Step the field by however many ticks elapsed since the last call.
+
+        Many behaviours can share one field: only the first caller in a tick
+        pays for the step, the rest read the cached batch.
+        """
+        now = CLOCK.monotonic() if now is None else now
+        if self._last_advance is None:
+            self._last_advance = now
+            return self.batch
+        ticks = int((now - self._last_advance) / self.step_s)
+        if ticks:
+            self._last_advance += ticks * self.step_s
+            self.step(ticks)
+        return self.batch
+
+    def reading(self, index, now=None):
+        """Return the current reading of one sensor as a wire dict."""
+        self.advance(now)
+        if self._columns is None:
+            # Column lists are built once per tick and shared by all sensors
+            self._columns = {name: self.batch[name].tolist() for name in FIELDS}
+        columns = self._columns
+        reading = {name: columns[name][index] for name in FIELDS}
+        reading["status"] = STATUS_NAMES[reading["status"]]
+        return reading
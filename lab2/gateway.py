@@ -0,0 +1,52 @@
+from common.clock import CLOCK
+from common.schema import ReadingBatch
+from lab2.environment import generate_sensor_data_batch
+
+# Readings per XMPP message; keeps stanzas well under typical server limits
+DEFAULT_BATCH_SIZE = 250
+
+
+class VirtualSensorBank:
+    """
+    N virtual sensors owned by a single gateway agent.
+
+    Every period the whole bank is sampled in one vectorized call, either
+    from the batch generator or from a shared lab2.field.SensorField, and
+    each reading is tagged with its sensor ID and the sample timestamp.
+    """
+
+    def __init__(self, prefix, count, dormancy_bias=0.75, field=None):
+        if field is not None and field.size < count:
+            raise ValueError(f"Field has {field.size} sensors, gateway needs {count}")
+        self.count = count
+        self.dormancy_bias = dormancy_bias
+        self.field = field
+        self.sensor_ids = [f"{prefix}-{i:05d}" for i in range(count)]
+
+    def sample_batch(self, now=None, policy=None):
+        """
+        Readings of every virtual sensor for the current period as a
+        common.schema.ReadingBatch, or with a lab2.sampling.SamplingPolicy
+        only of the sensors that are due and that the policy decides to send.
+        """
+        timestamp = round(CLOCK.time() if now is None else now, 3)
+        if self.field is not None:
+            batch = self.field.advance(CLOCK.monotonic())
+        else:
+            batch = generate_sensor_data_batch(self.count, self.dormancy_bias)
+
+        if policy is None:
+            return ReadingBatch.from_columns(batch, self.sensor_ids, timestamp)
+        clock = CLOCK.monotonic()
+        index = policy.select(policy.due(clock), batch, clock)
+        return ReadingBatch.from_columns(batch, [self.sensor_ids[i] for i in index.tolist()], timestamp, index)
+
+    def sample(self, now=None, policy=None):
+        """sample_batch() as one reading dict per sensor."""
+        return self.sample_batch(now, policy).to_dicts()
+
+
+def chunk(readings, batch_size=DEFAULT_BATCH_SIZE):
+    """Split a list of readings into message-sized batches."""
+    for start in range(0, len(readings), batch_size):
+        yield readings[start:start + batch_size]
@@ -0,0 +1,228 @@
+"""
+Record sensor streams to a compact binary log and replay them.
+
+A recording is three files:
+
+- <path>       64-byte header, then fixed 48-byte records (RECORD) in
+               arrival order: timestamp (ms), sensor number, status and
+               emergency flags, and the numeric fields in the packed
+               codec's fixed-point scales (so values replay exactly).
+- <path>.ids   sensor ids, one per line; record.sensor indexes this list.
+- <path>.idx   sparse timestamp index: (timestamp ms, record number) of
+               every INDEX_EVERY-th record.
+
+ReadingReplay memory-maps the records, so a multi-gigabyte recording is
+streamed a chunk at a time and never loaded whole. seek() finds the
+starting record with a binary search in the small index and then in one
+index block of the map.
+
+    python -m lab2.recording generate burst.rec --sensors 2000 --ticks 720 --bias 0.0
+    python -m lab2.recording info burst.rec
+"""
+import argparse
+import os
+import struct
+
+import numpy as np
+
+from common.codec import READING_COLUMNS, STATUSES
+from common.schema import ReadingBatch
+from lab2.environment import FIELDS, batch_to_dicts, generate_sensor_data_batch
+
+MAGIC = b"VOLCREC1"
+HEADER = struct.Struct("<8sHH")   # magic, version, record size; padded to HEADER_SIZE
+HEADER_SIZE = 64
+VERSION = 1
+INDEX_EVERY = 4096
+RECORD = np.dtype(
+    [("timestamp", "<i8"), ("sensor", "<u4"), ("flags", "u1"), ("pad", "u1", 3)]
+    + [(name, "<i4") for name, _ in READING_COLUMNS]
+)
+INDEX = np.dtype([("timestamp", "<i8"), ("record", "<u8")])
+_UNKNOWN = STATUSES.index("unknown")
+
+
+class ReadingRecorder:
+    """Appends readings (dicts as sent on the wire, or a common.schema.ReadingBatch) to a recording."""
+
+    def __init__(self, path):
+        self.path = path
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._data = open(path, "ab")
+        if new:
+            self._data.write(HEADER.pack(MAGIC, VERSION, RECORD.itemsize).ljust(HEADER_SIZE, b"\0"))
+        else:
+            _check_header(path)
+        self.count = (os.path.getsize(path) - HEADER_SIZE) // RECORD.itemsize if not new else 0
+        self.sensors = {}
+        if os.path.exists(path + ".ids"):
+            with open(path + ".ids") as f:
+                self.sensors = {line.rstrip("\n"): i for i, line in enumerate(f)}
+        self._ids = open(path + ".ids", "a")
+        self._index = open(path + ".idx", "ab")
+
+    def write(self, readings, default_id="sensor", now=None):
+        """Append readings; ones without sensor_id / timestamp get default_id / now."""
+        n = len(readings)
+        if not n:
+            return
+        records = np.zeros(n, dtype=RECORD)
+        if isinstance(readings, ReadingBatch):
+            records["timestamp"] = np.round(readings.timestamps * 1000)
+            records["sensor"] = [self._sensor(sensor_id or default_id) for sensor_id in readings.sensor_ids]
+            records["flags"] = readings.status | (readings.emergency.astype(np.uint8) << 7)
+            for name, scale in READING_COLUMNS:
+                records[name] = np.round(readings.values[name] * scale)
+        else:
+            records["timestamp"] = [round(r.get("timestamp", now or 0.0) * 1000) for r in readings]
+            records["sensor"] = [self._sensor(r.get("sensor_id", default_id)) for r in readings]
+            records["flags"] = [
+                (STATUSES.index(r["status"]) if r["status"] in STATUSES else _UNKNOWN)
+                | (0x80 if r["emergency"] else 0)
+                for r in readings
+            ]
+            for name, scale in READING_COLUMNS:
+                records[name] = np.round(np.array([r[name] for r in readings], dtype=float) * scale)
+
+        # Index every INDEX_EVERY-th record number that falls in this write
+        first = -(-self.count // INDEX_EVERY) * INDEX_EVERY
+        marks = np.arange(first, self.count + n, INDEX_EVERY)
+        if len(marks):
+            index = np.zeros(len(marks), dtype=INDEX)
+            index["record"] = marks
+            index["timestamp"] = records["timestamp"][marks - self.count]
+            self._index.write(index.tobytes())
+        self._data.write(records.tobytes())
+        self.count += n
+
+    def _sensor(self, sensor_id):
+        number = self.sensors.get(sensor_id)
+        if number is None:
+            number = self.sensors[sensor_id] = len(self.sensors)
+            self._ids.write(sensor_id + "\n")
+        return number
+
+    def flush(self):
+        for f in (self._data, self._ids, self._index):
+            f.flush()
+
+    def close(self):
+        for f in (self._data, self._ids, self._index):
+            f.close()
+
+
+def _check_header(path):
+    with open(path, "rb") as f:
+        magic, version, size = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC or version != VERSION or size != RECORD.itemsize:
+        raise ValueError(f"{path} is not a version {VERSION} sensor recording")
+
+
+class ReadingReplay:
+    """Memory-mapped, read-only view of a recording."""
+
+    def __init__(self, path):
+        _check_header(path)
+        self.path = path
+        count = (os.path.getsize(path) - HEADER_SIZE) // RECORD.itemsize
+        self.records = (np.memmap(path, dtype=RECORD, mode="r", offset=HEADER_SIZE, shape=(count,))
+                        if count else np.zeros(0, dtype=RECORD))
+        with open(path + ".ids") as f:
+            self.sensor_ids = [line.rstrip("\n") for line in f]
+        self.index = (np.fromfile(path + ".idx", dtype=INDEX)
+                      if os.path.exists(path + ".idx") else np.zeros(0, dtype=INDEX))
+
+    def __len__(self):
+        return len(self.records)
+
+    def time_range(self):
+        """(first, last) timestamp in seconds."""
+        if not len(self.records):
+            return None
+        return self.records[0]["timestamp"] / 1000, self.records[-1]["timestamp"] / 1000
+
+    def seek(self, timestamp):
+        """Number of the first record at or after timestamp (seconds); records are in time order."""
+        ms = round(timestamp * 1000)
+        # Last index block starting before ms; earlier records of ms may precede its mark
+        block = int(np.searchsorted(self.index["timestamp"], ms, side="left")) - 1
+        lo = int(self.index["record"][block]) if block >= 0 else 0
+        hi = int(self.index["record"][block + 1]) if block + 1 < len(self.index) else len(self.records)
+        # Only this block of the map is touched
+        return lo + int(np.searchsorted(self.records["timestamp"][lo:hi], ms, side="left"))
+
+    def to_dicts(self, records):
+        """Convert a slice of records to wire reading dicts."""
+        columns = {name: (records[name] / scale).tolist() for name, scale in READING_COLUMNS}
+        flags = records["flags"].tolist()
+        columns["status"] = [STATUSES[f & 0x7F] for f in flags]
+        columns["emergency"] = [bool(f & 0x80) for f in flags]
+        ids = self.sensor_ids
+        columns["sensor_id"] = [ids[s] for s in records["sensor"].tolist()]
+        columns["timestamp"] = (records["timestamp"] / 1000).tolist()
+        keys = ("sensor_id", "timestamp") + FIELDS
+        return [dict(zip(keys, row)) for row in zip(*(columns[key] for key in keys))]
+
+    def chunks(self, start=None, end=None, size=8192):
+        """Yield reading dicts `size` records at a time between two timestamps (seconds)."""
+        first = 0 if start is None else self.seek(start)
+        last = len(self.records) if end is None else self.seek(end)
+        for lo in range(first, last, size):
+            yield self.to_dicts(self.records[lo:min(lo + size, last)])
+
+    def ticks(self, start=None, end=None, size=8192):
+        """Yield (timestamp, readings) groups of consecutive records sharing a timestamp."""
+        group, stamp = [], None
+        for readings in self.chunks(start, end, size):
+            for reading in readings:
+                if reading["timestamp"] != stamp and group:
+                    yield stamp, group
+                    group = []
+                stamp = reading["timestamp"]
+                group.append(reading)
+        if group:
+            yield stamp, group
+
+
+def generate(path, sensors, ticks, dormancy_bias=0.8, period=5.0, start=0.0, seed=None):
+    """Write a synthetic recording: every sensor once per period, for `ticks` periods."""
+    recorder = ReadingRecorder(path)
+    ids = [f"replay-{i:05d}" for i in range(sensors)]
+    for tick in range(ticks):
+        readings = batch_to_dicts(generate_sensor_data_batch(
+            sensors, dormancy_bias, seed=None if seed is None else seed + tick))
+        stamp = start + tick * period
+        for sensor_id, reading in zip(ids, readings):
+            reading["sensor_id"], reading["timestamp"] = sensor_id, stamp
+        recorder.write(readings)
+    recorder.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sensor stream recordings")
+    commands = parser.add_subparsers(dest="command", required=True)
+    gen = commands.add_parser("generate", help="write a synthetic recording (e.g. an eruption burst)")
+    gen.add_argument("path")
+    gen.add_argument("--sensors", type=int, default=1000)
+    gen.add_argument("--ticks", type=int, default=720, help="periods to record")
+    gen.add_argument("--period", type=float, default=5.0, help="seconds between readings of a sensor")
+    gen.add_argument("--bias", type=float, default=0.8, help="dormancy bias (0.0 = eruption burst)")
+    gen.add_argument("--seed", type=int)
+    info = commands.add_parser("info", help="print what a recording holds")
+    info.add_argument("path")
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        generate(args.path, args.sensors, args.ticks, args.bias, args.period, seed=args.seed)
+    replay = ReadingReplay(args.path)
+    first, last = replay.time_range() or (0.0, 0.0)
+    step = 1 << 20  # scan the flags a million records at a time
+    emergencies = sum(int(np.count_nonzero(replay.records["flags"][lo:lo + step] & 0x80))
+                      for lo in range(0, len(replay), step))
+    print(f"{args.path}: {len(replay):,} readings from {len(replay.sensor_ids):,} sensors, "
+          f"{last - first:.0f}s ({first:.3f} .. {last:.3f}), {emergencies:,} emergencies, "
+          f"{os.path.getsize(args.path) / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import numpy as np
+
+from lab2.environment import ACTIVE, DORMANT, ERUPTING
+
+# Base sensing period per status code (simulated seconds): the hotter the volcano, the faster
+PERIODS = {DORMANT: 5.0, ACTIVE: 2.0, ERUPTING: 1.0}
+
+# Dead-band per field: a reading is "the same" until a field moves further than this
+DELTAS = {
+    "CO2_ppm": 25.0,
+    "SO2_ppm": 20.0,
+    "vibration_mm_s": 0.25,
+    "temperature_C": 10.0,
+    "ash_density_g_m3": 0.5,
+    "population_risk": 0.5,
+    "lava_flow_m3_s": 50.0,
+    "area_affected_km2": 1.0,
+}
+
+DEFAULT_HEARTBEAT = 60.0
+
+
+class SamplingPolicy:
+    """
+    When each of `count` sensors is sampled and which readings are sent.
+
+    adaptive: every sensor gets its own period. It drops to PERIODS[status]
+        as soon as the status escalates or a field moves beyond its delta,
+        and doubles per stable sample up to `max_backoff` times the base.
+        Due times are multiples of a sensor's period, so sensors on the
+        same period come due together and a gateway sends them in one
+        go. Without it every sensor is due every PERIODS[DORMANT].
+    deadband: a sampled reading is only sent when its status changed, a
+        field moved more than `deltas` since the last reading sent for
+        that sensor, or nothing was sent for `heartbeat` seconds.
+
+    Works on the columnar batches of lab2.environment / lab2.field (status
+    as codes) for a whole gateway at once; a single sensor is a policy of
+    count 1 fed through columns_of(). Times are simulated seconds.
+    """
+
+    def __init__(self, count, adaptive=False, deadband=False, deltas=None, heartbeat=DEFAULT_HEARTBEAT,
+                 periods=PERIODS, max_backoff=4):
+        self.count = count
+        self.adaptive = adaptive
+        self.deadband = deadband
+        self.heartbeat = heartbeat
+        self.max_backoff = max_backoff
+        deltas = {**DELTAS, **(deltas or {})}
+        self.fields = tuple(deltas)
+        self.deltas = np.array([deltas[name] for name in self.fields])
+        self.base = np.array([periods[code] for code in (DORMANT, ACTIVE, ERUPTING)])
+
+        self.period = np.full(count, self.base[DORMANT])
+        self.due_at = np.full(count, -np.inf)
+        # Last sampled reading (for stability) and last sent reading (for the dead-band)
+        self.sampled = np.full((count, len(self.fields)), np.nan)
+        self.sampled_status = np.full(count, -1, np.int16)
+        self.sent = np.full((count, len(self.fields)), np.nan)
+        self.sent_status = np.full(count, -1, np.int16)
+        self.sent_at = np.full(count, -np.inf)
+
+        self.sampled_count = 0
+        self.sent_count = 0
+
+    @property
+    def suppressed_count(self):
+        return self.sampled_count - self.sent_count
+
+    def due(self, now):
+        """Indices of the sensors to sample at `now`."""
+        return np.flatnonzero(self.due_at <= now)
+
+    def next_due(self, now):
+        """Seconds from `now` until the next sensor is due (at least the fastest base period)."""
+        return max(float(self.due_at.min()) - now, float(self.base.min()))
+
+    def _moved(self, index, values, status, values_ref, status_ref):
+        with np.errstate(invalid="ignore"):  # NaN (never seen) compares as not moved; status catches it
+            beyond = (np.abs(values - values_ref[index]) > self.deltas).any(axis=1)
+        return beyond | (status != status_ref[index])
+
+    def select(self, index, batch, now):
+        """
+        Record the readings of sensors `index` (rows of `batch`) sampled at
+        `now`, reschedule them and return the subset of `index` to send.
+        """
+        index = np.asarray(index)
+        if not len(index):
+            return index
+        values = np.column_stack([np.asarray(batch[name], dtype=float)[index] for name in self.fields])
+        status = np.asarray(batch["status"])[index].astype(np.int16)
+
+        if self.adaptive:
+            stable = ~self._moved(index, values, status, self.sampled, self.sampled_status)
+            base = self.base[status]
+            self.period[index] = np.where(stable, np.minimum(self.period[index] * 2, base * self.max_backoff), base)
+        period = self.period[index]
+        self.due_at[index] = (np.floor(now / period + 1e-9) + 1) * period
+        self.sampled[index] = values
+        self.sampled_status[index] = status
+        self.sampled_count += len(index)
+
+        if self.deadband:
+            send = (self._moved(index, values, status, self.sent, self.sent_status)
+                    | (now - self.sent_at[index] >= self.heartbeat))
+            index, values, status = index[send], values[send], status[send]
+        self.sent[index] = values
+        self.sent_status[index] = status
+        self.sent_at[index] = now
+        self.sent_count += len(index)
+        return index
+
+    def stats(self):
+        return {
+            "sampled": self.sampled_count,
+            "sent": self.sent_count,
+            "suppressed": self.suppressed_count,
+            "mean_period_s": round(float(self.period.mean()), 2),
+        }
+
+
+def columns_of(reading, status_names):
+    """One wire-format reading as a batch of length 1, for SamplingPolicy.select()."""
+    batch = {name: [reading[name]] for name in DELTAS}
+    batch["status"] = [status_names.index(reading["status"])]
+    return batch
+
+
+def parse_deltas(items):
+    """["CO2_ppm=50", ...] from the command line -> {"CO2_ppm": 50.0, ...}"""
+    deltas = {}
+    for item in items or ():
+        name, _, value = item.partition("=")
+        if name not in DELTAS or not value:
+            raise ValueError(f"Expected FIELD=DELTA with FIELD one of {', '.join(DELTAS)}, got {item!r}")
+        deltas[name] = float(value)
+    return deltas
@@ -1,77 +1,209 @@
+import argparse
 import asyncio
-import logging
 import signal
 import sys
 from spade.agent import Agent
-from spade.behaviour import PeriodicBehaviour
-from lab2.environment import generate_sensor_data
-from config import AGENTS
-import json
+from spade.behaviour import OneShotBehaviour, PeriodicBehaviour
+from lab2.environment import STATUS_NAMES, generate_sensor_data, seed as seed_environment
+from lab2.gateway import VirtualSensorBank, chunk, DEFAULT_BATCH_SIZE
+from lab2.recording import ReadingRecorder, ReadingReplay
+from lab2.sampling import DEFAULT_HEARTBEAT, SamplingPolicy, columns_of, parse_deltas
+from config import AGENTS, WIRE_ENCODING, TRANSPORT, SIM_SEED, METRICS_PORT
+from common.bus import BusTransport
+from common.clock import CLOCK
+from common.codec import set_body
+from common.logs import console, setup_logging
+from common.metrics import serve_metrics
+from common.profiling import enable_profiling
 from spade.message import Message
 
-# Setup logging
-logging.basicConfig(
-    filename="sensor_logs.log",
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s"
-)
+# Setup logging (written by a background thread, see common/logs.py)
+log = setup_logging("sensor", "sensor_logs.log", "%(asctime)s - %(levelname)s - %(message)s")
+
+class SensorAgent(BusTransport, Agent):
+    def __init__(self, jid, password, field=None, sensor_index=0, virtual_sensors=0,
+                 batch_size=DEFAULT_BATCH_SIZE, encoding=WIRE_ENCODING, transport=TRANSPORT, seed=SIM_SEED,
+                 record=None, replay=None, replay_rate=1.0, metrics_port=METRICS_PORT, adaptive=False,
+                 deadband=False, deadband_deltas=None, heartbeat=DEFAULT_HEARTBEAT, coordinator=None):
+        super().__init__(jid, password)
+        self.use_transport(transport)  # "xmpp" or the in-process "bus"
+        if seed is not None:
+            seed_environment(seed)  # Reproducible readings from lab2.environment
+        self.field = field  # Optional lab2.field.SensorField shared by many sensors
+        self.sensor_index = sensor_index  # This sensor's position in the field
+        self.virtual_sensors = virtual_sensors  # > 0 switches to gateway mode
+        self.batch_size = batch_size  # Readings per gateway message
+        self.encoding = encoding  # Body codec, see common/codec.py
+        self.recorder = ReadingRecorder(record) if record else None  # Append sent readings to a recording
+        self.replay = replay  # Recording to send instead of generated readings, see lab2/recording.py
+        self.replay_rate = replay_rate  # Replay speed-up (1 = as recorded, 0 = as fast as possible)
+        self.readings_sent = 0  # Readings shipped to the coordinator
+        self.coordinator = coordinator or AGENTS["coordinator"]["jid"]  # JID the readings go to
+        self.metrics_port = metrics_port  # Serve /metrics on this port (0 = off), see common/metrics.py
+        # Adaptive periods and dead-band suppression per sensor, see lab2/sampling.py (None = every 5 s, all sent)
+        self.policy = SamplingPolicy(virtual_sensors or 1, adaptive=adaptive, deadband=deadband,
+                                     deltas=deadband_deltas, heartbeat=heartbeat) if adaptive or deadband else None
+
+    async def send_readings(self, behaviour, readings):
+        """Ship readings to the coordinator in batch_size messages; returns the message count."""
+        sent = 0
+        for part in chunk(readings, self.batch_size):
+            msg = Message(
+                to=self.coordinator,
+                sender=str(self.jid)
+            )
+            msg.set_metadata("performative", "inform")
+            set_body(msg, "readings", part, self.encoding)
+            msg.set_metadata("batch_size", str(len(part)))
+            await behaviour.send(msg)
+            sent += 1
+        self.readings_sent += len(readings)
+        return sent
 
-class SensorAgent(Agent):
     class SenseBehaviour(PeriodicBehaviour):
         async def run(self):
             try:
-                # Generate sensor data with dormancy bias (0.8 for realistic dormancy)
-                data = generate_sensor_data(dormancy_bias=0.75)
+                if self.agent.field is not None:
+                    # Read this sensor's slot from the shared correlated field
+                    data = self.agent.field.reading(self.agent.sensor_index, CLOCK.monotonic())
+                else:
+                    # Generate sensor data with dormancy bias (0.8 for realistic dormancy)
+                    data = generate_sensor_data(dormancy_bias=0.75)
+                policy = self.agent.policy
+                if policy is not None:
+                    now = CLOCK.monotonic()
+                    send = len(policy.select([0], columns_of(data, STATUS_NAMES), now))
+                    self.period = CLOCK.real(policy.next_due(now))
+                    if not send:
+                        log.debug("%s - reading within dead-band, not sent: %s", self.agent.jid, data)
+                        return
                 # Print to console
-                print(f"[{self.agent.jid}] Sensor reading: {data}")
+                console.info("[%s] Sensor reading: %s", self.agent.jid, data)
                 # Log to file
-                logging.info(f"{self.agent.jid} - {data}")
+                log.info("%s - %s", self.agent.jid, data)
                 msg = Message(
-                    to=AGENTS["coordinator"]["jid"],
-                    sender=str(self.agent.jid),  # Explicitly set the sender
-                    body=json.dumps(data)
+                    to=self.agent.coordinator,
+                    sender=str(self.agent.jid)  # Explicitly set the sender
                 )
                 msg.set_metadata("performative", "inform")
-                msg.body = json.dumps(data)
+                set_body(msg, "reading", data, self.agent.encoding)
 
-                print(f"[{self.agent.jid}] Sending {msg} to {AGENTS['coordinator']['jid']}")
+                console.info("[%s] Sending %s to %s", self.agent.jid, msg, self.agent.coordinator)
                 await self.send(msg)
-                print(f"[{self.agent.jid}] Message sent")
+                console.info("[%s] Message sent", self.agent.jid)
+                self.agent.readings_sent += 1
+                if self.agent.recorder:
+                    self.agent.recorder.write([data], default_id=self.agent.name, now=CLOCK.time())
             except Exception as e:
-                logging.error(f"Error in sensor reading: {e}")
-                print(f"Error reading sensor: {e}")
+                log.exception("%s - error in sensor reading", self.agent.jid)
+                console.error("[%s] Error reading sensor: %s", self.agent.jid, e)
 
         async def on_end(self):
-            print(f"Behaviour {self.name} has finished.")
+            console.info("Behaviour %s has finished.", self.name)
+
+    class GatewayBehaviour(PeriodicBehaviour):
+        """Samples every virtual sensor once per period and ships them in batches."""
+
+        async def on_start(self):
+            self.bank = VirtualSensorBank(
+                self.agent.name, self.agent.virtual_sensors, dormancy_bias=0.75, field=self.agent.field
+            )
+
+        async def run(self):
+            try:
+                policy = self.agent.policy
+                readings = self.bank.sample_batch(policy=policy)  # columns all the way to the codec
+                if policy is not None:
+                    self.period = CLOCK.real(policy.next_due(CLOCK.monotonic()))
+                    if not readings:
+                        return
+                sent = await self.agent.send_readings(self, readings)
+                if self.agent.recorder:
+                    self.agent.recorder.write(readings)
+                emergencies = int(readings.emergency.sum())
+                console.info("[%s] Gateway sent %d readings in %d messages (%d emergencies)",
+                             self.agent.jid, len(readings), sent, emergencies)
+                log.info("%s - gateway tick: %d readings, %d messages, %d emergencies",
+                         self.agent.jid, len(readings), sent, emergencies)
+            except Exception as e:
+                log.exception("%s - error in gateway tick", self.agent.jid)
+                console.error("[%s] Error in gateway tick: %s", self.agent.jid, e)
+
+    class ReplayBehaviour(OneShotBehaviour):
+        """
+        Sends a recording through the gateway path, one recorded tick at a
+        time. Timestamps are shifted so the stream starts now.
+        """
+
+        async def run(self):
+            replay = ReadingReplay(self.agent.replay)
+            rate = self.agent.replay_rate
+            console.info("[%s] Replaying %d readings from %s at %s", self.agent.jid, len(replay), self.agent.replay,
+                         f"{rate:g}x" if rate else "max rate")
+            log.info("%s - replay of %s started (%d readings)", self.agent.jid, self.agent.replay, len(replay))
+            offset = previous = None
+            readings_sent = 0
+            for stamp, readings in replay.ticks():
+                if offset is None:
+                    offset, previous = CLOCK.time() - stamp, stamp
+                if rate and stamp > previous:
+                    await CLOCK.sleep((stamp - previous) / rate)
+                else:
+                    await asyncio.sleep(0)  # let the receivers keep up
+                previous = stamp
+                # New dicts rather than updating the replayed ones: a logged record may still refer to those
+                readings = [dict(reading, timestamp=round(stamp + offset, 3)) for reading in readings]
+                await self.agent.send_readings(self, readings)
+                readings_sent += len(readings)
+            console.info("[%s] Replay finished: %d readings sent", self.agent.jid, readings_sent)
+            log.info("%s - replay finished: %d readings sent", self.agent.jid, readings_sent)
 
     async def setup(self):
-        print(f"Starting {self.jid}...")
-        # Run SenseBehaviour every 5 seconds
-        behaviour = self.SenseBehaviour(period=5)
+        console.info("Starting %s...", self.jid)
+        serve_metrics(self, self.metrics_port)
+        enable_profiling(self)  # Loop lag monitor and on-demand profiles, see common/profiling.py
+        if self.replay:
+            self.add_behaviour(self.ReplayBehaviour())
+            return
+        if self.virtual_sensors:
+            # One agent, one connection, N virtual sensors every 5 seconds
+            console.info("[%s] Gateway mode with %d virtual sensors", self.jid, self.virtual_sensors)
+            behaviour = self.GatewayBehaviour(period=CLOCK.real(5))
+        else:
+            # Run SenseBehaviour every 5 seconds
+            behaviour = self.SenseBehaviour(period=CLOCK.real(5))
         self.add_behaviour(behaviour)
 
     async def shutdown(self):
-        print(f"Shutting down {self.jid}...")
+        console.info("Shutting down %s...", self.jid)
         await self.stop()
-        print(f"{self.jid} has been stopped.")
+        if self.recorder:
+            self.recorder.close()
+            log.info("%s - recorded %d readings to %s", self.jid, self.recorder.count, self.recorder.path)
+        if self.policy:
+            log.info("%s - sampling: %s", self.jid, self.policy.stats())
+        console.info("%s has been stopped.", self.jid)
 
-async def main():
+async def main(virtual_sensors=0, record=None, replay=None, replay_rate=1.0, adaptive=False, deadband=False,
+               deadband_deltas=None, heartbeat=DEFAULT_HEARTBEAT):
     # Get agent credentials
     try:
         sensor_jid = AGENTS["sensor"]["jid"]
         sensor_pwd = AGENTS["sensor"]["password"]
     except KeyError as e:
-        print(f"Configuration error: Missing {e} in AGENTS dictionary")
+        console.error("Configuration error: Missing %s in AGENTS dictionary", e)
         return
 
     # Create agent
-    sensor_agent = SensorAgent(sensor_jid, sensor_pwd)
+    sensor_agent = SensorAgent(sensor_jid, sensor_pwd, virtual_sensors=virtual_sensors,
+                               record=record, replay=replay, replay_rate=replay_rate, adaptive=adaptive,
+                               deadband=deadband, deadband_deltas=deadband_deltas, heartbeat=heartbeat)
     
     # Create shutdown event
     shutdown_event = asyncio.Event()
     
     def signal_handler():
-        print("\nReceived shutdown signal...")
+        console.info("\nReceived shutdown signal...")
         shutdown_event.set()
     
     # Set up signal handlers
@@ -85,30 +217,54 @@ async def main():
 
     try:
         await sensor_agent.start(auto_register=True)
-        print(f"Agent {sensor_jid} started successfully.")
-        print("Sensor agent is running. Press Ctrl+C to stop.")
+        console.info("Agent %s started successfully.", sensor_jid)
+        console.info("Sensor agent is running. Press Ctrl+C to stop.")
 
         # Wait for shutdown signal
         await shutdown_event.wait()
         
     except KeyboardInterrupt:
-        print("\nCtrl+C detected. Shutting down gracefully...")
+        console.info("\nCtrl+C detected. Shutting down gracefully...")
     except Exception as e:
-        print(f"Unexpected error: {e}")
-        logging.error(f"Unexpected error in main: {e}")
+        console.error("Unexpected error: %s", e)
+        log.exception("Unexpected error in main")
     finally:
         # Graceful shutdown without task cancellation
-        print("Initiating graceful shutdown...")
+        console.info("Initiating graceful shutdown...")
         await sensor_agent.shutdown()
-        print("Shutdown complete.")
+        console.info("Shutdown complete.")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Volcano sensor agent")
+    parser.add_argument("--virtual-sensors", type=int, default=0,
+                        help="run as a gateway multiplexing N virtual sensors")
+    parser.add_argument("--record", metavar="PATH", help="append every sent reading to a recording")
+    parser.add_argument("--replay", metavar="PATH", help="send a recording instead of generated readings")
+    parser.add_argument("--replay-rate", type=float, default=1.0,
+                        help="replay speed-up: 1 = as recorded, N = N times faster, 0 = max rate")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="sample faster as readings escalate and back off while they are stable")
+    parser.add_argument("--deadband", action="store_true",
+                        help="only send readings that changed beyond a delta, or on the heartbeat")
+    parser.add_argument("--deadband-delta", action="append", metavar="FIELD=DELTA",
+                        help="override a field's dead-band delta (repeatable)")
+    parser.add_argument("--heartbeat", type=float, default=DEFAULT_HEARTBEAT,
+                        help="with --deadband, send at least this often per sensor (simulated seconds)")
+    args = parser.parse_args()
+    try:
+        deadband_deltas = parse_deltas(args.deadband_delta)
+    except ValueError as e:
+        parser.error(str(e))
+
     try:
-        asyncio.run(main())
+        asyncio.run(main(virtual_sensors=args.virtual_sensors, record=args.record,
+                         replay=args.replay, replay_rate=args.replay_rate, adaptive=args.adaptive,
+                         deadband=args.deadband, deadband_deltas=deadband_deltas,
+                         heartbeat=args.heartbeat))
     except KeyboardInterrupt:
-        print("\nProgram interrupted by user.")
+        console.info("\nProgram interrupted by user.")
         sys.exit(0)
     except Exception as e:
-        print(f"Fatal error: {e}")
-        logging.error(f"Fatal error: {e}")
+        console.error("Fatal error: %s", e)
+        log.exception("Fatal error")
         sys.exit(1)
\ No newline at end of file
@@ -0,0 +1,212 @@
+import asyncio
+import logging
+import time
+
+import numpy as np
+
+from common.clock import CLOCK
+from lab3.heuristics import task_time_for
+
+# Part of the coordinator: its records go to the coordinator's log file
+log = logging.getLogger("coordinator.assignment")
+
+
+def linear_sum_assignment(cost):
+    """
+    Optimal assignment for a rectangular cost matrix (Hungarian algorithm,
+    shortest augmenting path form).
+
+    Returns (rows, cols) index arrays such that cost[rows, cols].sum() is
+    minimal and every row or every column (whichever is fewer) is used
+    exactly once. The inner scan over columns is vectorized, so each
+    augmentation step is a handful of NumPy operations.
+    """
+    cost = np.asarray(cost, dtype=float)
+    transposed = cost.shape[0] > cost.shape[1]
+    if transposed:
+        cost = cost.T
+    n, m = cost.shape
+    if n == 0:
+        return np.empty(0, dtype=int), np.empty(0, dtype=int)
+
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    p = np.zeros(m + 1, dtype=int)    # p[j]: row (1-based) matched to column j
+    way = np.zeros(m + 1, dtype=int)
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            free = ~used[1:]
+            cur = cost[i0 - 1] - u[i0] - v[1:]
+            better = free & (cur < minv[1:])
+            minv[1:][better] = cur[better]
+            way[1:][better] = j0
+            j1 = int(np.argmin(np.where(free, minv[1:], np.inf))) + 1
+            delta = minv[j1]
+            u[p[used]] += delta
+            v[used] -= delta
+            minv[~used] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+
+    cols = np.nonzero(p[1:])[0]
+    rows = p[1:][cols] - 1
+    if transposed:
+        rows, cols = cols, rows
+    order = np.argsort(rows)
+    return rows[order], cols[order]
+
+
+def severity_weights(payloads):
+    """
+    Weight of each incident (common.schema.DeployRequest) in the objective,
+    from the same factors the rescue heuristic uses: population risk,
+    affected area and lava flow.
+    """
+    risk = np.array([p.population_risk for p in payloads], dtype=float)
+    area = np.array([p.area_affected_km2 for p in payloads], dtype=float)
+    lava = np.array([p.lava_flow_m3_s for p in payloads], dtype=float)
+    return 1.0 + risk / 10 + area / 50 + np.minimum(lava / 1000, 1.0)
+
+
+def response_cost(weights, task_times, free_at, now, depth):
+    """
+    Cost matrix for placing incident i at the k-th position from the end
+    of slot j's queue (columns are (slot, k) pairs, slot-major).
+
+    An incident's own weighted completion is w_i * (wait_j + t_i), and it
+    delays the k - 1 incidents queued behind it by t_i each. Counting
+    positions from the end makes that delay independent of the rest of the
+    queue, so the total is a plain sum over assigned cells (exact when all
+    weights are equal; the delay uses the mean weight otherwise).
+    """
+    wait = np.maximum(np.asarray(free_at, dtype=float) - now, 0.0)
+    behind = np.arange(depth) * weights.mean()
+    own = weights[:, None] * (wait[None, :] + task_times[:, None])          # (n, slots)
+    delay = task_times[:, None] * behind[None, :]                           # (n, depth)
+    return (own[:, :, None] + delay[:, None, :]).reshape(len(weights), -1)
+
+
+def allocate(pool, payloads, now=None, max_batch=32):
+    """
+    Assign every payload to a rescue unit slot, minimizing total weighted
+    response time with an optimal assignment over (slot, position) columns.
+
+    Large batches are solved max_batch incidents at a time, most urgent
+    first (highest weight per second of work), each against the queues the
+    previous chunk left behind; this keeps solve time linear in the batch.
+    The result is then an approximation, not the one optimal assignment of
+    the whole batch, whose solve time grows about cubically: in
+    benchmarks/bench_assignment.py chunks of 32 come within 1% of it (0.9%
+    at 100 incidents, 0.2% at 400) and solve 2.5 to 25 times faster. Pass
+    max_batch=len(payloads) for the exact solve.
+
+    Returns one lab3.scheduler.Assignment per payload, in order, or None
+    for a payload no unit had room for (see RescuePool.full()).
+    """
+    assignments = [None] * len(payloads)
+    for _ in allocate_chunks(pool, payloads, assignments, now, max_batch):
+        pass
+    return assignments
+
+
+def allocate_chunks(pool, payloads, assignments, now=None, max_batch=32):
+    """
+    allocate() one chunk at a time: fills `assignments` in place (each
+    entry as soon as pool.place() took it) and yields after every chunk, so
+    a caller on the event loop can let other tasks run in between.
+    """
+    now = pool.clock() if now is None else now
+    if not payloads:
+        return
+    weights = severity_weights(payloads)
+    task_times = np.array([task_time_for(p) for p in payloads], dtype=float)
+    urgency = np.argsort(-weights / task_times, kind="stable")
+    for start in range(0, len(payloads), max_batch):
+        chunk = urgency[start:start + max_batch]
+        keys, free_at = pool.slots()
+        if not keys:
+            return  # every unit is full
+        depth = min(len(chunk), -(-len(chunk) // len(keys)) * 2)  # room to stack where it pays
+        rows, cols = linear_sum_assignment(
+            response_cost(weights[chunk], task_times[chunk], free_at, now, depth))
+
+        # Commit each slot's queue front to back: highest position-from-end first
+        cells = sorted(zip(cols.tolist(), rows.tolist()), key=lambda cell: (cell[0] // depth, -(cell[0] % depth)))
+        for col, row in cells:
+            index, key = chunk[row], keys[col // depth]
+            if not pool.full(key[0]):
+                assignments[index] = pool.place(key, task_times[index], now)
+        yield
+
+
+class BatchAllocator:
+    """
+    Collects deployment requests for a short window and assigns them
+    together with allocate().
+
+    The first request opens the window; every incident that asks during
+    the window is solved in the same batch. A window of 0 still batches
+    everything requested in the same event loop pass. The batch is solved
+    max_batch incidents at a time (see allocate() for what that costs in
+    quality), yielding to the event loop after each chunk, so a burst never
+    holds up monitoring and routing for longer than one chunk.
+    """
+
+    def __init__(self, pool, window=1.0, max_batch=32):
+        self.pool = pool
+        self.window = window
+        self.max_batch = max_batch
+        self._pending = []
+        self._flush = None
+        self.batches = 0
+        self.last_solve_s = 0.0
+
+    async def assign(self, payload):
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((payload, future))
+        if self._flush is None:
+            self._flush = asyncio.create_task(self._solve_after_window())
+        return await future
+
+    async def _solve_after_window(self):
+        await CLOCK.sleep(self.window)
+        batch, self._pending, self._flush = self._pending, [], None
+        assignments = [None] * len(batch)
+        error = None
+        start = time.perf_counter()
+        try:
+            for _ in allocate_chunks(self.pool, [payload for payload, _ in batch], assignments,
+                                     max_batch=self.max_batch):
+                await asyncio.sleep(0)
+        except Exception as e:
+            log.error("Batch assignment failed, falling back to greedy dispatch: %s", e)
+            try:
+                # Only what the solver had not placed yet: the rest already counts in the pool
+                for index, (payload, _) in enumerate(batch):
+                    if assignments[index] is None:
+                        assignments[index] = self.pool.assign(task_time_for(payload))
+            except Exception as e:
+                log.error("Greedy dispatch failed as well: %s", e)
+                error = e
+        self.last_solve_s = time.perf_counter() - start  # wall time, including the other tasks' turns
+        self.batches += 1
+        log.info("Assigned %d incident(s) in one batch (%.1f ms)", len(batch), self.last_solve_s * 1e3)
+        for (_, future), assignment in zip(batch, assignments):
+            if future.cancelled():
+                if assignment is not None:
+                    self.pool.complete(assignment)  # the incident went away meanwhile
+            elif assignment is None and error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(assignment)
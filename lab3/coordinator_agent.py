@@ -1,220 +1,234 @@
 import asyncio
-import json
-import logging
+
+import numpy as np
 from spade.agent import Agent
 from spade.behaviour import FSMBehaviour, State, CyclicBehaviour
-from spade.message import Message
-from config import AGENTS
+from config import (AGENTS, WIRE_ENCODING, RESCUE_POOL, RESCUE_WORKERS, SERIES_WINDOW, SERIES_MAX_SENSORS, TRANSPORT,
+                    METRICS_PORT, INTAKE_ENABLED, INTAKE_COALESCE_AT, INTAKE_ROUTINE_LIMIT, INTAKE_SEVERE_LIMIT,
+                    INTAKE_BATCH, STORE_PATH, STORE_BATCH, STORE_FLUSH, CONFIRM_TIMEOUT, DEADLINES_ENABLED,
+                    DEADLINE_PERCENTILE, DEADLINE_SLACK, HEDGE_PERCENTILE, LOG_LEVEL)
+from common.bus import BusTransport
+from common.clock import CLOCK
+from common.codec import read_readings
+from common.logs import console, setup_logging
+from common.metrics import TimedState, count_in, serve_metrics
+from common.profiling import enable_profiling, is_profile_request
+from common.store import Store
+from lab3.deadlines import DeadlineEstimator
+from lab3.incidents import IncidentEngine
+from lab3.intake import PriorityIntake
+from lab3.router import MessageRouter
+from lab3.scheduler import RescuePool
+from lab3.assignment import BatchAllocator
+from lab3.timeseries import SensorSeries
+from lab3.precursors import PrecursorDetector
 
-# Setup logging for coordinator
-logging.basicConfig(
-    filename="coordinator_logs.log",
-    level=logging.INFO,
-    format="%(asctime)s | COORDINATOR | %(levelname)s | %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S"
-)
+# Setup logging for coordinator (written by a background thread, see common/logs.py)
+log = setup_logging("coordinator", "coordinator_logs.log",
+                    "%(asctime)s | COORDINATOR | %(levelname)s | %(message)s", datefmt="%Y-%m-%d %H:%M:%S")
 
 # ----------- STATES --------------
 
-class MonitoringState(State):
+class MonitoringState(TimedState, State):
     async def run(self):
-        print("[Coordinator] State: MONITORING")
-        
-        # Wait for a message with a timeout
-        msg = await self.receive(timeout=2)
+        console.info("[Coordinator] State: MONITORING")
         
-        if msg:
-            # Extract the bare JID (without resource) from the sender
-            sender_bare = str(msg.sender).split('/')[0]  # Removes anything after /
-            sensor_bare = AGENTS["sensor"]["jid"].split('/')[0]
-            
-            print(f"[Coordinator] Message from: {msg.sender} (bare: {sender_bare})")
-            
-            # Compare bare JIDs
-            if sender_bare == sensor_bare:
+        intake = self.agent.intake
+        if intake is not None:
+            # Readings come most urgent first from the priority intake (the router files them there)
+            items = await self.wait(intake.get(timeout=CLOCK.real(2)))
+            if items:
+                console.info("[Coordinator] Sensor data taken from intake: %d reading(s), %d waiting",
+                             len(items), len(intake))
                 try:
-                    data = json.loads(msg.body)
-                    print(f"[Coordinator] Sensor data received: {data}")
-                    
-                    # Store the data in the agent's memory for later use
-                    self.agent.last_sensor_data = data
-                    
-                    if data.get("emergency"):
-                        print("[Coordinator] Emergency detected!")
-                        self.set_next_state("ALERT")
-                    else:
-                        self.set_next_state("MONITORING")
-                        
+                    self.handle([key for key, _ in items], [reading for _, reading in items])
                 except Exception as e:
-                    print(f"[Coordinator] Error processing message: {e}")
-                    self.set_next_state("MONITORING")
-            else:
-                print(f"[Coordinator] Ignoring message from {sender_bare} (expected {sensor_bare})")
-                self.set_next_state("MONITORING")
-        else:
+                    console.error("[Coordinator] Error processing readings: %s", e)
             self.set_next_state("MONITORING")
+            return
 
-class AlertState(State):
-    async def run(self):
-        print("[Coordinator] State: ALERT")
-        logging.info("Entered ALERT state")
-        print("[Coordinator] Preparing rescue deployment...")
-        logging.info("Preparing rescue deployment")
-        
-        # Use the stored sensor data if available
-        if hasattr(self.agent, 'last_sensor_data'):
-            data = self.agent.last_sensor_data
-            print(f"[Coordinator] Deploying based on data: {data}")
-            logging.info(f"Deploying based on sensor data: {data}")
-        
-        await asyncio.sleep(1)
-        logging.info("Alert state complete, transitioning to RESPONDING")
-        self.set_next_state("RESPONDING")
-
-class RespondingState(State):
-    async def run(self):
-        print("[Coordinator] State: RESPONDING")
-        logging.info("Entered RESPONDING state")
-        
-        # Get the latest sensor data to send to rescue
-        data = getattr(self.agent, 'last_sensor_data', {})
-        print(f"[Coordinator] Using sensor data: {data}")
-        logging.info(f"Using sensor data for rescue request: {data}")
+        # Wait for a message with a timeout (the router only delivers sensor readings here)
+        msg = await self.receive(timeout=CLOCK.real(2))
         
-        # Include all sensor data in the payload
-        payload = {
-            "action": "deploy",
-            "emergency": data.get("emergency", True),
-            "area_affected_km2": data.get("area_affected_km2", 0),
-            "population_risk": data.get("population_risk", 0),
-            "lava_flow_m3_s": data.get("lava_flow_m3_s", 0),
-            "status": data.get("status", "unknown")
-        }
-        
-        # Create message properly
-        msg = Message(
-            to=AGENTS["rescue"]["jid"],
-            sender=str(self.agent.jid),
-            body=json.dumps(payload)
-        )
-        msg.set_metadata("performative", "request")
-        
-        # Debug output
-        print(f"[Coordinator] Sending to rescue agent at {AGENTS['rescue']['jid']}")
-        print(f"[Coordinator] Message body: {msg.body}")
-        print(f"[Coordinator] Message metadata: {msg.metadata}")
-        logging.info(f"Sending rescue request to {AGENTS['rescue']['jid']}")
-        logging.info(f"Request payload: {payload}")
-        
-        await self.send(msg)
-        print("[Coordinator] Rescue request sent with data:", payload)
-        logging.info("Rescue request sent")
-
-        # Wait for confirmation with timeout
-        print("[Coordinator] Waiting for rescue confirmation...")
-        logging.info("Waiting for rescue confirmation (timeout=15s)")
-        reply = await self.receive(timeout=15)
-        
-        if reply:
-            print(f"[Coordinator] Got reply from {reply.sender}")
-            print(f"[Coordinator] Reply body: {reply.body}")
-            logging.info(f"Received reply from {reply.sender}: {reply.body}")
+        if msg:
+            sender_bare = msg.sender.bare
+            console.info("[Coordinator] Message from: %s (bare: %s)", msg.sender, sender_bare)
             try:
-                result = json.loads(reply.body)
-                print(f"[Coordinator] Rescue completed: {result}")
-                logging.info(f"Rescue completed successfully: {result}")
-                # Store the result for recovery state
-                self.agent.last_rescue_result = result
+                # Gateway messages carry a batch of virtual sensor readings; each is validated here
+                readings, malformed = read_readings(msg, CLOCK.time())
+                if malformed:
+                    self.agent.malformed_readings += malformed
+                    log.warning("Dropped %d malformed reading(s) from %s", malformed, sender_bare)
+                console.info("[Coordinator] Sensor data received: %d reading(s)", len(readings))
+                if readings:
+                    self.handle([reading["sensor_id"] or sender_bare for reading in readings], readings)
             except Exception as e:
-                print(f"[Coordinator] Error parsing confirmation: {e}")
-                print(f"[Coordinator] Raw reply: {reply.body}")
-                logging.error(f"Error parsing rescue confirmation: {e}")
-                logging.error(f"Raw reply: {reply.body}")
-        else:
-            print("[Coordinator] No rescue confirmation received (timeout)")
-            logging.warning("No rescue confirmation received (timeout)")
-            
-        logging.info("Responding state complete, transitioning to RECOVERY")
-        self.set_next_state("RECOVERY")
-
-
-class RecoveryState(State):
-    async def run(self):
-        print("[Coordinator] State: RECOVERY")
-        logging.info("Entered RECOVERY state")
-        
-        # Show rescue result if available
-        if hasattr(self.agent, 'last_rescue_result'):
-            result = self.agent.last_rescue_result
-            print(f"[Coordinator] Recovery from rescue: {result}")
-            logging.info(f"Recovery phase with rescue result: {result}")
-            
-        print("[Coordinator] System stabilizing...")
-        logging.info("System stabilization in progress")
-        await asyncio.sleep(2)
-        
-        # Clear old data
-        if hasattr(self.agent, 'last_rescue_result'):
-            delattr(self.agent, 'last_rescue_result')
-            logging.info("Cleared last rescue result data")
-            
-        logging.info("Recovery complete, transitioning to MONITORING")
+                console.error("[Coordinator] Error processing message: %s", e)
         self.set_next_state("MONITORING")
 
+    def handle(self, keys, readings):
+        """Update history and precursors with a batch of readings and open incidents for emergencies."""
+        # Store the data in the agent's memory for later use
+        self.agent.last_sensor_data = readings[-1]
+        self.agent.readings_received += len(readings)
+        if self.agent.store is not None:
+            self.agent.store.add_readings(keys, readings, CLOCK.time())
+        series = self.agent.series
+        rows = series.extend(keys, readings)
+
+        # Precursor trends raise a pre-alert before the emergency flag does
+        detector, pre_alerts = self.agent.detector, self.agent.pre_alerts
+        raised = detector.update_many(rows, readings, series.fresh(rows))
+        if pre_alerts:
+            # A pre-alert whose channels settled says nothing about a later emergency
+            for i in np.flatnonzero(~detector.active(rows)):
+                pre_alerts.pop(keys[i], None)
+        for i, channels in raised:
+            pre_alerts[keys[i]] = CLOCK.monotonic()
+            console.info("[Coordinator] PRE-ALERT %s: rising %s", keys[i], ", ".join(channels))
+            log.warning("Pre-alert for %s: rising %s, CUSUM %s",
+                        keys[i], channels, detector.score(rows[i]))
+
+        # Every emergency gets its own incident; monitoring never waits on them
+        for key, reading in zip(keys, readings):
+            if reading.get("emergency"):
+                console.info("[Coordinator] Emergency detected! %s", key)
+                pre_alert = pre_alerts.pop(key, None)
+                if pre_alert is not None:
+                    log.info("Emergency at %s came %.0fs after its pre-alert", key, CLOCK.monotonic() - pre_alert)
+                self.agent.incidents.open(reading, key)
+
+
+class DebugBehaviour(CyclicBehaviour):
+    """Tap on the router: prints a copy of every incoming message (only added with LOG_LEVEL=DEBUG)."""
+
+    async def run(self):
+        msg = await self.receive(timeout=1)
+        if msg:
+            console.info("\n*** DEBUG: GOT MESSAGE ***\nFrom: %s\nTo: %s\nBody: %s\nMetadata: %s\n"
+                         "***************************\n", msg.sender, msg.to, msg.body, msg.metadata)
+            log.debug("Debug behaviour caught message from %s: %s", msg.sender, msg.body)
+
 # ----------- AGENT --------------
 
-class CoordinatorAgent(Agent):
-    def __init__(self, jid, password):
+class CoordinatorAgent(BusTransport, Agent):
+    def __init__(self, jid, password, encoding=WIRE_ENCODING, max_incidents=None, rescue_pool=None,
+                 assignment_window=0.5, transport=TRANSPORT, incident_history=1000, metrics_port=METRICS_PORT,
+                 intake=INTAKE_ENABLED, store=STORE_PATH, sensors=None, deadlines=DEADLINES_ENABLED):
         super().__init__(jid, password)
+        self.use_transport(transport)  # "xmpp" or the in-process "bus"
         self.last_sensor_data = None  # Store last sensor reading
+        self.readings_received = 0  # Sensor readings processed by monitoring
+        self.malformed_readings = 0  # Readings dropped by monitoring as invalid (the intake counts its own)
+        self.encoding = encoding  # Body codec for rescue requests, see common/codec.py
+        self.max_incidents = max_incidents  # Cap on concurrently running incidents
+        self.incidents = None  # IncidentEngine, created in setup
+        self.router = None  # MessageRouter, created in setup
+        self.rescue_pool = rescue_pool or RESCUE_POOL  # Rescue unit JIDs to dispatch to
+        self.sensors = sensors or []  # Sensor JIDs besides config's, e.g. from launch.py
+        self.pool = None  # RescuePool scheduler, created in setup
+        self.assignment_window = assignment_window  # Seconds to batch deployments (None = one by one)
+        self.series = SensorSeries(window=SERIES_WINDOW, max_sensors=SERIES_MAX_SENSORS)  # Rolling history per sensor
+        self.detector = PrecursorDetector()  # Streaming precursor trends, rows shared with self.series
+        self.pre_alerts = {}  # sensor key -> time of its pre-alert, while the detector holds it up
+        self.incident_history = incident_history  # Closed incidents kept for inspection
+        self.metrics_port = metrics_port  # Serve /metrics on this port (0 = off), see common/metrics.py
+        # Priority intake for sensor readings (None = the FSM's FIFO mailbox), see lab3/intake.py
+        self.intake = PriorityIntake(INTAKE_COALESCE_AT, INTAKE_ROUTINE_LIMIT, INTAKE_SEVERE_LIMIT, INTAKE_BATCH,
+                                     agent=str(self.jid.bare)) if intake else None
+        # History database of readings and incidents, written off the loop, see common/store.py
+        self.store = Store(store, STORE_BATCH, STORE_FLUSH) if store else None
+        # Confirmation deadlines from expected completion times, with hedging (None = fixed CONFIRM_TIMEOUT),
+        # see lab3/deadlines.py
+        self.deadlines = DeadlineEstimator(DEADLINE_PERCENTILE, HEDGE_PERCENTILE or None,
+                                           DEADLINE_SLACK) if deadlines else None
         
     async def setup(self):
-        print(f"[{self.jid}] CoordinatorAgent starting...")
-        logging.info(f"CoordinatorAgent starting with JID: {self.jid}")
-        print(f"[{self.jid}] Connected: {self.is_alive()}")
-        logging.info(f"Connection status: {self.is_alive()}")
-        
-        # Add debug behaviour
-        class DebugBehaviour(CyclicBehaviour):
-            async def run(self):
-                msg = await self.receive(timeout=1)
-                if msg:
-                    print(f"\n*** DEBUG: GOT MESSAGE ***")
-                    print(f"From: {msg.sender}")
-                    print(f"To: {msg.to}")
-                    print(f"Body: {msg.body}")
-                    print(f"Metadata: {msg.metadata}")
-                    print("***************************\n")
-                    logging.debug(f"Debug behaviour caught message from {msg.sender}: {msg.body}")
+        console.info("[%s] CoordinatorAgent starting...", self.jid)
+        log.info("CoordinatorAgent starting with JID: %s", self.jid)
+        console.info("[%s] Connected: %s", self.jid, self.is_alive())
+        log.info("Connection status: %s", self.is_alive())
         
-        self.add_behaviour(DebugBehaviour())
-        logging.info("Debug behaviour added")
-        
-        # Your FSM
+        serve_metrics(self, self.metrics_port)
+        enable_profiling(self)  # Loop lag monitor and on-demand profiles, see common/profiling.py
+
+        # Every message goes through the router; see dispatch() below
+        self.router = MessageRouter(AGENTS)
+        for jid in self.sensors:
+            self.router.add_role(jid, "sensor")
+
+        # Debug output is a tap: it gets copies and never steals messages. It prints whole bodies
+        # (a gateway message is hundreds of readings), so it only runs when debugging
+        if LOG_LEVEL == "DEBUG":
+            debug = DebugBehaviour()
+            self.add_behaviour(debug)
+            self.router.add_tap(debug)
+            log.info("Debug behaviour added")
+
+        # Monitoring FSM only sees sensor readings, most urgent first through the intake;
+        # incidents run on their own tasks
         fsm = FSMBehaviour()
         fsm.add_state(name="MONITORING", state=MonitoringState(), initial=True)
-        fsm.add_state(name="ALERT", state=AlertState())
-        fsm.add_state(name="RESPONDING", state=RespondingState())
-        fsm.add_state(name="RECOVERY", state=RecoveryState())
-        
-        fsm.add_transition("MONITORING", "ALERT")
         fsm.add_transition("MONITORING", "MONITORING")
-        fsm.add_transition("ALERT", "RESPONDING")
-        fsm.add_transition("RESPONDING", "RECOVERY")
-        fsm.add_transition("RECOVERY", "MONITORING")
-        
         self.add_behaviour(fsm)
-        logging.info("FSM behaviour added with all states and transitions")
-        logging.info("CoordinatorAgent setup complete")
+        self.router.add_route("inform", self.intake.put if self.intake is not None else fsm, sender="sensor")
+
+        # Rescue replies reach their incident by thread; late ones fall back to the engine
+        self.pool = RescuePool(self.rescue_pool, workers=RESCUE_WORKERS)
+        for jid in self.rescue_pool:
+            self.router.add_role(jid, "rescue")
+        self.incidents = IncidentEngine(
+            send=fsm.send,
+            pool=self.pool,
+            allocator=BatchAllocator(self.pool, self.assignment_window) if self.assignment_window is not None else None,
+            encoding=self.encoding,
+            max_concurrent=self.max_incidents,
+            router=self.router,
+            series=self.series,
+            history=self.incident_history,
+            metrics=self.metrics,
+            store=self.store,
+            confirm_timeout=CONFIRM_TIMEOUT,
+            deadlines=self.deadlines,
+        )
+        for performative in ("inform", "agree", "refuse"):
+            self.router.add_route(performative, self.incidents.deliver, sender="rescue")
+        log.info("Router, monitoring FSM and incident engine added")
+        log.info("CoordinatorAgent setup complete")
+
+    def dispatch(self, msg):
+        """Route incoming messages in O(1) instead of matching every behaviour's template."""
+        if self.router is None:  # Messages that arrive before setup has finished
+            return super().dispatch(msg)
+        count_in(self)
+        if is_profile_request(msg):
+            self.control.queue.put_nowait(msg)
+            return []
+        self.router.route(msg)
+        return []
 
     async def shutdown(self):
-        logging.info("CoordinatorAgent shutting down")
+        log.info("CoordinatorAgent shutting down")
+        if self.incidents:
+            log.info("Incident stats at shutdown: %s", self.incidents.stats())
+            log.info("Router stats at shutdown: %s", self.router.stats())
+            log.info("Deployments per rescue unit: %s", dict(self.pool.dispatched))
+            log.info("Sensor history: %d sensor(s), %.1f MB", len(self.series), self.series.nbytes / 1e6)
+            log.info("Pre-alerts raised: %d", self.detector.raised)
+            if self.deadlines is not None:
+                log.info("Confirmation deadlines at shutdown: %s", self.deadlines.stats())
+            if self.intake is not None:
+                log.info("Intake at shutdown: %s", self.intake.stats())
+            await self.incidents.stop()
         await self.stop()
+        if self.store is not None:
+            await asyncio.to_thread(self.store.close)  # writes what is still queued
+            log.info("History store at shutdown: %s", self.store.stats())
 
 # ----------- MAIN --------------
 
 async def main():
-    logging.info("=== Coordinator Agent Starting ===")
+    log.info("=== Coordinator Agent Starting ===")
     coord = CoordinatorAgent(
         AGENTS["coordinator"]["jid"],
         AGENTS["coordinator"]["password"]
@@ -222,30 +236,30 @@ async def main():
     
     try:
         await coord.start(auto_register=True)
-        print("Coordinator running...")
-        logging.info(f"Coordinator agent started with JID: {AGENTS['coordinator']['jid']}")
-        logging.info(f"Connected status: {coord.is_alive()}")
+        console.info("Coordinator running...")
+        log.info("Coordinator agent started with JID: %s", AGENTS["coordinator"]["jid"])
+        log.info("Connected status: %s", coord.is_alive())
         
         # Keep the agent alive
         while coord.is_alive():
             await asyncio.sleep(1)
     except KeyboardInterrupt:
-        print("Coordinator stopping...")
-        logging.info("Coordinator agent stopped by user")
+        console.info("Coordinator stopping...")
+        log.info("Coordinator agent stopped by user")
         await coord.shutdown()
     except Exception as e:
-        print(f"Error: {e}")
-        logging.error(f"Error in main loop: {e}")
+        console.error("Error: %s", e)
+        log.exception("Error in main loop")
         await coord.shutdown()
     finally:
-        logging.info("=== Coordinator Agent Shutdown ===")
+        log.info("=== Coordinator Agent Shutdown ===")
 
 if __name__ == "__main__":
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
-        print("\nProgram interrupted by user.")
-        logging.info("Program interrupted by user")
+        console.info("\nProgram interrupted by user.")
+        log.info("Program interrupted by user")
     except Exception as e:
-        print(f"Fatal error: {e}")
-        logging.error(f"Fatal error: {e}")
\ No newline at end of file
+        console.error("Fatal error: %s", e)
+        log.exception("Fatal error")
\ No newline at end of file
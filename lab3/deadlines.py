@@ -0,0 +1,77 @@
+import bisect
+from collections import deque
+
+from common.metrics import METRICS
+
+
+class DeadlineEstimator:
+    """
+    How long to wait for a rescue confirmation, per dispatch.
+
+    The rescue pool predicts when each deployment will be done: the work
+    already placed on the unit's slot plus the task time of the payload
+    (the heuristic the unit itself uses), so a dispatch comes with an
+    expected completion time E. How far real round trips overrun that
+    prediction (transport, other coordinators' work on the unit, units
+    slower than the heuristic) is learned from the replies: observe()
+    records actual / expected for the last `window` confirmations. A
+    dispatch then waits
+
+        deadline(E) = E * (percentile-th of those ratios) + slack
+
+    capped at `maximum`, and is hedged (sent to a second unit as well)
+    once it runs past E * (hedge_percentile-th ratio) + slack.
+    hedge_percentile=None turns hedging off. Until `warmup` ratios are
+    in, every percentile is `initial`.
+    """
+
+    def __init__(self, percentile=99, hedge_percentile=90, slack=5.0, maximum=600.0, window=500, warmup=20,
+                 initial=2.0):
+        if hedge_percentile is not None and hedge_percentile >= percentile:
+            raise ValueError("hedge_percentile must be below percentile, or there is nothing left to hedge")
+        self.percentile = percentile
+        self.hedge_percentile = hedge_percentile
+        self.slack = slack
+        self.maximum = maximum
+        self.warmup = warmup
+        self.initial = initial
+        self._ratios = deque(maxlen=window)  # arrival order, for expiry
+        self._sorted = []  # the same ratios, sorted, for percentiles
+        self._ratio = METRICS.histogram("rescue_lateness_ratio", "Rescue round trip over its expected time",
+                                        buckets=(0.5, 0.8, 0.9, 1.0, 1.1, 1.25, 1.5, 2.0, 3.0, 5.0, 10.0))
+
+    @property
+    def hedging(self):
+        return self.hedge_percentile is not None
+
+    def observe(self, actual, expected):
+        """Record a confirmation that took `actual` seconds for a dispatch expected to take `expected`."""
+        ratio = float(actual / max(expected, 1e-9))
+        if len(self._ratios) == self._ratios.maxlen:
+            del self._sorted[bisect.bisect_left(self._sorted, self._ratios[0])]
+        self._ratios.append(ratio)
+        bisect.insort(self._sorted, ratio)
+        self._ratio.observe(ratio)
+
+    def ratio(self, percentile):
+        """Nearest-rank percentile of the observed ratios (`initial` during warmup)."""
+        if len(self._sorted) < self.warmup:
+            return self.initial
+        rank = max(0, min(len(self._sorted) - 1, round(percentile / 100 * len(self._sorted)) - 1))
+        return self._sorted[rank]
+
+    def deadline(self, expected):
+        """Seconds to wait for the reply to a dispatch expected to take `expected` seconds."""
+        return min(self.maximum, expected * self.ratio(self.percentile) + self.slack)
+
+    def hedge_after(self, expected):
+        """Seconds after which the dispatch counts as late and is hedged."""
+        return min(self.maximum, expected * self.ratio(self.hedge_percentile) + self.slack)
+
+    def stats(self):
+        return {
+            "observed": len(self._sorted),
+            "p50": self.ratio(50),
+            "hedge_at": self.ratio(self.hedge_percentile) if self.hedging else None,
+            "deadline_at": self.ratio(self.percentile),
+        }
@@ -0,0 +1,25 @@
+def estimate_task_time(area, pop_risk, lava):
+    """
+    Simulated rescue duration in seconds for a deployment.
+
+    This is the heuristic RescueAgent uses to size its work; the coordinator
+    uses the same function to predict when a unit will be free again.
+    """
+    # Decide response intensity (simple heuristic)
+    base_time = 2
+    time_from_area = int(area / 5)
+    time_from_pop = int(pop_risk / 2)
+    time_from_lava = int(min(lava / 100, 10))
+
+    return max(base_time, base_time + time_from_area + time_from_pop + time_from_lava)
+
+
+def task_time_for(payload):
+    """estimate_task_time for a common.schema.DeployRequest, or a deploy payload or sensor reading dict."""
+    if not isinstance(payload, dict):
+        return estimate_task_time(payload.area_affected_km2, payload.population_risk, payload.lava_flow_m3_s)
+    return estimate_task_time(
+        float(payload.get("area_affected_km2", 0.0)),
+        float(payload.get("population_risk", 0.0)),
+        float(payload.get("lava_flow_m3_s", 0.0)),
+    )
@@ -0,0 +1,507 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict, deque
+
+from spade.message import Message
+
+from common.clock import CLOCK
+from common.codec import set_body, read_body
+from common.logs import console
+from common.metrics import METRICS
+from common.schema import DeployRequest
+from lab3.heuristics import task_time_for
+
+# Part of the coordinator: its records go to the coordinator's log file
+log = logging.getLogger("coordinator.incidents")
+
+# Incident lifecycle: each incident walks these states on its own task
+ALERT, RESPONDING, RECOVERY, CLOSED = "ALERT", "RESPONDING", "RECOVERY", "CLOSED"
+TRANSITIONS = {
+    ALERT: (RESPONDING,),
+    RESPONDING: (RECOVERY,),
+    RECOVERY: (CLOSED,),
+}
+# Name of each state in fsm_state_seconds, after the FSM States these were (see common/metrics.py)
+STATE_NAMES = {ALERT: "AlertState", RESPONDING: "RespondingState", RECOVERY: "RecoveryState"}
+
+# Performatives a rescue unit answers a deploy request with; anything else on an incident's thread is ignored
+REPLIES = ("agree", "inform", "refuse")
+
+
+def expected_time(assignment, sent):
+    """
+    Seconds from `sent` until the pool expects the deployment done; never
+    less than its task time, though the batch allocator may have placed it
+    well before a slow send.
+    """
+    return max(assignment.expected_done - sent, assignment.task_time)
+
+
+class Incident:
+    """
+    One emergency and its own ALERT → RESPONDING → RECOVERY state machine.
+
+    The incident id doubles as the XMPP thread of the rescue request, so
+    the confirmation can be routed back to exactly this incident. A hedged
+    request goes out again on the same thread to a second unit; the first
+    reply wins and the other unit's is counted as a late reply.
+    """
+
+    def __init__(self, engine, key, reading):
+        self.engine = engine
+        self.id = uuid.uuid4().hex
+        self.key = key  # sensor the emergency came from
+        self.reading = reading
+        self.state = ALERT
+        self.result = None
+        self.timed_out = False
+        self.rejected = False
+        self.invalid = False  # the reply was not a confirmation we could read
+        self.refusals = 0  # units that turned the request down (queue full) before one took it
+        self.acknowledged = None  # capacity report from the unit's "agree"
+        self.assignment = None  # lab3.scheduler.Assignment chosen by the pool
+        self.hedge = None  # Assignment of the second unit, when the first ran late
+        self.dispatches = {}  # unit -> (Assignment, sent at), while its reply is outstanding
+        self.opened_at = CLOCK.monotonic()
+        self.dispatched_at = None
+        self.confirmed_at = None
+        self.closed_at = None
+        self._waited = 0.0  # idle time in the current state, see wait()
+        self._reply = asyncio.get_running_loop().create_future()
+
+    @property
+    def tag(self):
+        return f"[Coordinator] [{self.id[:8]}]"
+
+    async def run(self):
+        handlers = {ALERT: self.alert, RESPONDING: self.respond, RECOVERY: self.recover}
+        while self.state != CLOSED:
+            self._waited = 0.0
+            start = time.perf_counter()
+            dest = await handlers[self.state]()
+            self.engine.timed(self.state, time.perf_counter() - start - self._waited)
+            if dest not in TRANSITIONS[self.state]:
+                raise RuntimeError(f"Invalid incident transition {self.state} -> {dest}")
+            log.info("Incident %s transiting from %s to %s", self.id, self.state, dest)
+            self.state = dest
+        self.closed_at = CLOCK.monotonic()
+
+    async def alert(self):
+        console.info("%s State: ALERT (%s)", self.tag, self.key)
+        log.info("Incident %s entered ALERT state for %s", self.id, self.key)
+        console.info("%s Preparing rescue deployment...", self.tag)
+        log.info("Deploying based on sensor data: %s", self.reading)
+        series = self.engine.series
+        if series is not None and self.key in series:
+            log.info("Incident %s rolling history for %s: %s", self.id, self.key, series.summary(self.key))
+        await self.wait(CLOCK.sleep(self.engine.alert_delay))
+        return RESPONDING
+
+    async def respond(self):
+        console.info("%s State: RESPONDING", self.tag)
+        request = DeployRequest.from_reading(self.reading)
+        while True:
+            self.assignment = await self.assign(request)
+            await self.dispatch(self.assignment, request)
+            reply = await self.await_reply(request)
+            if (reply is None or reply.get_metadata("performative") != "refuse"
+                    or self.refusals >= self.engine.max_refusals):
+                break
+            # Back-pressure: the unit is full, so the pool holds off on it and the request is queued again
+            self.refusals += 1
+            self.engine.requeued(self, reply)
+            self._reply = asyncio.get_running_loop().create_future()
+
+        if reply is None:
+            self.timed_out = True
+            self.engine.abandon(self, "timeout")
+            console.info("%s No rescue confirmation received (timeout)", self.tag)
+            log.warning("Incident %s: no rescue confirmation received (timeout)", self.id)
+            return RECOVERY
+
+        self.confirmed_at = CLOCK.monotonic()
+        if reply.get_metadata("performative") == "refuse":
+            # Every try found a saturated queue; the deployment never started
+            self.rejected = True
+            console.info("%s Rescue request refused by %s (queue full)", self.tag, reply.sender)
+            log.warning("Incident %s: request refused by %s: %s", self.id, reply.sender, reply.metadata)
+            self.record(reply)
+            return RECOVERY
+        try:
+            if reply.get_metadata("performative") != "inform":
+                raise ValueError(f"unexpected {reply.get_metadata('performative')} reply")
+            self.result = read_body(reply, default_schema="result", typed=True)
+            console.info("%s Rescue completed: %s", self.tag, self.result)
+            log.info("Incident %s rescue completed successfully: %s", self.id, self.result)
+        except Exception as e:
+            self.invalid = True
+            console.error("%s Error parsing confirmation: %s", self.tag, e)
+            log.error("Incident %s: error parsing rescue confirmation: %s; raw: %s", self.id, e, reply.body)
+        self.record(reply)
+        return RECOVERY
+
+    async def assign(self, request):
+        """
+        The unit for the request: the one the batch optimizer chose, or the
+        one expected to finish it first. While every unit is full the
+        request waits here for room.
+        """
+        engine = self.engine
+        while True:
+            if engine.pool.has_room():
+                if engine.allocator is not None:
+                    assignment = await self.wait(engine.allocator.assign(request))
+                else:
+                    assignment = engine.pool.assign(task_time_for(request))
+                if assignment is not None:
+                    return assignment
+            await self.wait(engine.pool.wait_for_room())
+
+    async def dispatch(self, assignment, request):
+        """Send the deploy request for `assignment` on this incident's thread."""
+        target = assignment.jid
+        msg = Message(to=target, thread=self.id)
+        msg.set_metadata("performative", "request")
+        set_body(msg, "deploy", request, self.engine.encoding)
+
+        sent = CLOCK.monotonic()
+        self.dispatches[target] = (assignment, sent)  # before send: a bus reply can beat the await
+        if self.dispatched_at is None:
+            self.dispatched_at = sent
+        await self.engine.send(msg)
+        store = self.engine.store
+        if store is not None:
+            now = CLOCK.time()
+            store.dispatched(self.id, target, now, now + assignment.expected_done - sent)
+        console.info("%s Rescue request sent to %s (expected in %.0fs): %s",
+                     self.tag, target, assignment.expected_done - sent, request)
+        log.info("Incident %s sent rescue request to %s: %s", self.id, target, request)
+
+    async def await_reply(self, request):
+        """
+        The first reply to this incident's dispatches, or None at the
+        deadline: engine.confirm_timeout, or with engine.deadlines one
+        scaled to the expected completion time. When that estimator hedges
+        and the unit runs late, the request also goes to the unit that can
+        finish it first among the others, and the wait extends to the
+        second dispatch's own deadline.
+        """
+        engine, deadlines = self.engine, self.engine.deadlines
+        assignment, sent = self.dispatches[self.assignment.jid]
+        if deadlines is None:
+            return await self._reply_until(sent + engine.confirm_timeout)
+        expected = expected_time(assignment, sent)
+        give_up = sent + deadlines.deadline(expected)
+        if deadlines.hedging and len(engine.pool.jids) > 1:
+            reply = await self._reply_until(sent + deadlines.hedge_after(expected))
+            if reply is not None:
+                return reply
+            self.hedge = engine.pool.assign(self.assignment.task_time, exclude={self.assignment.jid})
+            if self.hedge is not None:  # None: the other units are full
+                engine.hedged(self)
+                await self.dispatch(self.hedge, request)
+                now = CLOCK.monotonic()
+                give_up = max(give_up, now + deadlines.deadline(expected_time(self.hedge, now)))
+        return await self._reply_until(give_up)
+
+    async def _reply_until(self, deadline):
+        try:
+            # shield: a timeout must not cancel the future deliver() resolves
+            return await self.wait(CLOCK.wait_for(asyncio.shield(self._reply),
+                                                  max(0.0, deadline - CLOCK.monotonic())))
+        except asyncio.TimeoutError:
+            return None
+
+    async def wait(self, awaitable):
+        """Await something the incident is idle on (a delay, the allocator, a reply), timed as a wait."""
+        start = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            waited = time.perf_counter() - start
+            self._waited += waited
+            self.engine.waited(self.state, waited)
+
+    def record(self, reply):
+        if self.engine.store is not None:
+            self.engine.store.confirmed(self.id, reply.sender.bare, CLOCK.time(), reply.get_metadata("performative"),
+                                        self.result.to_dict() if self.result is not None else None)
+
+    @property
+    def outcome(self):
+        if self.timed_out:
+            return "timeout"
+        if self.rejected:
+            return "refused"
+        if self.invalid:
+            return "invalid"
+        return "confirmed" if self.confirmed_at is not None else None
+
+    async def recover(self):
+        console.info("%s State: RECOVERY", self.tag)
+        log.info("Incident %s recovery phase with rescue result: %s", self.id, self.result)
+        await self.wait(CLOCK.sleep(self.engine.recovery_delay))
+        log.info("Incident %s closed", self.id)
+        return CLOSED
+
+    def deliver(self, msg):
+        performative = msg.get_metadata("performative")
+        if performative not in REPLIES:
+            self.engine.ignored_reply(self.id, msg)
+            return True
+        self.engine.note_load(msg)
+        if performative == "agree":
+            # Accepted (running or queued); keep waiting for the confirmation
+            self.acknowledged = dict(msg.metadata)
+            return True
+        dispatch = self.dispatches.pop(msg.sender.bare, None)
+        if dispatch is not None:
+            self.engine.finished(*dispatch, performative)
+        if self._reply.done():
+            if dispatch is None:
+                return False
+            self.engine.late_reply(self.id, msg)  # the other unit of a hedged request answered first
+            return True
+        if performative == "refuse" and self.dispatches:
+            return True  # a hedge is still out; wait for it
+        self._reply.set_result(msg)
+        return True
+
+
+class IncidentEngine:
+    """
+    Opens an Incident per emergency and runs them concurrently.
+
+    send: coroutine used to send messages (a behaviour's send)
+    pool: lab3.scheduler.RescuePool that picks the unit for each deployment
+    allocator: optional lab3.assignment.BatchAllocator; when set, deployments
+        requested close together are assigned jointly instead of one by one
+    max_concurrent: cap on incidents running at once (None = unbounded)
+    router: optional lab3.router.MessageRouter; each open incident registers
+        its thread there so confirmations reach it directly
+    series: optional lab3.timeseries.SensorSeries with each sensor's rolling
+        history, logged alongside the reading that opened the incident
+    store: optional common.store.Store; every incident, dispatch and reply
+        is written to it
+    deadlines: optional lab3.deadlines.DeadlineEstimator; when set, each
+        dispatch waits for a deadline scaled to its expected completion
+        time (and may be hedged) instead of the fixed confirm_timeout
+    metrics: optional common.metrics.AgentMetrics of the coordinator; each
+        incident state's run time and waits go to its fsm_state_seconds and
+        fsm_receive_wait_seconds, like the FSM's own states
+    max_refusals: refusals an incident takes before it is closed as
+        refused; each refusal marks the unit full in the pool and queues
+        the request again
+
+    Monitoring only calls open(), which returns immediately, so sensor
+    readings keep flowing while incidents wait on rescue units.
+    """
+
+    def __init__(self, send, pool, encoding="json", alert_delay=1, recovery_delay=2,
+                 confirm_timeout=15, max_concurrent=None, history=1000, router=None, allocator=None, series=None,
+                 store=None, deadlines=None, metrics=None, max_refusals=3):
+        self.send = send
+        self.router = router
+        self.allocator = allocator
+        self.series = series
+        self.store = store
+        self.pool = pool
+        self.encoding = encoding
+        self.alert_delay = alert_delay
+        self.recovery_delay = recovery_delay
+        self.confirm_timeout = confirm_timeout
+        self.deadlines = deadlines
+        self.metrics = metrics
+        self.max_refusals = max_refusals
+        self._slots = asyncio.Semaphore(max_concurrent) if max_concurrent else None
+        self.open_incidents = {}    # incident id -> Incident
+        self._by_key = {}           # sensor key -> open Incident
+        self.closed = deque(maxlen=history)
+        self.tasks = set()
+        self.opened_count = 0
+        self.closed_count = 0
+        self.timeout_count = 0
+        self.rejected_count = 0
+        self.requeued_count = 0
+        self.invalid_count = 0
+        self.unmatched_replies = 0
+        self.ignored_replies = 0
+        self.hedged_count = 0
+        self.late_replies = 0
+        self.unit_loads = {}        # rescue bare JID -> last capacity report
+        self._round_trips = {}      # (unit, outcome) -> rescue_round_trip_seconds histogram
+        self._abandoned = OrderedDict()  # incident id -> {unit: (Assignment, sent at)} given up on
+        self._history = history
+        self._hedged_total = METRICS.counter("rescue_hedged_total", "Rescue requests also sent to a second unit")
+        self._late_total = METRICS.counter("rescue_late_replies_total",
+                                           "Rescue replies that came after the incident was answered or given up")
+
+    def open(self, reading, key):
+        """Open an incident for an emergency reading, or return the one already open for key."""
+        incident = self._by_key.get(key)
+        if incident is not None:
+            incident.reading = reading  # keep the freshest data for the deployment
+            return incident
+        incident = Incident(self, key, reading)
+        self.open_incidents[incident.id] = incident
+        self._by_key[key] = incident
+        self.opened_count += 1
+        if self.store is not None:
+            self.store.incident_opened(incident.id, key, CLOCK.time())
+        if self.router is not None:
+            self.router.add_thread(incident.id, incident.deliver)
+        task = asyncio.create_task(self._run(incident))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        console.info("[Coordinator] Opened incident %s for %s (%d open)", incident.id[:8], key, len(self.open_incidents))
+        return incident
+
+    async def _run(self, incident):
+        try:
+            if self._slots is None:
+                await incident.run()
+            else:
+                async with self._slots:
+                    await incident.run()
+            if self.store is not None:
+                self.store.incident_closed(incident.id, CLOCK.time(), incident.outcome)
+        except Exception as e:
+            log.error("Incident %s failed: %s", incident.id, e)
+            if self.store is not None:
+                self.store.incident_closed(incident.id, CLOCK.time(), "failed")
+        finally:
+            self.abandon(incident)  # a hedge still out when the other unit answered
+            self.closed_count += 1
+            self.timeout_count += incident.timed_out
+            self.rejected_count += incident.rejected
+            self.invalid_count += incident.invalid
+            self.open_incidents.pop(incident.id, None)
+            if self.router is not None:
+                self.router.remove_thread(incident.id)
+            if self._by_key.get(incident.key) is incident:
+                del self._by_key[incident.key]
+            self.closed.append(incident)
+
+    def timed(self, state, seconds):
+        """Run time of one incident state, excluding its waits."""
+        if self.metrics is not None:
+            self.metrics.state(STATE_NAMES[state])[0].observe(seconds)
+
+    def waited(self, state, seconds):
+        if self.metrics is not None:
+            self.metrics.state(STATE_NAMES[state])[1].observe(seconds)
+
+    def round_trip(self, unit, outcome):
+        """Histogram of request-to-reply times (simulated seconds) for unit and outcome."""
+        histogram = self._round_trips.get((unit, outcome))
+        if histogram is None:
+            histogram = self._round_trips[unit, outcome] = METRICS.histogram(
+                "rescue_round_trip_seconds", "Rescue request sent to reply received (simulated seconds)",
+                unit=unit, outcome=outcome)
+        return histogram
+
+    def finished(self, assignment, sent, performative):
+        """A unit replied to a dispatch: free its slot, time the round trip and learn the deadline from it."""
+        now = CLOCK.monotonic()
+        self.pool.complete(assignment)
+        refused = performative == "refuse"
+        self.round_trip(assignment.jid, "refused" if refused else "confirmed").observe(now - sent)
+        if self.deadlines is not None and not refused:
+            self.deadlines.observe(now - sent, expected_time(assignment, sent))
+
+    def abandon(self, incident, outcome=None):
+        """
+        Give up on an incident's outstanding dispatches (timed out, or the
+        other unit of a hedge answered). Their slots are freed now; a reply
+        that still comes is a late reply, and a late confirmation still
+        teaches the deadline estimator how long that dispatch really took.
+        """
+        if not incident.dispatches:
+            return
+        now = CLOCK.monotonic()
+        for unit, (assignment, sent) in incident.dispatches.items():
+            self.pool.complete(assignment)
+            if outcome is not None:
+                self.round_trip(unit, outcome).observe(now - sent)
+        self._abandoned[incident.id] = incident.dispatches
+        if len(self._abandoned) > self._history:
+            self._abandoned.popitem(last=False)
+        incident.dispatches = {}
+
+    def hedged(self, incident):
+        self.hedged_count += 1
+        self._hedged_total.inc()
+        console.info("%s %s is late, request also sent to %s", incident.tag, incident.assignment.jid,
+                     incident.hedge.jid)
+        log.info("Incident %s: %s is late, hedging with %s", incident.id, incident.assignment.jid, incident.hedge.jid)
+
+    def requeued(self, incident, msg):
+        self.requeued_count += 1
+        self.pool.refused(msg.sender.bare)
+        console.info("%s Rescue request refused by %s (queue full), queued again", incident.tag, msg.sender)
+        log.info("Incident %s: request refused by %s, queued again: %s", incident.id, msg.sender, msg.metadata)
+
+    def late_reply(self, incident_id, msg):
+        self.late_replies += 1
+        self._late_total.inc()
+        log.info("Incident %s: late %s from %s dropped", incident_id, msg.get_metadata("performative"), msg.sender)
+
+    def ignored_reply(self, incident_id, msg):
+        """A message on an incident's thread that is no answer to a deploy request (e.g. a "failure")."""
+        self.ignored_replies += 1
+        log.warning("Incident %s: ignored %s from %s", incident_id, msg.get_metadata("performative"), msg.sender)
+
+    def note_load(self, msg):
+        """Remember the capacity a rescue unit reported on its latest reply; the pool keeps within it."""
+        if msg.get_metadata("capacity") is not None:
+            load = self.unit_loads[msg.sender.bare] = {
+                key: int(msg.get_metadata(key)) for key in ("capacity", "active", "queue_depth", "queue_limit")
+            }
+            self.pool.set_limit(msg.sender.bare, load["capacity"] + load["queue_limit"])
+
+    def deliver(self, msg):
+        """Hand a rescue reply to the incident named by its thread."""
+        late = self._abandoned.get(msg.thread)
+        if late is not None and msg.sender.bare in late:
+            # A dispatch given up on, maybe while its incident is still recovering
+            performative = msg.get_metadata("performative")
+            if performative not in REPLIES:
+                self.ignored_reply(msg.thread, msg)
+                return True
+            self.note_load(msg)
+            if performative != "agree":
+                assignment, sent = late.pop(msg.sender.bare)
+                if self.deadlines is not None and performative == "inform":
+                    self.deadlines.observe(CLOCK.monotonic() - sent, expected_time(assignment, sent))
+                self.late_reply(msg.thread, msg)
+            return True
+        incident = self.open_incidents.get(msg.thread)
+        if incident is None:
+            self.note_load(msg)
+        if incident is None or not incident.deliver(msg):
+            self.unmatched_replies += 1
+            log.warning("Confirmation for unknown or finished incident %s from %s", msg.thread, msg.sender)
+            return False
+        return True
+
+    def stats(self):
+        return {
+            "open": len(self.open_incidents),
+            "opened": self.opened_count,
+            "closed": self.closed_count,
+            "timed_out": self.timeout_count,
+            "rejected": self.rejected_count,
+            "requeued": self.requeued_count,
+            "invalid": self.invalid_count,
+            "unmatched_replies": self.unmatched_replies,
+            "ignored_replies": self.ignored_replies,
+            "hedged": self.hedged_count,
+            "late_replies": self.late_replies,
+        }
+
+    async def stop(self):
+        for task in list(self.tasks):
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
@@ -0,0 +1,167 @@
+import asyncio
+import logging
+from collections import deque
+
+from common.clock import CLOCK
+from common.codec import read_readings
+from common.metrics import METRICS
+
+log = logging.getLogger("coordinator.intake")
+
+EMERGENCY, SEVERE, ROUTINE = 0, 1, 2
+CLASSES = ("emergency", "severe", "routine")
+
+
+class PriorityIntake:
+    """
+    Bounded, prioritized intake for sensor readings, in front of the
+    coordinator's monitoring state.
+
+    put(msg) is the router handler for sensor messages: it decodes and
+    validates the body (malformed readings are dropped and counted) and
+    files every reading by urgency, so an erupting reading in a
+    gateway batch does not wait behind the thousands of routine ones that
+    arrived before it:
+
+        emergency  emergency flag set            never dropped
+        severe     status active or erupting     oldest dropped past severe_limit
+        routine    dormant                       coalesced, then shed
+
+    Routine readings are kept in arrival order until coalesce_at of them
+    are waiting. From then on a new routine reading for a sensor that
+    already has one waiting replaces it (only its latest state matters),
+    and past routine_limit the oldest routine readings are shed. Every
+    reading dropped either way is counted in stats() and
+    intake_shed_total.
+
+    Rescue confirmations never queue here: the router hands them straight
+    to the incident engine on dispatch.
+
+    get() returns up to `batch` (sensor key, reading) pairs, emergencies
+    first, then severe, then routine.
+    """
+
+    def __init__(self, coalesce_at=5000, routine_limit=50000, severe_limit=20000, batch=250, agent="coordinator"):
+        self.coalesce_at = coalesce_at
+        self.routine_limit = routine_limit
+        self.severe_limit = severe_limit
+        self.batch = batch
+        self.queues = (deque(), deque(), deque())  # per class: [key, reading] entries
+        self._latest = {}  # sensor key -> its waiting routine entry
+        self._ready = asyncio.Event()
+        self.received = [0, 0, 0]
+        self.coalesced = 0
+        self.shed = [0, 0, 0]
+        self.errors = 0
+        self.malformed = 0
+        self._shed_total = [METRICS.counter("intake_shed_total", "Readings the coordinator intake dropped",
+                                            agent=agent, priority=name) for name in CLASSES]
+        self._coalesced_total = METRICS.counter("intake_coalesced_total",
+                                                "Routine readings replaced by a newer one for the same sensor",
+                                                agent=agent)
+        for priority, name in enumerate(CLASSES):
+            METRICS.gauge("intake_depth", "Readings waiting in the coordinator intake",
+                          function=lambda queue=self.queues[priority]: len(queue), agent=agent, priority=name)
+
+    def __len__(self):
+        return sum(len(queue) for queue in self.queues)
+
+    @staticmethod
+    def classify(reading):
+        if reading.get("emergency"):
+            return EMERGENCY
+        if reading.get("status", "dormant") != "dormant":
+            return SEVERE
+        return ROUTINE
+
+    def put(self, msg):
+        """Router handler: decode a sensor message and file its readings."""
+        try:
+            readings, malformed = read_readings(msg, CLOCK.time())
+        except Exception as e:
+            self.errors += 1
+            log.error("Undecodable sensor message from %s: %s", msg.sender, e)
+            return
+        if malformed:
+            self.malformed += malformed
+            log.warning("Dropped %d malformed reading(s) from %s", malformed, msg.sender)
+        sender = msg.sender.bare
+        for reading in readings:
+            self.add(reading["sensor_id"] or sender, reading)
+
+    def add(self, key, reading):
+        priority = self.classify(reading)
+        self.received[priority] += 1
+        queue = self.queues[priority]
+        if priority == ROUTINE:
+            entry = self._latest.get(key)
+            if entry is not None and len(queue) >= self.coalesce_at:
+                entry[1] = reading
+                self.coalesced += 1
+                self._coalesced_total.inc()
+                return
+            entry = [key, reading]
+            queue.append(entry)
+            self._latest[key] = entry
+            if len(queue) > self.routine_limit:
+                self._drop(ROUTINE)
+        else:
+            queue.append([key, reading])
+            if priority == SEVERE and len(queue) > self.severe_limit:
+                self._drop(SEVERE)
+        self._ready.set()
+
+    def _drop(self, priority):
+        key, _ = entry = self.queues[priority].popleft()
+        if priority == ROUTINE and self._latest.get(key) is entry:
+            del self._latest[key]
+        self.shed[priority] += 1
+        self._shed_total[priority].inc()
+        if self.shed[priority] & (self.shed[priority] - 1) == 0:  # 1, 2, 4, 8, ... (warnings aren't rate-limited)
+            log.warning("Intake overloaded: shed %d %s reading(s) so far", self.shed[priority], CLASSES[priority])
+
+    def take(self, limit=None):
+        """
+        Up to `limit` (default: batch) waiting (key, reading) pairs, most
+        urgent first. A batch never holds two readings of one sensor (the
+        precursor detector updates its rows at once), so it ends early at
+        the second one.
+        """
+        limit = limit or self.batch
+        items, keys = [], set()
+        for priority, queue in enumerate(self.queues):
+            while queue and len(items) < limit:
+                entry = queue[0]
+                if entry[0] in keys:
+                    break
+                queue.popleft()
+                if priority == ROUTINE and self._latest.get(entry[0]) is entry:
+                    del self._latest[entry[0]]
+                keys.add(entry[0])
+                items.append((entry[0], entry[1]))
+            if queue:
+                break
+        if not len(self):
+            self._ready.clear()
+        return items
+
+    async def get(self, timeout=None):
+        """Wait up to `timeout` real seconds for readings; [] on timeout."""
+        if not len(self):
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+        else:
+            await asyncio.sleep(0)  # a backlog must not starve the rest of the loop (receive() always yields too)
+        return self.take()
+
+    def stats(self):
+        return {
+            "waiting": {name: len(queue) for name, queue in zip(CLASSES, self.queues)},
+            "received": dict(zip(CLASSES, self.received)),
+            "coalesced": self.coalesced,
+            "shed": dict(zip(CLASSES, self.shed)),
+            "errors": self.errors,
+            "malformed": self.malformed,
+        }
@@ -0,0 +1,138 @@
+import numpy as np
+
+from lab2.field import CHANNELS
+
+# Precursor fields watched per sensor, with a floor on their noise scale
+# (3% of the channel's range) so a flat baseline pinned at the bottom of
+# the range does not make every small wiggle look significant
+PRECURSORS = tuple(name for name, _, _ in CHANNELS)
+_SCALE_FLOOR = np.array([(high - low) * 0.03 for _, low, high in CHANNELS])
+
+
+class PrecursorDetector:
+    """
+    Streaming change-point and trend detection on the precursor channels
+    (CO2, SO2, vibration, temperature) of every sensor.
+
+    Per sensor and channel it keeps a slowly adapting baseline (EWMA mean
+    and variance, fed deviations clipped to `clip` standard deviations so a
+    build-up drags it along only slowly), a one-sided CUSUM of the
+    standardized reading (capped at twice the threshold so it drains soon
+    after an episode) and an EWMA of the reading-to-reading slope.
+
+    A channel is flagged when its CUSUM crosses `threshold` (a sustained
+    shift above the baseline) or when its slope would carry it
+    `trend_sigmas` standard deviations above the baseline within `horizon`
+    readings. A pre-alert is raised once, on the reading where
+    `min_channels` channels are flagged at the same time, and re-armed after
+    they all settle. Local noise rarely moves three channels together; a
+    volcano building up moves all four.
+
+    Rows are the lab3.timeseries.SensorSeries rows, so the detector needs no
+    lookup of its own. State is a handful of (sensors, 4) arrays: one reading
+    costs a fixed number of array operations, and a gateway batch (distinct
+    sensors) is updated with the same operations on all its rows at once.
+    """
+
+    def __init__(self, capacity=64, baseline_alpha=0.01, clip=3.0, slope_alpha=0.2, drift=1.0, threshold=16.0,
+                 horizon=12, trend_sigmas=4.0, min_channels=3, warmup=10):
+        self.baseline_alpha = baseline_alpha
+        self.clip = clip
+        self.slope_alpha = slope_alpha
+        self.drift = drift
+        self.threshold = threshold
+        self.horizon = horizon
+        self.trend_sigmas = trend_sigmas
+        self.min_channels = min_channels
+        self.warmup = warmup
+        self.raised = 0
+        self.capacity = 0
+        self._grow(capacity)
+
+    def _grow(self, capacity):
+        f = len(PRECURSORS)
+        arrays = {
+            "_mean": np.zeros((capacity, f)),
+            "_var": np.zeros((capacity, f)),
+            "_cusum": np.zeros((capacity, f)),
+            "_slope": np.zeros((capacity, f)),
+            "_prev": np.zeros((capacity, f)),
+            "_count": np.zeros(capacity, dtype=np.int64),
+            "_active": np.zeros(capacity, dtype=bool),    # pre-alert raised and not yet settled
+        }
+        for name, array in arrays.items():
+            if self.capacity:
+                array[:self.capacity] = getattr(self, name)
+            setattr(self, name, array)
+        self.capacity = capacity
+
+    def reset(self, rows):
+        """Forget rows, e.g. when the series reused them for new sensors."""
+        self._count[rows] = 0
+        self._cusum[rows] = self._slope[rows] = 0
+        self._active[rows] = False
+
+    def update(self, row, reading, new=False):
+        """
+        Feed one reading for the sensor in `row`. Returns the list of flagged
+        channel names when this reading raises a pre-alert, else None.
+        """
+        raised = self.update_many([row], [reading], [new])
+        return raised[0][1] if raised else None
+
+    def update_many(self, rows, readings, new=None):
+        """
+        Feed one reading each for distinct rows (e.g. a gateway batch).
+        Returns [(position in the batch, flagged channel names)] for the
+        readings that raised a pre-alert.
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        if len(rows) == 0:
+            return []
+        if rows.max() >= self.capacity:
+            self._grow(max(self.capacity * 2, int(rows.max()) + 1))
+        if new is not None and any(new):
+            self.reset(rows[np.asarray(new, dtype=bool)])
+        x = np.array([[r.get(name, 0.0) for name in PRECURSORS] for r in readings], dtype=float)
+
+        n = self._count[rows]
+        self._count[rows] = n + 1
+        first = n == 0
+        prev = np.where(first[:, None], x, self._prev[rows])
+        mean = np.where(first[:, None], x, self._mean[rows])
+        var = self._var[rows]
+
+        scale = np.maximum(np.sqrt(var), _SCALE_FLOOR)
+        z = (x - mean) / scale
+        slope = (1 - self.slope_alpha) * self._slope[rows] + self.slope_alpha * (x - prev)
+        cusum = np.clip(self._cusum[rows] + z - self.drift, 0.0, 2 * self.threshold)
+
+        # Plain running mean/variance during warm-up, then a slow EWMA of clipped deviations
+        warming = n < self.warmup
+        cusum[warming] = 0.0
+        a = np.where(warming, 1.0 / np.maximum(n, 1), self.baseline_alpha)[:, None]
+        delta = np.where(warming[:, None], x - mean, np.clip(x - mean, -self.clip * scale, self.clip * scale))
+        mean = mean + a * delta
+        var = np.where(first[:, None], 0.0, (1 - a) * (var + a * delta ** 2))
+
+        self._mean[rows], self._var[rows] = mean, var
+        self._slope[rows], self._cusum[rows], self._prev[rows] = slope, cusum, x
+
+        trending = (z + self.horizon * slope / scale > self.trend_sigmas) & (z > 1.0)
+        flagged = ((cusum > self.threshold) | trending) & ~warming[:, None]
+        active = self._active[rows]
+        settled = active & ~(cusum > self.threshold / 2).any(axis=1)
+        raise_now = ~active & (flagged.sum(axis=1) >= self.min_channels)
+        self._active[rows] = (active & ~settled) | raise_now
+
+        hits = np.flatnonzero(raise_now)
+        self.raised += len(hits)
+        return [(int(i), [name for name, hit in zip(PRECURSORS, flagged[i]) if hit]) for i in hits]
+
+    def active(self, rows):
+        """Whether each row's pre-alert is still up (raised and not yet settled)."""
+        return self._active[np.asarray(rows, dtype=np.int64)]
+
+    def score(self, row):
+        """Current CUSUM per precursor channel for one row."""
+        return dict(zip(PRECURSORS, self._cusum[row].round(2).tolist()))
@@ -1,133 +1,220 @@
 # lab3/rescue_agent.py
+import argparse
 import asyncio
-import json
-import logging
 from spade.agent import Agent
 from spade.behaviour import CyclicBehaviour
 from spade.message import Message
-from config import AGENTS
+from config import AGENTS, TRANSPORT, METRICS_PORT
+from common.bus import BusTransport
+from common.clock import CLOCK
+from common.codec import set_body, read_body, encoding_of
+from common.logs import console, setup_logging
+from common.metrics import METRICS, serve_metrics
+from common.schema import RescueResult
+from common.profiling import enable_profiling
+from lab3.heuristics import estimate_task_time
+
+# Simple logging setup for rescue agent (written by a background thread, see common/logs.py)
+log = setup_logging("rescue", "rescue_logs.log",
+                    "%(asctime)s | RESCUE | %(levelname)s | %(message)s", datefmt="%Y-%m-%d %H:%M:%S")
+
+class RescueAgent(BusTransport, Agent):
+    def __init__(self, jid, password, max_concurrent=4, queue_limit=16, transport=TRANSPORT,
+                 metrics_port=METRICS_PORT):
+        super().__init__(jid, password)
+        self.use_transport(transport)  # "xmpp" or the in-process "bus"
+        self.max_concurrent = max_concurrent  # Deployments running at once (K workers)
+        self.queue_limit = queue_limit  # Accepted requests waiting for a free worker
+        self.jobs = None  # asyncio.Queue of accepted deployments, created in setup
+        self.active = 0  # Deployments currently running
+        self.workers = []  # Worker tasks of ListenBehaviour, stopped in shutdown()
+        self.metrics_port = metrics_port  # Serve /metrics on this port (0 = off), see common/metrics.py
+        self.deployments = METRICS.histogram("rescue_deployment_seconds", "Simulated time of a deployment",
+                                             agent=str(self.jid.bare))
+
+    def load(self):
+        """Capacity report attached to every reply, so the sender can see how busy we are."""
+        return {
+            "capacity": str(self.max_concurrent),
+            "active": str(self.active),
+            "queue_depth": str(self.jobs.qsize()),
+            "queue_limit": str(self.queue_limit),
+        }
+
+    def make_reply(self, msg, performative):
+        reply = Message(
+            to=str(msg.sender),
+            sender=str(self.jid),
+            thread=msg.thread  # Correlates the reply with the originating request
+        )
+        reply.set_metadata("performative", performative)
+        for key, value in self.load().items():
+            reply.set_metadata(key, value)
+        return reply
 
-# Simple logging setup for rescue agent
-logging.basicConfig(
-    filename="rescue_logs.log",
-    level=logging.INFO,
-    format="%(asctime)s | RESCUE | %(levelname)s | %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S"
-)
-
-class RescueAgent(Agent):
     class ListenBehaviour(CyclicBehaviour):
+        """
+        Accepts deployment requests into the bounded queue, or refuses them
+        when it is full. K worker tasks run the queued deployments
+        concurrently; their handles are kept on the agent, whose shutdown()
+        cancels and awaits them.
+        """
+
+        async def on_start(self):
+            self.agent.workers = [asyncio.create_task(self.worker()) for _ in range(self.agent.max_concurrent)]
+
+        async def on_end(self):
+            await self.agent.stop_workers()
+
+        async def worker(self):
+            while True:
+                msg, request = await self.agent.jobs.get()
+                self.agent.active += 1
+                try:
+                    await self.deploy(msg, request)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    log.error("Deployment for %s failed: %s", msg.sender, e)
+                finally:
+                    self.agent.active -= 1
+
         async def run(self):
-            msg = await self.receive(timeout=5)  # Shorter timeout for debugging
+            msg = await self.receive(timeout=CLOCK.real(5))  # Shorter timeout for debugging
             if not msg:
                 return  # no message this cycle
 
-            print(f"\n*** RESCUE: MESSAGE RECEIVED ***")
-            print(f"From: {msg.sender}")
-            print(f"To: {msg.to}")
-            print(f"Body: {msg.body}")
-            print(f"Metadata: {msg.metadata}")
-            print(f"**********************************\n")
-            
-            logging.info(f"Received raw message from {msg.sender}: {msg.body}")
-            print(f"[{self.agent.jid}] Message received from {msg.sender}")
+            console.info("\n*** RESCUE: MESSAGE RECEIVED ***\nFrom: %s\nTo: %s\nBody: %s\nMetadata: %s\n"
+                         "**********************************\n", msg.sender, msg.to, msg.body, msg.metadata)
+
+            log.info("Received raw message from %s: %s", msg.sender, msg.body)
+            console.info("[%s] Message received from %s", self.agent.jid, msg.sender)
 
             try:
-                payload = json.loads(msg.body)
-                print(f"[{self.agent.jid}] Successfully parsed payload: {payload}")
+                # Validated once here; deploy() uses the fields as they are
+                request = read_body(msg, default_schema="deploy", typed=True)
+                console.info("[%s] Successfully parsed request: %s", self.agent.jid, request)
             except Exception as e:
-                print(f"[{self.agent.jid}] Failed to parse message body: {e}")
-                logging.error(f"Failed to parse message body: {e}")
+                console.error("[%s] Failed to parse message body: %s", self.agent.jid, e)
+                log.error("Failed to parse message body: %s", e)
                 return
 
-            # Expected keys: action (e.g. "deploy"), emergency (bool), area_affected_km2 (float),
-            # population_risk (0-10), lava_flow_m3_s (float)
-            action = payload.get("action", "respond")
-            emergency = bool(payload.get("emergency", False))
-            area = float(payload.get("area_affected_km2", 0.0))
-            pop_risk = float(payload.get("population_risk", 0.0))
-            lava = float(payload.get("lava_flow_m3_s", 0.0))
-
-            print(f"[{self.agent.jid}] Parsed values: action={action}, emergency={emergency}, area={area}, pop_risk={pop_risk}, lava={lava}")
-            logging.info(f"Parsed payload: action={action}, emergency={emergency}, area={area}, pop_risk={pop_risk}, lava={lava}")
-
-            # Decide response intensity (simple heuristic)
-            base_time = 2
-            time_from_area = int(area / 5)
-            time_from_pop = int(pop_risk / 2)
-            time_from_lava = int(min(lava / 100, 10))
-
-            task_time = max(base_time, base_time + time_from_area + time_from_pop + time_from_lava)
+            if self.agent.jobs.full():
+                # Saturated: refuse now instead of letting the request rot in the mailbox
+                reply = self.agent.make_reply(msg, "refuse")
+                set_body(reply, "result", RescueResult("rejected", str(self.agent.jid)), encoding_of(msg))
+                await self.send(reply)
+                console.info("[%s] Queue full, refused request from %s", self.agent.jid, msg.sender)
+                log.warning("Queue full (%d), refused request from %s", self.agent.jobs.qsize(), msg.sender)
+                return
 
-            print(f"[{self.agent.jid}] Computed task time: {task_time}s")
-            logging.info(f"Computed task_time={task_time}s for payload; starting task...")
-            print(f"[{self.agent.jid}] Deploying response (simulated {task_time}s)...")
+            queued = self.agent.active + self.agent.jobs.qsize() >= self.agent.max_concurrent
+            self.agent.jobs.put_nowait((msg, request))
+            ack = self.agent.make_reply(msg, "agree")
+            ack.set_metadata("status", "queued" if queued else "running")
+            await self.send(ack)
+            log.info("Accepted request from %s (%s), active=%d queue_depth=%d", msg.sender,
+                     "queued" if queued else "running", self.agent.active, self.agent.jobs.qsize())
+
+        async def deploy(self, msg, request):
+            # request: common.schema.DeployRequest (action, emergency, area_affected_km2,
+            # population_risk 0-10, lava_flow_m3_s)
+            action = request.action
+            emergency = request.emergency
+            area = request.area_affected_km2
+            pop_risk = request.population_risk
+            lava = request.lava_flow_m3_s
+
+            console.info("[%s] Parsed values: action=%s, emergency=%s, area=%s, pop_risk=%s, lava=%s",
+                         self.agent.jid, action, emergency, area, pop_risk, lava)
+            log.info("Parsed payload: action=%s, emergency=%s, area=%s, pop_risk=%s, lava=%s",
+                     action, emergency, area, pop_risk, lava)
+
+            # Decide response intensity (simple heuristic, shared with the coordinator)
+            task_time = estimate_task_time(area, pop_risk, lava)
+
+            console.info("[%s] Computed task time: %ss", self.agent.jid, task_time)
+            log.info("Computed task_time=%ss for request; starting task...", task_time)
+            console.info("[%s] Deploying response (simulated %ss, %d active)...", self.agent.jid, task_time,
+                         self.agent.active)
 
             # Simulate doing the rescue work
+            started = CLOCK.monotonic()
             try:
-                await asyncio.sleep(task_time)
+                await CLOCK.sleep(task_time)
             except asyncio.CancelledError:
-                logging.warning("Rescue task cancelled")
-                return
+                log.warning("Rescue task cancelled")
+                raise
+
+            self.agent.deployments.observe(CLOCK.monotonic() - started)
 
             # Compose result
-            result = {
-                "result": "completed",
-                "agent": str(self.agent.jid),
-                "task_time_s": task_time,
-                "handled_area_km2": area,
-                "population_risk": pop_risk,
-                "lava_flow_m3_s": lava
-            }
-
-            logging.info(f"Task complete: {result}")
-            print(f"[{self.agent.jid}] Task complete, sending confirmation to {msg.sender}")
-
-            # Reply to sender (coordinator)
-            reply = Message(
-                to=str(msg.sender),
-                sender=str(self.agent.jid),
-                body=json.dumps(result)
-            )
-            reply.set_metadata("performative", "inform")
+            result = RescueResult("completed", str(self.agent.jid), task_time, area, pop_risk, lava)
+
+            log.info("Task complete: %s", result)
+            console.info("[%s] Task complete, sending confirmation to %s", self.agent.jid, msg.sender)
+
+            # Reply to sender (coordinator) in whatever encoding the request used
+            reply = self.agent.make_reply(msg, "inform")
+            set_body(reply, "result", result, encoding_of(msg))
             
-            print(f"[{self.agent.jid}] Sending confirmation: {reply.body}")
+            console.info("[%s] Sending confirmation: %s", self.agent.jid, reply.body)
             await self.send(reply)
-            print(f"[{self.agent.jid}] Confirmation sent")
-            logging.info(f"Sent completion inform to {msg.sender}")
+            console.info("[%s] Confirmation sent", self.agent.jid)
+            log.info("Sent completion inform to %s", msg.sender)
 
     async def setup(self):
-        print(f"[{self.jid}] RescueAgent starting...")
-        print(f"[{self.jid}] Connected: {self.is_alive()}")
-        print(f"[{self.jid}] Waiting for messages...")
-        logging.info("RescueAgent starting")
+        console.info("[%s] RescueAgent starting...", self.jid)
+        console.info("[%s] Connected: %s", self.jid, self.is_alive())
+        console.info("[%s] Waiting for messages...", self.jid)
+        log.info("RescueAgent starting with %d workers, queue limit %d", self.max_concurrent, self.queue_limit)
+        self.jobs = asyncio.Queue(maxsize=self.queue_limit)
         self.add_behaviour(self.ListenBehaviour())
+        serve_metrics(self, self.metrics_port)
+        enable_profiling(self)  # Loop lag monitor and on-demand profiles, see common/profiling.py
+
+    async def stop_workers(self):
+        """Cancel the deployment workers and wait until they are gone, so none replies after shutdown."""
+        workers, self.workers = self.workers, []
+        for worker in workers:
+            worker.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
 
     async def shutdown(self):
-        logging.info("RescueAgent shutting down")
+        log.info("RescueAgent shutting down (%d active, %d queued)", self.active,
+                 self.jobs.qsize() if self.jobs is not None else 0)
+        await self.stop_workers()
         await self.stop()
 
-async def main():
-    jid = AGENTS["rescue"]["jid"]
+async def main(max_concurrent=4, queue_limit=16, jid=None):
+    # Pool members (config.RESCUE_POOL) share the rescue password
+    jid = jid or AGENTS["rescue"]["jid"]
     pwd = AGENTS["rescue"]["password"]
-    print(f"Starting rescue agent with JID: {jid}")
-    agent = RescueAgent(jid, pwd)
+    console.info("Starting rescue agent with JID: %s", jid)
+    agent = RescueAgent(jid, pwd, max_concurrent=max_concurrent, queue_limit=queue_limit)
     
     try:
         await agent.start(auto_register=True)
-        print(f"Rescue agent {jid} started. Connected: {agent.is_alive()}")
-        print("Waiting for tasks...")
+        console.info("Rescue agent %s started. Connected: %s", jid, agent.is_alive())
+        console.info("Waiting for tasks...")
 
         # keep alive until interrupted
         while agent.is_alive():
             await asyncio.sleep(1)
     except Exception as e:
-        print(f"Error starting rescue agent: {e}")
+        console.error("Error starting rescue agent: %s", e)
+        log.exception("Error starting rescue agent")
     finally:
         await agent.shutdown()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rescue agent")
+    parser.add_argument("--max-concurrent", type=int, default=4, help="deployments run at once")
+    parser.add_argument("--queue-limit", type=int, default=16, help="accepted requests waiting for a worker")
+    parser.add_argument("--jid", help="run as another unit of the rescue pool")
+    args = parser.parse_args()
+
     try:
-        asyncio.run(main())
+        asyncio.run(main(args.max_concurrent, args.queue_limit, args.jid))
     except KeyboardInterrupt:
-        print("Rescue agent stopped by user")
\ No newline at end of file
+        console.info("Rescue agent stopped by user")
\ No newline at end of file
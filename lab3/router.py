@@ -0,0 +1,102 @@
+import logging
+from collections import Counter
+
+from slixmpp import JID
+from spade.behaviour import CyclicBehaviour
+from spade.message import Message
+
+# Part of the coordinator: its records go to the coordinator's log file
+log = logging.getLogger("coordinator.router")
+
+
+class MessageRouter:
+    """
+    O(1) message dispatch for an agent, replacing SPADE's per-behaviour
+    template scan.
+
+    Lookup order for every incoming message:
+        1. thread id            (add_thread, e.g. an open incident)
+        2. performative + role  (add_route with sender=...)
+        3. performative only    (add_route without sender)
+
+    Roles are the keys of config.AGENTS; their bare JIDs are resolved once
+    here, so routing a message is a couple of dict lookups. Handlers are
+    either behaviours (the message is put on their mailbox) or plain
+    callables. Taps get a copy of every message and never take it away
+    from the handler.
+    """
+
+    def __init__(self, agents=None):
+        self.roles = {
+            JID(info["jid"]).bare: role
+            for role, info in (agents or {}).items()
+            if info.get("jid")
+        }
+        self._threads = {}
+        self._routes = {}
+        self.taps = []
+        self.counts = Counter()
+
+    def add_role(self, jid, role):
+        """Give another JID (e.g. an extra rescue unit) a role used for routing."""
+        self.roles[JID(jid).bare] = role
+
+    def add_route(self, performative, handler, sender=None):
+        """Route messages with this performative (and sender role, if given) to handler."""
+        self._routes[(performative, sender)] = handler
+
+    def add_thread(self, thread, handler):
+        self._threads[thread] = handler
+
+    def remove_thread(self, thread):
+        self._threads.pop(thread, None)
+
+    def add_tap(self, observer):
+        self.taps.append(observer)
+
+    def route(self, msg):
+        """Deliver msg to its handler. Returns True when a handler was found."""
+        for tap in self.taps:
+            self._deliver(tap, copy_message(msg))
+
+        handler = self._threads.get(msg.thread) if msg.thread else None
+        if handler is not None:
+            self.counts["thread"] += 1
+        else:
+            performative = msg.get_metadata("performative")
+            handler = self._routes.get((performative, self.roles.get(msg.sender.bare)))
+            if handler is None:
+                handler = self._routes.get((performative, None))
+            if handler is None:
+                self.counts["misrouted"] += 1
+                log.warning("No route for %s message from %s (thread %s)", performative, msg.sender, msg.thread)
+                return False
+            self.counts["routed"] += 1
+
+        self._deliver(handler, msg)
+        return True
+
+    @staticmethod
+    def _deliver(handler, msg):
+        if isinstance(handler, CyclicBehaviour):
+            handler.queue.put_nowait(msg)
+        else:
+            handler(msg)
+
+    def stats(self):
+        return {
+            "routed": self.counts["routed"],
+            "thread": self.counts["thread"],
+            "misrouted": self.counts["misrouted"],
+            "threads_open": len(self._threads),
+        }
+
+
+def copy_message(msg):
+    return Message(
+        to=str(msg.to),
+        sender=str(msg.sender),
+        body=msg.body,
+        thread=msg.thread,
+        metadata=dict(msg.metadata),
+    )
@@ -0,0 +1,148 @@
+import asyncio
+import heapq
+
+from common.clock import CLOCK
+
+
+class Assignment:
+    """A deployment placed on one worker slot of one rescue unit."""
+
+    __slots__ = ("jid", "slot", "task_time", "expected_done")
+
+    def __init__(self, jid, slot, task_time, expected_done):
+        self.jid = jid
+        self.slot = slot
+        self.task_time = task_time
+        self.expected_done = expected_done
+
+
+class RescuePool:
+    """
+    Load-aware dispatch across a pool of rescue units.
+
+    Every unit runs `workers` deployments at once (RescueAgent's
+    max_concurrent), so the pool keeps one heap entry per worker slot keyed
+    by the time that slot is expected to be free. assign() pops the earliest
+    slot, places the task_time there and pushes the slot back with its new
+    free time: the deployment lands on the unit that will finish it first.
+
+    Heap entries are never updated in place. When a slot's prediction changes
+    (a deployment finished early) a fresh entry is pushed and the old one is
+    skipped on pop because it no longer matches the slot's free time.
+
+    Units also take only so much: `capacity` running plus `queue_limit`
+    waiting, as they report on every reply (set_limit()). A unit with that
+    many deployments outstanding from this pool is full and gets nothing
+    more. A refusal (refused()) lowers its limit to what it holds now, since
+    other senders share the unit, until its next report. When every unit is
+    full, assign() returns None and wait_for_room() waits for a completion.
+    """
+
+    def __init__(self, jids, workers=4, clock=CLOCK.monotonic):
+        if not jids:
+            raise ValueError("RescuePool needs at least one rescue unit")
+        self.jids = list(jids)
+        self.workers = workers
+        self.clock = clock
+        self._free_at = {}       # (jid, slot) -> predicted free time
+        self._pending = {}       # (jid, slot) -> deployments placed and not finished
+        self._heap = []
+        now = clock()
+        for jid in self.jids:
+            for slot in range(workers):
+                self._free_at[(jid, slot)] = now
+                self._pending[(jid, slot)] = 0
+                self._heap.append((now, jid, slot))
+        heapq.heapify(self._heap)
+        self.outstanding = {jid: 0 for jid in self.jids}
+        self.dispatched = {jid: 0 for jid in self.jids}
+        self.limits = {jid: None for jid in self.jids}  # outstanding a unit takes; None = not reported yet
+        self._room = asyncio.Event()  # set whenever a unit may have room again
+
+    def assign(self, task_time, now=None, exclude=()):
+        """
+        Place a deployment of task_time seconds on the slot that finishes it
+        first, skipping the units in `exclude` (a hedged request goes to a
+        unit other than the late one) and full ones. Returns None when no
+        unit is left.
+        """
+        now = self.clock() if now is None else now
+        skipped = []
+        found = None
+        while self._heap:
+            free_at, jid, slot = heapq.heappop(self._heap)
+            if self._free_at[(jid, slot)] != free_at:
+                continue  # skip stale entries
+            skipped.append((free_at, jid, slot))
+            if jid not in exclude and not self.full(jid):
+                found = (jid, slot)
+                break
+        for entry in skipped:
+            heapq.heappush(self._heap, entry)
+        return self.place(found, task_time, now) if found else None
+
+    def full(self, jid):
+        limit = self.limits[jid]
+        return limit is not None and self.outstanding[jid] >= limit
+
+    def has_room(self, exclude=()):
+        return any(jid not in exclude and not self.full(jid) for jid in self.jids)
+
+    async def wait_for_room(self):
+        """Wait until a deployment completes or a unit's limit goes up."""
+        self._room.clear()
+        await self._room.wait()
+
+    def set_limit(self, jid, limit):
+        """A unit's reported capacity plus queue limit."""
+        if jid in self.limits:
+            raised = self.limits[jid] is None or limit > self.limits[jid]
+            self.limits[jid] = limit
+            if raised:
+                self._room.set()
+
+    def refused(self, jid):
+        """Back-pressure: the unit turned a request down, so it is full at what it holds from us now."""
+        if jid in self.limits:
+            self.limits[jid] = self.outstanding[jid]
+
+    def slots(self):
+        """The worker slots of units that aren't full and their predicted free times, for batch assignment."""
+        keys = [key for key in self._free_at if not self.full(key[0])]
+        return keys, [self._free_at[key] for key in keys]
+
+    def place(self, key, task_time, now=None):
+        """Put a deployment on a specific (jid, slot), e.g. one chosen by lab3.assignment."""
+        now = self.clock() if now is None else now
+        jid, slot = key
+        done = max(now, self._free_at[key]) + task_time
+        self._free_at[key] = done
+        self._pending[key] += 1
+        heapq.heappush(self._heap, (done, jid, slot))
+        self.outstanding[jid] += 1
+        self.dispatched[jid] += 1
+        return Assignment(jid, slot, task_time, done)
+
+    def complete(self, assignment, now=None):
+        """
+        Record that a deployment finished (or was given up on).
+
+        If it was the last work on its slot and finished before the
+        prediction, the slot becomes free now instead of later.
+        """
+        now = self.clock() if now is None else now
+        key = (assignment.jid, assignment.slot)
+        self._pending[key] -= 1
+        self.outstanding[assignment.jid] -= 1
+        self._room.set()
+        if self._pending[key] == 0 and self._free_at[key] > now:
+            self._free_at[key] = now
+            heapq.heappush(self._heap, (now, assignment.jid, assignment.slot))
+
+    def backlog(self, now=None):
+        """Seconds of predicted work left per unit."""
+        now = self.clock() if now is None else now
+        backlog = {jid: 0.0 for jid in self.jids}
+        for (jid, _), free_at in self._free_at.items():
+            backlog[jid] += max(0.0, free_at - now)
+        return backlog
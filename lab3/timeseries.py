@@ -0,0 +1,241 @@
+import numpy as np
+
+from common.clock import CLOCK
+from common.codec import READING_COLUMNS
+
+# Numeric reading fields kept per sensor (same columns the packed codec carries)
+SERIES_FIELDS = tuple(name for name, _ in READING_COLUMNS)
+
+
+class SensorSeries:
+    """
+    Rolling time series of every numeric reading field, per sensor.
+
+    Each sensor owns one row of fixed-size ring buffers (the last `window`
+    samples and their timestamps), so memory is capacity * window * (4 bytes
+    per field + 8 for the time), allocated up front in doublings up to
+    max_sensors. When a new sensor arrives and the store is full, the sensor
+    that has been silent longest is evicted.
+
+    Rolling mean and variance over the window, an EWMA and the window
+    min/max are kept incrementally: appending a reading adds it to running
+    sums and subtracts the sample it overwrites, so reads cost O(1). Min and
+    max are only rescanned (one ring row) when the overwritten sample was the
+    extreme. Queries across all sensors (top_k, window_stat) are single
+    NumPy reductions over the ring arrays.
+    """
+
+    def __init__(self, window=120, max_sensors=10_000, alpha=0.1, fields=SERIES_FIELDS, capacity=64):
+        self.window = window
+        self.max_sensors = max_sensors
+        self.alpha = alpha
+        self.fields = tuple(fields)
+        self._col = {name: i for i, name in enumerate(self.fields)}
+        self.index = {}         # sensor key -> row
+        self.keys = []          # row -> sensor key
+        self.evicted = 0
+        self._allocate(min(capacity, max_sensors))
+
+    def _allocate(self, capacity):
+        f, w = len(self.fields), self.window
+        old = getattr(self, "_values", None)
+        arrays = {
+            "_values": np.zeros((capacity, w, f), dtype=np.float32),
+            "_times": np.full((capacity, w), -np.inf),
+            "_head": np.zeros(capacity, dtype=np.int64),     # next ring position to write
+            "_count": np.zeros(capacity, dtype=np.int64),    # samples held (<= window)
+            "_sum": np.zeros((capacity, f)),
+            "_sumsq": np.zeros((capacity, f)),
+            "_ewma": np.zeros((capacity, f)),
+            "_min": np.full((capacity, f), np.inf),
+            "_max": np.full((capacity, f), -np.inf),
+            "_last": np.full(capacity, -np.inf),             # time of the latest sample
+        }
+        for name, array in arrays.items():
+            if old is not None:
+                previous = getattr(self, name)
+                array[:len(previous)] = previous
+            setattr(self, name, array)
+        self.capacity = capacity
+
+    @property
+    def nbytes(self):
+        """Bytes held by the ring buffers and running statistics."""
+        return sum(getattr(self, name).nbytes for name in (
+            "_values", "_times", "_head", "_count", "_sum", "_sumsq", "_ewma", "_min", "_max", "_last"))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def _row(self, key):
+        row = self.index.get(key)
+        if row is not None:
+            return row
+        if len(self.keys) < self.capacity:
+            row = len(self.keys)
+            self.keys.append(key)
+        elif self.capacity < self.max_sensors:
+            self._allocate(min(self.capacity * 2, self.max_sensors))
+            row = len(self.keys)
+            self.keys.append(key)
+        else:
+            row = int(np.argmin(self._last))  # longest silent sensor makes room
+            del self.index[self.keys[row]]
+            self.keys[row] = key
+            self._reset(row)
+            self.evicted += 1
+        self.index[key] = row
+        return row
+
+    def _reset(self, row):
+        self._values[row] = 0
+        self._times[row] = -np.inf
+        self._head[row] = self._count[row] = 0
+        self._sum[row] = self._sumsq[row] = self._ewma[row] = 0
+        self._min[row] = np.inf
+        self._max[row] = -np.inf
+        self._last[row] = -np.inf
+
+    def append(self, key, reading, timestamp=None):
+        """Add one reading (a dict with the numeric fields) for sensor key."""
+        row = self._row(key)
+        now = reading.get("timestamp", CLOCK.time()) if timestamp is None else timestamp
+        # Round through float32 first so the running sums add and later subtract the same value
+        value = np.array([reading.get(name, 0.0) for name in self.fields], dtype=np.float32).astype(float)
+        pos = self._head[row]
+        full = self._count[row] == self.window
+        old = self._values[row, pos].astype(float)
+
+        self._values[row, pos] = value
+        self._times[row, pos] = now
+        self._head[row] = (pos + 1) % self.window
+        self._last[row] = now
+        if full:
+            self._sum[row] += value - old
+            self._sumsq[row] += value * value - old * old
+        else:
+            self._sum[row] += value
+            self._sumsq[row] += value * value
+            self._count[row] += 1
+        self._ewma[row] = value if self._count[row] == 1 else self.alpha * value + (1 - self.alpha) * self._ewma[row]
+
+        np.minimum(self._min[row], value, out=self._min[row])
+        np.maximum(self._max[row], value, out=self._max[row])
+        if full:
+            # The overwritten sample may have been the extreme; rescan only those fields
+            stale = (old <= self._min[row]) & (value > old)
+            if stale.any():
+                self._min[row, stale] = self._values[row, :, stale].min(axis=1)
+            stale = (old >= self._max[row]) & (value < old)
+            if stale.any():
+                self._max[row, stale] = self._values[row, :, stale].max(axis=1)
+        return row
+
+    def extend(self, keys, readings):
+        """Add a batch of readings (e.g. one gateway message), one per key. Returns their rows."""
+        return [self.append(key, reading) for key, reading in zip(keys, readings)]
+
+    def fresh(self, rows):
+        """True for rows whose sensor has a single sample (new, or reused after eviction)."""
+        return self._count[rows] == 1
+
+    # ----- per-sensor reads -----
+
+    def count(self, key):
+        return int(self._count[self.index[key]])
+
+    def mean(self, key, field):
+        row = self.index[key]
+        return self._sum[row, self._col[field]] / self._count[row]
+
+    def variance(self, key, field):
+        row, col = self.index[key], self._col[field]
+        n = self._count[row]
+        mean = self._sum[row, col] / n
+        return max(self._sumsq[row, col] / n - mean * mean, 0.0)
+
+    def ewma(self, key, field):
+        return self._ewma[self.index[key], self._col[field]]
+
+    def minimum(self, key, field):
+        return self._min[self.index[key], self._col[field]]
+
+    def maximum(self, key, field):
+        return self._max[self.index[key], self._col[field]]
+
+    def summary(self, key):
+        """Rolling stats of every field for one sensor, as plain floats."""
+        row = self.index[key]
+        n = self._count[row]
+        mean = self._sum[row] / n
+        var = np.maximum(self._sumsq[row] / n - mean * mean, 0.0)
+        return {
+            name: {
+                "mean": round(float(mean[i]), 3),
+                "std": round(float(np.sqrt(var[i])), 3),
+                "ewma": round(float(self._ewma[row, i]), 3),
+                "min": round(float(self._min[row, i]), 3),
+                "max": round(float(self._max[row, i]), 3),
+            }
+            for i, name in enumerate(self.fields)
+        }
+
+    def history(self, key, field=None):
+        """(times, values) of one sensor in arrival order, oldest first."""
+        row = self.index[key]
+        n, head = self._count[row], self._head[row]
+        order = (np.arange(n) + (head - n)) % self.window
+        values = self._values[row, order]
+        if field is not None:
+            values = values[:, self._col[field]]
+        return self._times[row, order], values
+
+    # ----- queries across all sensors -----
+
+    def window_stat(self, field, seconds=None, stat="mean", now=None):
+        """
+        One value per sensor (in self.keys order) for field: "mean", "max",
+        "min" or "ewma". With seconds, only samples newer than now - seconds
+        count; sensors with none there get NaN.
+        """
+        n, col = len(self.keys), self._col[field]
+        if seconds is None:
+            count = self._count[:n]
+            if stat == "mean":
+                return self._sum[:n, col] / np.maximum(count, 1)
+            if stat == "ewma":
+                return self._ewma[:n, col].copy()
+            return {"max": self._max, "min": self._min}[stat][:n, col].copy()
+
+        now = CLOCK.time() if now is None else now
+        values = self._values[:n, :, col].astype(float)
+        recent = self._times[:n] >= now - seconds
+        hits = recent.sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            if stat == "mean":
+                out = np.where(recent, values, 0.0).sum(axis=1) / hits
+            elif stat == "max":
+                out = np.where(recent, values, -np.inf).max(axis=1)
+            elif stat == "min":
+                out = np.where(recent, values, np.inf).min(axis=1)
+            else:
+                raise ValueError(f"Unknown windowed stat: {stat}")
+        return np.where(hits > 0, out, np.nan)
+
+    def top_k(self, field, k=10, seconds=None, stat="mean", now=None):
+        """
+        The k sensors with the highest stat of field, e.g. top_k("SO2_ppm", 5,
+        seconds=600) for the highest mean SO2 over the last 10 minutes.
+        Returns [(sensor key, value)], highest first.
+        """
+        values = self.window_stat(field, seconds, stat, now)
+        values = np.where(np.isnan(values), -np.inf, values)
+        k = min(k, len(values))
+        if k == 0:
+            return []
+        top = np.argpartition(-values, k - 1)[:k]
+        top = top[np.argsort(-values[top], kind="stable")]
+        return [(self.keys[i], float(values[i])) for i in top if values[i] > -np.inf]
@@ -0,0 +1,314 @@
+"""
+Start a whole topology of agents with one command: coordinators, rescue
+units and sensors spread over a pool of worker processes, one per core by
+default.
+
+    python launch.py --coordinators 2 --rescue-units 8 --sensors 40 --virtual-sensors 50
+    python launch.py --topology topology.json --seconds 600
+    python launch.py --embedded-server --sensors 100     # no external XMPP server needed
+
+A topology (a JSON file with the keys of DEFAULT_TOPOLOGY, or the flags,
+which win) says how many agents of each role to run. Agents are named
+<role>-<n>@<domain>. Sensor n reports to coordinator n % coordinators,
+and every coordinator dispatches to all the rescue units. Agent k of each
+role runs in process k % processes, so with as many coordinators as
+processes every sensor shares its coordinator's process.
+
+Each worker runs its agents on uvloop (--no-uvloop: asyncio's own loop)
+and starts them concurrently, --start-concurrency at a time, instead of
+one start()/auto_register round trip after another. Start and shutdown go
+role by role across all the processes. Rescue units start first, then
+coordinators, then sensors, so nothing is sent to an agent that isn't
+there yet. On Ctrl+C, SIGTERM or after --seconds the order is reversed
+and every agent goes through its own shutdown(). The launcher reports
+how long it took from its start until every agent was up.
+
+Agents in different processes talk through the XMPP server, so
+--transport bus needs --processes 1. --embedded-server runs a throwaway
+pyjabber server for the domain with every agent's account created up
+front, hashed at bcrypt's lowest cost. pyjabber hashes a registration and
+checks a login at cost 12 on its own event loop, about 0.7 s of server
+CPU per agent, one agent at a time. With the accounts in place the agents
+log in without registering.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+
+from config import AGENTS, TRANSPORT
+from common.bus import TRANSPORTS
+
+ROLES = ("rescue", "coordinator", "sensor")  # start order; shutdown goes the other way
+DEFAULT_TOPOLOGY = {"coordinators": 1, "rescue_units": 1, "sensors": 1, "virtual_sensors": 0}
+PHASE_TIMEOUT = 600  # seconds a start or shutdown phase may take before the launcher gives up
+
+
+def agent_specs(topology, domain):
+    """(role, jid, options) for every agent of a topology, in start order."""
+    counts = {**DEFAULT_TOPOLOGY, **topology}
+    unknown = set(counts) - set(DEFAULT_TOPOLOGY)
+    if unknown:
+        raise ValueError(f"Unknown topology keys: {', '.join(sorted(unknown))}")
+    if counts["sensors"] and not counts["coordinators"]:
+        raise ValueError("Sensors need at least one coordinator")
+    coordinators = [f"coordinator-{i}@{domain}" for i in range(counts["coordinators"])]
+    rescue_units = [f"rescue-{i}@{domain}" for i in range(counts["rescue_units"])]
+    sensors = [f"sensor-{i}@{domain}" for i in range(counts["sensors"])]
+
+    specs = [("rescue", jid, {}) for jid in rescue_units]
+    specs += [("coordinator", jid, {"rescue_pool": rescue_units, "sensors": sensors[i::len(coordinators)]})
+              for i, jid in enumerate(coordinators)]
+    specs += [("sensor", jid, {"coordinator": coordinators[i % len(coordinators)],
+                               "virtual_sensors": counts["virtual_sensors"]})
+              for i, jid in enumerate(sensors)]
+    return specs
+
+
+def place(specs, processes):
+    """Deal the agents of each role round-robin over `processes` groups (empty ones dropped)."""
+    groups = [[] for _ in range(processes)]
+    seen = Counter()
+    for spec in specs:
+        groups[seen[spec[0]] % processes].append(spec)
+        seen[spec[0]] += 1
+    return [group for group in groups if group]
+
+
+# ----------- WORKER PROCESS --------------
+
+def worker(specs, settings, commands, replies):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the launcher decides when to stop
+    if settings["quiet"]:
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, 1)
+    if settings["uvloop"]:
+        import uvloop
+        uvloop.run(serve(specs, settings, commands, replies))
+    else:
+        asyncio.run(serve(specs, settings, commands, replies))
+
+
+async def serve(specs, settings, commands, replies):
+    """Build this process's agents, then start / shut down a role at a time as the launcher says."""
+    from lab2.sensor_agent import SensorAgent
+    from lab3.coordinator_agent import CoordinatorAgent
+    from lab3.rescue_agent import RescueAgent
+
+    classes = {"sensor": SensorAgent, "coordinator": CoordinatorAgent, "rescue": RescueAgent}
+    agents = {role: [] for role in ROLES}
+    for role, jid, options in specs:
+        agents[role].append(classes[role](jid, settings["password"], transport=settings["transport"], **options))
+    gate = asyncio.Semaphore(settings["concurrency"])
+
+    async def start(agent):
+        async with gate:
+            await agent.start(auto_register=settings["register"])
+
+    async def shutdown(agent):
+        if agent.is_alive():
+            await agent.shutdown()
+
+    while True:
+        command, role = await asyncio.to_thread(commands.get)
+        if command == "exit":
+            return
+        group = agents[role]
+        began = time.perf_counter()
+        results = await asyncio.gather(*(start(agent) if command == "start" else shutdown(agent)
+                                         for agent in group), return_exceptions=True)
+        errors = [f"{agent.jid}: {result!r}" for agent, result in zip(group, results)
+                  if isinstance(result, BaseException)]
+        replies.put((command, role, len(group), time.perf_counter() - began, errors))
+
+
+# ----------- EMBEDDED SERVER --------------
+
+def xmpp_server(domain, accounts, ready, stop):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    for fd in (1, 2):  # pyjabber prints a traceback for every stanza it fails to parse
+        os.dup2(devnull, fd)
+    import loguru
+    loguru.logger.remove()
+    import bcrypt
+    from pyjabber.db.database import DB
+    from pyjabber.db.model import Model
+    from pyjabber.server import Server
+    from pyjabber.server_parameters import Parameters
+
+    async def main():
+        server = Server(Parameters(host=domain, database_in_memory=True))
+        serving = asyncio.create_task(server.start())
+        await server.ready.wait()
+        if accounts:
+            salt = bcrypt.gensalt(4)  # a throwaway server: the cheapest hash it accepts
+            with DB.connection() as con:
+                con.execute(Model.Credentials.insert(), [{"jid": user, "hash_pwd": bcrypt.hashpw(password.encode(), salt)}
+                                                         for user, password in accounts])
+                con.commit()
+        ready.set()
+        await asyncio.to_thread(stop.wait)
+        serving.cancel()
+
+    asyncio.run(main())
+
+
+def start_server(domain, accounts=(), ctx=None):
+    """
+    A pyjabber server for `domain` in its own process, with `accounts`
+    ((user, password) pairs) already registered. Returns (process, stop
+    event) once it listens.
+    """
+    ctx = ctx or multiprocessing.get_context("spawn")
+    ready, stop = ctx.Event(), ctx.Event()
+    process = ctx.Process(target=xmpp_server, args=(domain, list(accounts), ready, stop), daemon=True)
+    process.start()
+    if not ready.wait(60):
+        process.terminate()
+        raise RuntimeError("The embedded XMPP server did not start")
+    return process, stop
+
+
+# ----------- LAUNCHER --------------
+
+class Launcher:
+    """
+    Worker processes for a set of agent specs (see agent_specs()), driven
+    phase by phase: start() brings every role up, shutdown() takes them
+    down in reverse and ends the workers. Phase times are in `timings`.
+    """
+
+    def __init__(self, specs, processes=None, transport=TRANSPORT, use_uvloop=True, concurrency=64,
+                 password=None, register=True, quiet=False):
+        processes = processes or os.cpu_count() or 1
+        if transport == "bus" and processes > 1:
+            raise ValueError("The bus transport only reaches agents in the same process: use --processes 1")
+        self.began = time.perf_counter()
+        self.specs = specs
+        self.settings = {"transport": transport, "uvloop": use_uvloop, "concurrency": concurrency,
+                         "password": password or AGENTS["coordinator"]["password"] or "launch",
+                         "register": register, "quiet": quiet}
+        ctx = multiprocessing.get_context("spawn")
+        self.replies = ctx.Queue()
+        self.workers = []
+        for group in place(specs, processes):
+            commands = ctx.Queue()
+            process = ctx.Process(target=worker, args=(group, self.settings, commands, self.replies), daemon=True)
+            process.start()
+            self.workers.append((process, commands))
+        self.timings = {}
+        self.errors = []
+        self.ready_s = None
+
+    def phase(self, command, role):
+        """Run a command for one role in every worker and wait for all of them."""
+        began = time.perf_counter()
+        for _, commands in self.workers:
+            commands.put((command, role))
+        count = 0
+        for _ in self.workers:
+            deadline = time.monotonic() + PHASE_TIMEOUT
+            while True:
+                try:
+                    _, _, n, _, errors = self.replies.get(timeout=1)
+                    break
+                except queue.Empty:
+                    dead = [process.exitcode for process, _ in self.workers if not process.is_alive()]
+                    if dead or time.monotonic() > deadline:
+                        raise RuntimeError(f"{command} {role}: worker(s) died or hung (exit codes {dead})")
+            count += n
+            self.errors += errors
+        self.timings[f"{command} {role}"] = time.perf_counter() - began
+        return count
+
+    def start(self):
+        """Start every role; returns seconds from the launcher's creation until all agents are up."""
+        for role in ROLES:
+            self.phase("start", role)
+        self.ready_s = time.perf_counter() - self.began
+        return self.ready_s
+
+    def shutdown(self):
+        began = time.perf_counter()
+        try:
+            for role in reversed(ROLES):
+                self.phase("shutdown", role)
+        finally:
+            for process, commands in self.workers:
+                commands.put(("exit", None))
+            for process, _ in self.workers:
+                process.join(30)
+                if process.is_alive():
+                    process.terminate()
+        self.timings["shutdown"] = time.perf_counter() - began
+        return self.timings["shutdown"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a topology of agents over a pool of processes")
+    parser.add_argument("--topology", metavar="JSON", help="file with " + ", ".join(DEFAULT_TOPOLOGY))
+    parser.add_argument("--coordinators", type=int)
+    parser.add_argument("--rescue-units", type=int)
+    parser.add_argument("--sensors", type=int)
+    parser.add_argument("--virtual-sensors", type=int, help="run every sensor as a gateway of N sensors")
+    parser.add_argument("--domain", default=(AGENTS["coordinator"]["jid"] or "@localhost").split("@")[-1],
+                        help="XMPP domain of the agents' JIDs")
+    parser.add_argument("--processes", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--start-concurrency", type=int, default=64, help="agents a process starts at once")
+    parser.add_argument("--transport", choices=TRANSPORTS, default=TRANSPORT)
+    parser.add_argument("--no-uvloop", action="store_true", help="use asyncio's own event loop")
+    parser.add_argument("--embedded-server", action="store_true", help="run a local pyjabber server for the domain")
+    parser.add_argument("--seconds", type=float, help="run for this long (default: until Ctrl+C)")
+    parser.add_argument("--quiet", action="store_true", help="no agent console output (log files only)")
+    args = parser.parse_args()
+
+    topology = {}
+    if args.topology:
+        with open(args.topology) as f:
+            topology = json.load(f)
+    for key in DEFAULT_TOPOLOGY:
+        if getattr(args, key) is not None:
+            topology[key] = getattr(args, key)
+    try:
+        specs = agent_specs(topology, args.domain)
+    except ValueError as e:
+        parser.error(str(e))
+
+    stop = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stop.set())
+
+    password = AGENTS["coordinator"]["password"] or "launch"
+    server = None
+    if args.embedded_server:
+        server = start_server(args.domain, [(jid.split("@")[0], password) for _, jid, _ in specs])
+    try:
+        launcher = Launcher(specs, min(args.processes, len(specs)), args.transport, not args.no_uvloop,
+                            args.start_concurrency, password, register=server is None, quiet=args.quiet)
+    except ValueError as e:
+        parser.error(str(e))
+    try:
+        ready = launcher.start()
+        print(f"All {len(specs)} agents ready in {ready:.2f}s on {len(launcher.workers)} process(es) "
+              f"({'asyncio' if args.no_uvloop else 'uvloop'}, {args.transport})")
+        for error in launcher.errors:
+            print(f"  failed: {error}", file=sys.stderr)
+        stop.wait(args.seconds)
+    finally:
+        print("Shutting down: sensors, then coordinators, then rescue units...")
+        print(f"Stopped in {launcher.shutdown():.2f}s")
+        if server is not None:
+            server[1].set()
+            server[0].join(10)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Run the sensor, coordinator and rescue agents together in one process.
+
+By default they talk over the in-process bus (common/bus.py), so no XMPP
+server is needed and a simulation is limited by CPU rather than by stanza
+round trips:
+
+    python simulate.py --virtual-sensors 5000 --seconds 60
+
+--speed N runs simulated time N times faster than real time (see
+common/clock.py): --speed 360 --seconds 3600 is an hour of volcano
+activity and rescue response in ten seconds. --seed makes the sensor data
+reproducible from run to run. --replay PATH feeds a recording (see
+lab2/recording.py) to the coordinator instead, at --replay-rate times the
+recorded pace (0 = as fast as possible); --record PATH saves the sensor
+stream of a run for later replay. --adaptive and --deadband turn on the
+sensor's adaptive sampling and dead-band suppression (lab2/sampling.py).
+--store PATH keeps the coordinator's history of readings and incidents in
+a SQLite database (common/store.py).
+--transport xmpp runs the same set-up through the server in config/.env.
+--check turns the run into an end-to-end test: it exits non-zero unless
+incidents were confirmed and every rescue reply was a readable
+confirmation for an open incident (no invalid, unmatched or ignored ones).
+"""
+import argparse
+import asyncio
+import logging
+import sys
+
+from config import AGENTS, RESCUE_POOL, SIM_SPEED, SIM_SEED, STORE_PATH
+from common.bus import BUS, TRANSPORTS
+from common.clock import CLOCK
+from lab2.sensor_agent import SensorAgent
+from lab3.coordinator_agent import CoordinatorAgent
+from lab3.rescue_agent import RescueAgent
+
+
+async def main(virtual_sensors=0, seconds=60, transport="bus", max_concurrent=4, queue_limit=16, seed=SIM_SEED,
+               record=None, replay=None, replay_rate=1.0, adaptive=False, deadband=False, store=None):
+    coordinator = CoordinatorAgent(AGENTS["coordinator"]["jid"], AGENTS["coordinator"]["password"],
+                                   transport=transport, store=store)
+    rescue_units = [
+        RescueAgent(jid, AGENTS["rescue"]["password"], max_concurrent=max_concurrent,
+                    queue_limit=queue_limit, transport=transport)
+        for jid in RESCUE_POOL
+    ]
+    sensor = SensorAgent(AGENTS["sensor"]["jid"], AGENTS["sensor"]["password"],
+                         virtual_sensors=virtual_sensors, transport=transport, seed=seed,
+                         record=record, replay=replay, replay_rate=replay_rate,
+                         adaptive=adaptive, deadband=deadband)
+
+    agents = [coordinator, *rescue_units, sensor]  # receivers first, so nothing is sent into the void
+    try:
+        for agent in agents:
+            await agent.start(auto_register=True)
+        print(f"Simulation running on {transport} for {seconds}s simulated at {CLOCK.speed:g}x "
+              f"with {len(rescue_units)} rescue unit(s)")
+        await CLOCK.sleep(seconds)
+    finally:
+        for agent in reversed(agents):
+            await agent.shutdown()
+        if transport == "bus":
+            print(f"Bus: {BUS.stats()}")
+            logging.info("Bus stats at shutdown: %s", BUS.stats())
+        print(f"Incidents: {coordinator.incidents.stats() if coordinator.incidents else {}}")
+    return coordinator.incidents.stats() if coordinator.incidents else {}
+
+
+def check(stats):
+    """What went wrong end to end in a run with these incident stats (empty when nothing did)."""
+    problems = [f"{stats[key]} {key.replace('_', ' ')}" for key in ("invalid", "unmatched_replies", "ignored_replies")
+                if stats.get(key)]
+    confirmed = stats.get("closed", 0) - stats.get("timed_out", 0) - stats.get("rejected", 0) - stats.get("invalid", 0)
+    if confirmed <= 0:
+        problems.append("no incident was confirmed")
+    elif stats.get("rejected", 0) > confirmed:
+        problems.append(f"{stats['rejected']} incidents refused against {confirmed} confirmed")
+    return problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--virtual-sensors", type=int, default=0, help="run the sensor as a gateway of N sensors")
+    parser.add_argument("--seconds", type=float, default=60, help="simulated seconds to run")
+    parser.add_argument("--speed", type=float, default=SIM_SPEED, help="simulated seconds per real second")
+    parser.add_argument("--seed", type=int, default=SIM_SEED, help="seed for the sensor data")
+    parser.add_argument("--transport", choices=TRANSPORTS, default="bus")
+    parser.add_argument("--max-concurrent", type=int, default=4, help="deployments per rescue unit at once")
+    parser.add_argument("--queue-limit", type=int, default=16, help="accepted requests waiting per rescue unit")
+    parser.add_argument("--record", metavar="PATH", help="save the sensor stream to a recording")
+    parser.add_argument("--replay", metavar="PATH", help="send a recording instead of generated readings")
+    parser.add_argument("--replay-rate", type=float, default=1.0, help="replay speed-up (0 = max rate)")
+    parser.add_argument("--adaptive", action="store_true", help="adaptive sensing periods")
+    parser.add_argument("--deadband", action="store_true", help="dead-band reporting")
+    parser.add_argument("--store", metavar="PATH", default=STORE_PATH or None,
+                        help="coordinator history database (SQLite)")
+    parser.add_argument("--check", action="store_true", help="fail unless incidents are confirmed cleanly")
+    args = parser.parse_args()
+
+    CLOCK.speed = args.speed
+    try:
+        stats = asyncio.run(main(args.virtual_sensors, args.seconds, args.transport, args.max_concurrent,
+                                 args.queue_limit, args.seed, args.record, args.replay, args.replay_rate,
+                                 args.adaptive, args.deadband, args.store))
+    except KeyboardInterrupt:
+        print("\nSimulation interrupted by user.")
+        sys.exit(130)
+    if args.check:
+        problems = check(stats)
+        print(f"Check failed: {'; '.join(problems)}" if problems else "Check passed")
+        sys.exit(1 if problems else 0)
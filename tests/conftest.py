@@ -0,0 +1,14 @@
+import os
+import sys
+
+# The labs import each other as top-level packages (common, lab2, lab3), as when run from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def reading(sensor_id="s-00001", timestamp=1000.0, status="dormant", emergency=False, **values):
+    """A wire-format reading dict with every field set."""
+    data = {"sensor_id": sensor_id, "timestamp": timestamp, "status": status, "CO2_ppm": 400.0, "SO2_ppm": 20.0,
+            "vibration_mm_s": 0.5, "temperature_C": 30.0, "ash_density_g_m3": 0.1, "population_risk": 1.0,
+            "lava_flow_m3_s": 0.0, "emergency": emergency, "area_affected_km2": 0.5}
+    data.update(values)
+    return data
@@ -0,0 +1,72 @@
+import asyncio
+import itertools
+
+import numpy as np
+import pytest
+
+from common.schema import DeployRequest
+from lab3.assignment import BatchAllocator, allocate, linear_sum_assignment, severity_weights
+from lab3.heuristics import task_time_for
+from lab3.scheduler import RescuePool
+
+
+def requests(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return [DeployRequest("deploy", True, float(rng.uniform(0, 10)), float(rng.uniform(0, 10)),
+                          float(rng.uniform(0, 2000)), "erupting") for _ in range(n)]
+
+
+def pool(units=2, workers=2):
+    return RescuePool([f"rescue{i}@localhost" for i in range(units)], workers=workers, clock=lambda: 0.0)
+
+
+@pytest.mark.parametrize("shape", [(4, 4), (3, 5), (5, 3)])
+def test_linear_sum_assignment_is_optimal(shape):
+    cost = np.random.default_rng(1).uniform(0, 10, shape)
+    rows, cols = linear_sum_assignment(cost)
+    assert len(rows) == len(set(rows)) == len(set(cols)) == min(shape)
+    n, m = shape
+    best = min(sum(cost[i, j] for i, j in zip(rs, cs))
+               for rs in itertools.permutations(range(n), min(shape))
+               for cs in itertools.permutations(range(m), min(shape)))
+    assert cost[rows, cols].sum() == pytest.approx(best)
+
+
+def weighted_response(assignments, payloads):
+    return float(np.dot(severity_weights(payloads), [a.expected_done for a in assignments]))
+
+
+def test_allocate_places_every_payload():
+    payloads = requests(20)
+    rescue = pool()
+    assignments = allocate(rescue, payloads, now=0.0, max_batch=8)
+    assert all(a is not None for a in assignments)
+    assert sum(rescue.outstanding.values()) == 20
+    for a, payload in zip(assignments, payloads):
+        assert a.task_time == task_time_for(payload)
+
+
+def test_chunks_stay_close_to_one_solve():
+    # Not a strict bound: the cost model prices the delay behind an incident with the mean weight
+    payloads = requests(24, seed=2)
+    chunked = weighted_response(allocate(pool(), payloads, now=0.0, max_batch=6), payloads)
+    whole = weighted_response(allocate(pool(), payloads, now=0.0, max_batch=len(payloads)), payloads)
+    assert chunked == pytest.approx(whole, rel=0.05)
+
+
+def test_allocate_leaves_payloads_no_unit_has_room_for():
+    rescue = pool(units=1)
+    rescue.set_limit("rescue0@localhost", 3)
+    assignments = allocate(rescue, requests(5), now=0.0)
+    assert sum(a is not None for a in assignments) == 3
+    assert allocate(rescue, requests(2), now=0.0) == [None, None]
+
+
+def test_batch_allocator_assigns_a_window_together():
+    async def main():
+        allocator = BatchAllocator(pool(), window=0)
+        return allocator, await asyncio.gather(*(allocator.assign(payload) for payload in requests(6)))
+
+    allocator, assignments = asyncio.run(main())
+    assert allocator.batches == 1
+    assert all(a is not None for a in assignments)
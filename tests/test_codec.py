@@ -0,0 +1,72 @@
+import pytest
+from spade.message import Message
+
+from common.codec import get_codec, read_body, read_readings, set_body
+from common.schema import DeployRequest, ReadingBatch, RescueResult, SensorReading
+from conftest import reading
+
+ENCODINGS = ("json", "packed")
+
+
+def message(schema, obj, encoding):
+    return set_body(Message(to="coordinator@localhost", sender="sensor@localhost"), schema, obj, encoding)
+
+
+@pytest.mark.parametrize("encoding", ENCODINGS)
+def test_reading_round_trip(encoding):
+    sent = reading(CO2_ppm=512.34, emergency=True, status="erupting")
+    assert read_body(message("reading", sent, encoding)) == sent
+    assert read_body(message("reading", sent, encoding), typed=True) == SensorReading.from_dict(sent)
+
+
+@pytest.mark.parametrize("encoding", ENCODINGS)
+def test_readings_round_trip(encoding):
+    sent = [reading(f"s-{i:05d}", 1000.0 + i, status="active" if i % 2 else "dormant") for i in range(5)]
+    assert read_body(message("readings", sent, encoding)) == sent
+    batch = read_body(message("readings", ReadingBatch.from_readings(sent), encoding), typed=True)
+    assert isinstance(batch, ReadingBatch)
+    assert batch.to_dicts() == sent
+
+
+@pytest.mark.parametrize("encoding", ENCODINGS)
+def test_deploy_and_result_round_trip(encoding):
+    request = DeployRequest("deploy", True, 2.5, 6.4, 513.59, "erupting")
+    assert read_body(message("deploy", request, encoding), typed=True) == request
+    result = RescueResult("completed", "rescue@localhost", 12, 2.5, 6.4, 513.59)
+    assert read_body(message("result", result, encoding), typed=True) == result
+    assert read_body(message("result", result.to_dict(), encoding)) == result.to_dict()
+
+
+def test_typed_decode_rejects_bad_fields():
+    with pytest.raises(ValueError, match="status"):
+        read_body(message("reading", reading(status="smoking"), "json"), typed=True)
+    with pytest.raises(ValueError, match="CO2_ppm"):
+        read_body(message("reading", reading(CO2_ppm="lots"), "json"), typed=True)
+
+
+def test_unknown_encoding():
+    with pytest.raises(ValueError, match="Unknown encoding"):
+        get_codec("xml")
+
+
+def test_read_readings_drops_only_malformed_readings():
+    sent = [reading("a"), reading("b", status="smoking"), reading("c"), 7]
+    readings, malformed = read_readings(message("readings", sent, "json"))
+    assert [r["sensor_id"] for r in readings] == ["a", "c"]
+    assert malformed == 2
+
+
+def test_read_readings_stamps_a_single_reading_without_timestamp():
+    sent = reading()
+    del sent["sensor_id"], sent["timestamp"]
+    (received,), malformed = read_readings(message("reading", sent, "json"), now=123.0)
+    assert malformed == 0
+    assert received["timestamp"] == 123.0
+    assert received["sensor_id"] == ""
+
+
+def test_read_readings_raises_on_undecodable_body():
+    msg = Message(to="coordinator@localhost", body="{not json")
+    msg.set_metadata("schema", "readings")
+    with pytest.raises(ValueError):
+        read_readings(msg)
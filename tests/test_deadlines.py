@@ -0,0 +1,38 @@
+import pytest
+
+from lab3.deadlines import DeadlineEstimator
+
+
+def test_initial_ratio_during_warmup():
+    estimator = DeadlineEstimator(warmup=3, initial=2.0, slack=1.0)
+    estimator.observe(10, 10)
+    assert estimator.ratio(99) == 2.0
+    assert estimator.deadline(10) == 21.0
+
+
+def test_percentiles_of_observed_lateness():
+    estimator = DeadlineEstimator(percentile=90, hedge_percentile=50, slack=0.0, warmup=1)
+    for ratio in range(1, 11):
+        estimator.observe(ratio * 10, 10)
+    assert estimator.ratio(50) == 5.0
+    assert estimator.hedge_after(10) == 50.0
+    assert estimator.deadline(10) == 90.0
+    assert estimator.stats()["observed"] == 10
+
+
+def test_window_forgets_old_ratios():
+    estimator = DeadlineEstimator(window=3, warmup=1)
+    for ratio in (9.0, 1.0, 1.0, 1.0):
+        estimator.observe(ratio, 1)
+    assert estimator.ratio(100) == 1.0
+
+
+def test_deadline_is_capped():
+    estimator = DeadlineEstimator(maximum=60.0)
+    assert estimator.deadline(1000) == 60.0
+
+
+def test_hedge_percentile_must_be_below_percentile():
+    with pytest.raises(ValueError):
+        DeadlineEstimator(percentile=90, hedge_percentile=95)
+    assert not DeadlineEstimator(hedge_percentile=None).hedging
@@ -0,0 +1,67 @@
+from spade.message import Message
+
+from common.codec import set_body
+from conftest import reading
+from lab3.intake import PriorityIntake
+
+
+def keys(items):
+    return [key for key, _ in items]
+
+
+def test_most_urgent_first():
+    intake = PriorityIntake()
+    intake.add("dormant", reading())
+    intake.add("active", reading(status="active"))
+    intake.add("flagged", reading(emergency=True))
+    assert keys(intake.take()) == ["flagged", "active", "dormant"]
+    assert len(intake) == 0
+
+
+def test_take_returns_distinct_keys():
+    intake = PriorityIntake(coalesce_at=100)
+    for key in ("a", "b", "a", "c"):
+        intake.add(key, reading(key))
+    assert keys(intake.take()) == ["a", "b"]  # stops at the second reading of a
+    assert keys(intake.take()) == ["a", "c"]
+
+
+def test_take_limit():
+    intake = PriorityIntake()
+    for i in range(5):
+        intake.add(i, reading(emergency=True))
+    assert keys(intake.take(limit=3)) == [0, 1, 2]
+
+
+def test_routine_readings_coalesce_then_shed():
+    intake = PriorityIntake(coalesce_at=2, routine_limit=3)
+    intake.add("a", reading(CO2_ppm=1.0))
+    intake.add("b", reading())
+    intake.add("a", reading(CO2_ppm=2.0))  # replaces the waiting one
+    assert intake.coalesced == 1
+    for key in ("c", "d"):
+        intake.add(key, reading())
+    assert intake.stats()["shed"]["routine"] == 1
+    items = dict(intake.take())
+    assert list(items) == ["b", "c", "d"]
+
+
+def test_emergencies_are_never_shed():
+    intake = PriorityIntake(severe_limit=1)
+    for i in range(3):
+        intake.add(i, reading(emergency=True))
+        intake.add(("severe", i), reading(status="erupting"))
+    assert intake.stats()["waiting"] == {"emergency": 3, "severe": 1, "routine": 0}
+
+
+def test_put_counts_malformed_and_undecodable():
+    intake = PriorityIntake()
+    msg = Message(to="coordinator@localhost", sender="sensor@localhost")
+    set_body(msg, "readings", [reading("a"), reading("b", CO2_ppm=None)])
+    intake.put(msg)
+    assert keys(intake.take()) == ["a"]
+    assert intake.stats()["malformed"] == 1
+
+    msg.body = "{"
+    intake.put(msg)
+    assert intake.stats()["errors"] == 1
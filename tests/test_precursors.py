@@ -0,0 +1,67 @@
+import numpy as np
+
+from lab3.precursors import PRECURSORS, PrecursorDetector
+
+BASELINE = {"CO2_ppm": 400.0, "SO2_ppm": 50.0, "vibration_mm_s": 1.0, "temperature_C": 100.0}
+
+
+def feed(detector, row, readings):
+    """Raised channel lists, one per reading (None when it raised nothing)."""
+    return [detector.update(row, reading) for reading in readings]
+
+
+def quiet(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return [{name: value * (1 + 0.01 * rng.standard_normal()) for name, value in BASELINE.items()} for _ in range(n)]
+
+
+def shifted(n):
+    return [{name: value * 2.5 for name, value in BASELINE.items()} for _ in range(n)]
+
+
+def test_noise_raises_nothing():
+    detector = PrecursorDetector()
+    assert not any(feed(detector, 0, quiet(200)))
+    assert detector.raised == 0
+
+
+def test_sustained_shift_raises_once():
+    detector = PrecursorDetector()
+    feed(detector, 0, quiet(30))
+    raised = [channels for channels in feed(detector, 0, shifted(20)) if channels]
+    assert len(raised) == 1
+    assert len(raised[0]) >= detector.min_channels
+    assert set(raised[0]) <= set(PRECURSORS)
+    assert detector.active([0]).tolist() == [True]
+    assert max(detector.score(0).values()) > detector.threshold
+
+
+def test_rearms_after_settling():
+    detector = PrecursorDetector()
+    feed(detector, 0, quiet(30))
+    feed(detector, 0, shifted(20))
+    feed(detector, 0, quiet(100, seed=1))
+    assert detector.active([0]).tolist() == [False]
+    assert any(feed(detector, 0, [{n: v * 6 for n, v in BASELINE.items()} for _ in range(20)]))
+    assert detector.raised == 2
+
+
+def test_reset_forgets_a_row():
+    detector = PrecursorDetector()
+    feed(detector, 3, quiet(30))
+    feed(detector, 3, shifted(20))
+    detector.reset([3])
+    assert detector.active([3]).tolist() == [False]
+    assert set(detector.score(3).values()) == {0.0}
+    assert not any(feed(detector, 3, shifted(5)))  # warming up again
+
+
+def test_update_many_matches_update():
+    one, many = PrecursorDetector(capacity=2), PrecursorDetector(capacity=2)
+    for a, b in zip(quiet(30) + shifted(20), quiet(50, seed=2)):
+        one.update(0, a)
+        one.update(100, b)  # beyond capacity: grows
+        many.update_many([0, 100], [a, b])
+    assert one.score(0) == many.score(0)
+    assert one.score(100) == many.score(100)
+    assert one.raised == many.raised == 1
@@ -0,0 +1,39 @@
+from common.schema import ReadingBatch
+from conftest import reading
+from lab2.recording import INDEX_EVERY, ReadingRecorder, ReadingReplay
+
+
+def record(path, readings):
+    recorder = ReadingRecorder(str(path))
+    recorder.write(readings)
+    recorder.close()
+    return ReadingReplay(str(path))
+
+
+def test_round_trip(tmp_path):
+    sent = [reading(f"s-{i % 3}", 100.0 + i // 3, status="active", emergency=i == 4) for i in range(9)]
+    replay = record(tmp_path / "run.rec", sent)
+    assert len(replay) == 9
+    assert replay.time_range() == (100.0, 102.0)
+    assert [r for chunk in replay.chunks(size=4) for r in chunk] == sent
+
+
+def test_batches_and_appends(tmp_path):
+    path = tmp_path / "run.rec"
+    first = [reading("a", 1.0), reading("b", 1.0)]
+    record(path, ReadingBatch.from_readings(first))
+    replay = record(path, [reading("a", 2.0)])  # reopened: appends, sensor ids kept
+    assert replay.sensor_ids == ["a", "b"]
+    assert [r["timestamp"] for chunk in replay.chunks() for r in chunk] == [1.0, 1.0, 2.0]
+
+
+def test_seek_and_ticks(tmp_path):
+    ticks = 3 * INDEX_EVERY // 10
+    sent = [reading(f"s-{i}", float(t)) for t in range(ticks) for i in range(10)]
+    replay = record(tmp_path / "run.rec", sent)
+    assert len(replay.index) == 3
+    assert replay.seek(0) == 0
+    assert replay.seek(150.5) == 1510
+    assert replay.seek(ticks) == len(sent)
+    stamps = [stamp for stamp, readings in replay.ticks(start=10, end=13) if len(readings) == 10]
+    assert stamps == [10.0, 11.0, 12.0]
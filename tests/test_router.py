@@ -0,0 +1,60 @@
+from spade.message import Message
+
+from lab3.router import MessageRouter, copy_message
+
+AGENTS = {"sensor": {"jid": "sensor@localhost"}, "rescue": {"jid": "rescue@localhost"}, "unset": {"jid": ""}}
+
+
+def message(sender, performative="inform", thread=None):
+    msg = Message(to="coordinator@localhost", sender=sender, thread=thread, body="{}")
+    msg.set_metadata("performative", performative)
+    return msg
+
+
+def router_with(*routes):
+    router, got = MessageRouter(AGENTS), []
+    for performative, name, sender in routes:
+        router.add_route(performative, lambda msg, name=name: got.append(name), sender=sender)
+    return router, got
+
+
+def test_roles_from_config():
+    assert MessageRouter(AGENTS).roles == {"sensor@localhost": "sensor", "rescue@localhost": "rescue"}
+
+
+def test_role_route_before_performative_route():
+    router, got = router_with(("inform", "any", None), ("inform", "sensor", "sensor"))
+    assert router.route(message("sensor@localhost/gateway"))
+    assert router.route(message("rescue@localhost"))
+    assert got == ["sensor", "any"]
+
+
+def test_thread_wins_until_removed():
+    router, got = router_with(("inform", "any", None))
+    router.add_thread("t1", lambda msg: got.append("thread"))
+    router.route(message("rescue@localhost", thread="t1"))
+    router.remove_thread("t1")
+    router.route(message("rescue@localhost", thread="t1"))
+    assert got == ["thread", "any"]
+    assert router.stats() == {"routed": 1, "thread": 1, "misrouted": 0, "threads_open": 0}
+
+
+def test_added_role_and_misrouted():
+    router, got = router_with(("agree", "rescue", "rescue"))
+    router.add_role("rescue2@localhost", "rescue")
+    assert router.route(message("rescue2@localhost", "agree"))
+    assert not router.route(message("stranger@localhost", "agree"))
+    assert got == ["rescue"]
+    assert router.stats()["misrouted"] == 1
+
+
+def test_taps_get_a_copy():
+    router, got = router_with(("inform", "any", None))
+    tapped = []
+    router.add_tap(tapped.append)
+    msg = message("sensor@localhost", thread="t")
+    router.route(msg)
+    assert got == ["any"]
+    assert tapped[0] is not msg
+    assert (tapped[0].body, tapped[0].thread, tapped[0].metadata) == (msg.body, msg.thread, msg.metadata)
+    assert copy_message(msg).sender == msg.sender
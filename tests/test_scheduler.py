@@ -0,0 +1,67 @@
+import pytest
+
+from lab3.scheduler import RescuePool
+
+
+def pool(jids=("a", "b"), workers=1):
+    return RescuePool(list(jids), workers=workers, clock=lambda: 0.0)
+
+
+def test_needs_a_unit():
+    with pytest.raises(ValueError):
+        RescuePool([])
+
+
+def test_assign_goes_to_the_slot_free_first():
+    rescue = pool()
+    first = rescue.assign(10, now=0)
+    second = rescue.assign(5, now=0)
+    third = rescue.assign(1, now=0)
+    assert {first.jid, second.jid} == {"a", "b"}
+    assert third.jid == second.jid  # free at 5, before the other at 10
+    assert third.expected_done == 6
+    assert rescue.outstanding == {first.jid: 1, second.jid: 2}
+
+
+def test_assign_excludes_units():
+    rescue = pool()
+    assert {rescue.assign(1, now=0, exclude={"a"}).jid for _ in range(3)} == {"b"}
+    assert rescue.assign(1, now=0, exclude={"a", "b"}) is None
+    assert rescue.assign(1, now=0).jid == "a"
+
+
+def test_complete_frees_a_slot_early():
+    rescue = pool(jids=("a",))
+    assignment = rescue.assign(30, now=0)
+    rescue.complete(assignment, now=4)
+    assert rescue.outstanding["a"] == 0
+    assert rescue.assign(2, now=4).expected_done == 6
+    assert rescue.backlog(now=4) == {"a": 2}
+
+
+def test_full_units_get_nothing_until_they_have_room():
+    rescue = pool(workers=2)
+    rescue.set_limit("a", 1)
+    first = rescue.assign(1, now=0)
+    assert first.jid == "a"
+    assert rescue.full("a")
+    assert rescue.assign(1, now=0).jid == "b"
+    assert [key[0] for key in rescue.slots()[0]] == ["b", "b"]
+
+    rescue.set_limit("b", 1)
+    assert not rescue.has_room()
+    assert rescue.assign(1, now=0) is None
+    rescue.complete(first, now=1)
+    assert rescue.has_room()
+    assert rescue.assign(1, now=1).jid == "a"
+
+
+def test_refusal_caps_a_unit_at_what_it_holds():
+    rescue = pool(jids=("a",), workers=4)
+    rescue.set_limit("a", 20)
+    held = rescue.assign(1, now=0)
+    rescue.refused("a")
+    assert rescue.full("a")
+    rescue.set_limit("a", 20)  # its next report
+    assert not rescue.full("a")
+    rescue.complete(held, now=1)
@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+
+from lab3.timeseries import SensorSeries
+
+
+def test_rolling_stats_over_the_window():
+    series = SensorSeries(window=3, fields=("CO2_ppm",))
+    for t, value in enumerate([1.0, 9.0, 2.0, 3.0, 4.0]):
+        series.append("a", {"CO2_ppm": value, "timestamp": float(t)})
+    assert series.count("a") == 3
+    assert series.mean("a", "CO2_ppm") == pytest.approx(3.0)
+    assert series.variance("a", "CO2_ppm") == pytest.approx(np.var([2.0, 3.0, 4.0]))
+    assert series.minimum("a", "CO2_ppm") == 2.0
+    assert series.maximum("a", "CO2_ppm") == 4.0  # 9 left the window
+    times, values = series.history("a", "CO2_ppm")
+    assert times.tolist() == [2.0, 3.0, 4.0]
+    assert values.tolist() == [2.0, 3.0, 4.0]
+
+
+def test_ewma():
+    series = SensorSeries(window=4, alpha=0.5, fields=("CO2_ppm",))
+    for value in (2.0, 4.0, 8.0):
+        series.append("a", {"CO2_ppm": value, "timestamp": 0.0})
+    assert series.ewma("a", "CO2_ppm") == pytest.approx(5.5)
+
+
+def test_grows_then_evicts_the_longest_silent_sensor():
+    series = SensorSeries(window=2, max_sensors=2, capacity=1, fields=("CO2_ppm",))
+    series.append("old", {"CO2_ppm": 1.0, "timestamp": 1.0})
+    series.append("new", {"CO2_ppm": 1.0, "timestamp": 5.0})
+    assert series.capacity == 2
+    rows = series.extend(["third"], [{"CO2_ppm": 7.0, "timestamp": 6.0}])
+    assert "old" not in series and "third" in series
+    assert series.evicted == 1
+    assert series.fresh(rows).tolist() == [True]
+    assert series.mean("third", "CO2_ppm") == 7.0
+
+
+def test_top_k():
+    series = SensorSeries(window=2, fields=("CO2_ppm",))
+    for key, value in (("a", 1.0), ("b", 5.0), ("c", 3.0)):
+        series.append(key, {"CO2_ppm": value, "timestamp": 0.0})
+    assert [key for key, _ in series.top_k("CO2_ppm", k=2, now=0.0)] == ["b", "c"]